@@ -4,19 +4,28 @@
 修复内容：统一使用pack布局管理器，解决布局冲突
 """
 
+import json
+import os
+import time
+
 import serial
 import serial.tools.list_ports
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
+
+from control import resistance_command
+from profiles import ProfileStore
+from serial_link import SerialLink, open_serial
 
 class MotorControlGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("电机阻力控制与角度监测")
-        self.root.geometry("400x300")
+        self.root.geometry("400x400")
 
         # 串口初始化
         self.ser = None
+        self.link = None  # 串口链路层，后台批量读取
         self.is_connected = False
 
         # 创建UI组件
@@ -25,6 +34,10 @@ class MotorControlGUI:
         # 角度数据缓存
         self.current_angle = 0.0
 
+        # 测试台
+        self.bench = None
+        self.bench_script = None  # None 表示使用内置脚本
+
     def create_widgets(self):
         # 串口选择区域
         port_frame = ttk.LabelFrame(self.root, text="串口设置")
@@ -65,6 +78,22 @@ class MotorControlGUI:
         self.angle_var = tk.StringVar(value="0.00")
         ttk.Label(angle_frame, textvariable=self.angle_var, font=("Arial", 24)).pack(pady=20)
 
+        # 测试台区域：运行阻力波形脚本并生成特性报告（见 testbench.py）
+        bench_frame = ttk.LabelFrame(self.root, text="测试台")
+        bench_frame.pack(padx=10, pady=5, fill=tk.X)
+
+        bench_inner = ttk.Frame(bench_frame)
+        bench_inner.pack(fill=tk.X, padx=5, pady=5)
+
+        self.script_var = tk.StringVar(value="内置脚本")
+        ttk.Label(bench_inner, textvariable=self.script_var, width=14).pack(side=tk.LEFT, padx=5)
+        ttk.Button(bench_inner, text="选择脚本", command=self.choose_script).pack(side=tk.LEFT, padx=5)
+        self.bench_btn = ttk.Button(bench_inner, text="运行测试", command=self.toggle_bench)
+        self.bench_btn.pack(side=tk.LEFT, padx=5)
+
+        self.bench_status_var = tk.StringVar(value="")
+        ttk.Label(bench_frame, textvariable=self.bench_status_var).pack(padx=5, pady=(0, 5), anchor=tk.W)
+
         # 初始刷新端口
         self.refresh_ports()
 
@@ -79,20 +108,20 @@ class MotorControlGUI:
         """连接/断开串口"""
         if self.is_connected:
             # 断开连接
-            if self.ser and self.ser.is_open:
-                self.ser.close()
             self.is_connected = False
+            if self.link:
+                self.link.close()
+                self.link = None
             self.connect_btn.config(text="连接")
             messagebox.showinfo("提示", "串口已断开")
         else:
             # 建立连接
             try:
                 port = self.port_var.get()
-                self.ser = serial.Serial(
-                    port=port,
-                    baudrate=115200,
-                    timeout=0.1
-                )
+                # 波特率、流控等链路参数取自当前配置档案
+                self.ser = open_serial(port, ProfileStore().get()["link"])
+                self.link = SerialLink(self.ser)
+                self.link.start()
                 self.is_connected = True
                 self.connect_btn.config(text="断开")
                 messagebox.showinfo("提示", f"已连接到 {port}")
@@ -110,9 +139,8 @@ class MotorControlGUI:
         try:
             resistance = float(self.resistance_var.get())
             if 0 <= resistance <= 100:
-                # 发送格式："R:XXX\n"
-                cmd = f"R:{resistance:.1f}\n"
-                self.ser.write(cmd.encode('utf-8'))
+                # 发送格式："R:XXX\n"（预编码指令表）
+                self.link.write(resistance_command(resistance))
             else:
                 messagebox.showwarning("警告", "阻力值必须在0-100之间")
         except ValueError:
@@ -120,20 +148,82 @@ class MotorControlGUI:
 
     def receive_data(self):
         """接收ESP32发送的角度数据"""
-        if self.is_connected and self.ser and self.ser.is_open:
-            try:
-                data = self.ser.readline().decode('utf-8').strip()
-                if data.startswith("A:"):
-                    # 解析角度（格式："A:XXX.XX"）
-                    angle_str = data[2:]
-                    self.current_angle = float(angle_str)
-                    self.angle_var.set(f"{self.current_angle:.2f}")
-            except Exception as e:
-                pass
+        if self.is_connected and self.link and self.link.latest_angle is not None:
+            # 链路层已在后台解析（格式："A:XXX.XX"），这里只取最新角度
+            self.link.discard_angles()
+            if self.link.latest_angle != self.current_angle:
+                self.current_angle = self.link.latest_angle
+                self.angle_var.set(f"{self.current_angle:.2f}")
 
         # 循环调用（每100ms接收一次）
         self.root.after(100, self.receive_data)
 
+    def choose_script(self):
+        """选择波形脚本文件（JSON），取消时恢复内置脚本"""
+        path = filedialog.askopenfilename(filetypes=[("波形脚本", "*.json")])
+        if not path:
+            self.bench_script = None
+            self.script_var.set("内置脚本")
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.bench_script = json.load(f)
+            self.script_var.set(os.path.basename(path))
+        except (OSError, ValueError) as e:
+            messagebox.showerror("错误", f"读取脚本失败：{e}")
+
+    def toggle_bench(self):
+        """开始/停止测试台脚本"""
+        if self.bench is not None:
+            self.bench.stop()
+            return
+        if not self.is_connected:
+            messagebox.showwarning("警告", "请先连接串口")
+            return
+        try:
+            from testbench import BenchRunner
+            self.bench = BenchRunner(self.link, self.bench_script)
+        except (ImportError, ValueError, KeyError) as e:
+            messagebox.showerror("错误", f"无法启动测试台：{e}")
+            return
+        self.bench.start()
+        self.bench_btn.config(text="停止测试")
+        self.root.after(200, self.poll_bench)
+
+    def poll_bench(self):
+        """刷新测试进度，结束后保存数据和报告"""
+        bench = self.bench
+        if bench.running:
+            self.bench_status_var.set(f"测试中 {bench.progress * 100:.0f}%（约 {bench.duration:.0f} 秒）")
+            self.root.after(200, self.poll_bench)
+            return
+        self.bench = None
+        self.bench_btn.config(text="运行测试")
+        if bench.error is not None:
+            self.bench_status_var.set(f"测试中断：{bench.error}")
+            return
+
+        from testbench import characterize, check_limits
+        name = time.strftime("bench_%Y%m%d_%H%M%S")
+        bench.save(name + ".rks")
+        report = characterize(bench.capture())
+        failures = check_limits(report)
+        report["failures"] = [{"name": n, "value": v, "limit": l} for n, v, l in failures]
+        with open(name + ".json", "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+        band = report["frequency"]["bandwidth"]
+        settle = report["step"].get("settling_time")
+        breakaway = report["deadband"].get("breakaway")
+        lines = [
+            f"起转阻力：{breakaway:.1f}" if breakaway is not None else "起转阻力：未测出",
+            f"调节时间：{settle * 1000:.0f} ms" if settle is not None else "调节时间：未测出",
+            f"-3dB 带宽：{band:.2f} Hz" if band is not None else "-3dB 带宽：未测出",
+            "检验合格" if not failures else "不合格项：" + "、".join(n for n, _, _ in failures),
+        ]
+        self.bench_status_var.set(f"已保存 {name}.rks / {name}.json")
+        messagebox.showinfo("测试报告", "\n".join(lines))
+
 if __name__ == "__main__":
     root = tk.Tk()
     app = MotorControlGUI(root)
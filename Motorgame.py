@@ -2,9 +2,18 @@ import serial
 import serial.tools.list_ports
 import tkinter as tk
 from tkinter import ttk, Canvas, messagebox
-import time
 import pyvjoy  # 使用 pyvjoy 替代 vjoy-python
 
+from profiles import ProfileStore
+from serial_link import SerialLink, open_serial
+from control import ControlState, angle_to_axis, append_history, curve_points
+from predictor import AnglePredictor, predictor_settings
+from vjoy_output import VJoyOutput
+from safety import SafetyWatchdog, ManualResistance
+from sim_clock import STOP
+
+MANUAL_INTERVAL = 0.05  # 手动阻力限速下发周期（秒）
+
 
 class MotorGameGUI:
     def __init__(self, root):
@@ -14,10 +23,25 @@ class MotorGameGUI:
 
         # 串口/游戏控制变量
         self.ser = None
+        self.link = None  # 串口链路层，后台批量读取
         self.is_connected = False
-        self.vjoy_device = pyvjoy.VJoyDevice(1)  # 初始化 pyvjoy 设备
-        self.current_angle = 0.0  # 当前角度（来自 ESP32）
-        self.target_resistance = 0.0  # 目标阻力
+        # 当前档案中的 vJoy 设备 ID、校准结果（中心偏移、行程范围）和链路配置
+        profile = ProfileStore().get()
+        self.vjoy_device = pyvjoy.VJoyDevice(profile["vjoy_id"])  # 初始化 pyvjoy 设备
+        self.vjoy_output = VJoyOutput(self.vjoy_device)  # 后台线程合并提交全部轴/按键，每周期一次 update
+        self.vjoy_output.start()
+        self.calibration = profile["calibration"]
+        self.state = ControlState(self.calibration)  # 当前角度、目标阻力等，由读取线程原地更新
+        self.shown_angle = None
+        self.link_config = profile["link"]
+        self.safety_config = profile["safety"]
+        self.safety = None  # 安全监督：阻力上限、看门狗与心跳
+        self.manual = ManualResistance()  # 手动阻力目标，由下发循环限幅限速后逐步发送
+
+        # 角度预测：按链路延迟外推角度后再送给游戏
+        predictor_config = predictor_settings(profile["predictor"], self.calibration)
+        self.predictor = AnglePredictor(**predictor_config) if predictor_config["enabled"] else None
+        self.output_angle = 0.0
 
         # 角度历史数据（用于曲线）
         self.angle_history = []
@@ -78,16 +102,27 @@ class MotorGameGUI:
 
     def toggle_connection(self):
         if self.is_connected:
-            if self.ser and self.ser.is_open:
-                self.ser.close()
             self.is_connected = False
+            self.manual.skip()
+            if self.safety:
+                self.safety.stop()
+                self.safety = None
+            if self.link:
+                self.link.close()
+                self.link = None
             self.connect_btn.config(text="连接")
             messagebox.showinfo("提示", "串口已断开")
         else:
             try:
                 port = self.port_var.get()
-                self.ser = serial.Serial(port, 115200, timeout=0.1)  # 波特率与ESP32一致
+                self.ser = open_serial(port, self.link_config)  # 波特率等链路参数取自配置档案，需与ESP32一致
+                self.link = SerialLink(self.ser)
+                self.link.add_listener(self.on_angle)
+                self.link.start()
+                self.safety = SafetyWatchdog(self.link, self.safety_config)
+                self.safety.start()
                 self.is_connected = True
+                self.link.clock.spawn(self.manual_step, MANUAL_INTERVAL, name="manual")
                 self.connect_btn.config(text="断开")
                 messagebox.showinfo("提示", f"已连接到 {port}")
             except Exception as e:
@@ -100,38 +135,47 @@ class MotorGameGUI:
         try:
             resistance = float(self.resistance_var.get())
             if 0 <= resistance <= 100:
-                cmd = f"R:{resistance:.1f}\n"  # 与ESP32约定的指令格式
-                self.ser.write(cmd.encode('utf-8'))
-                self.target_resistance = resistance
+                self.manual.set(resistance)  # 由下发循环经阻力上限和限速逐步发送
             else:
                 messagebox.showwarning("警告", "阻力值需在0-100之间")
         except ValueError:
             messagebox.showerror("错误", "请输入有效的数字")
 
+    def manual_step(self):
+        """手动阻力下发循环单步：经安全监督限幅限速后发送（R:XX.X），断开连接后结束"""
+        safety, link = self.safety, self.link
+        if not self.is_connected or safety is None or link is None:
+            return STOP
+        resistance = self.manual.step(safety, link)
+        if resistance is not None:
+            self.state.resistance = resistance
+        return None
+
     def receive_data(self):
-        if self.is_connected and self.ser:
-            try:
-                data = self.ser.readline().decode('utf-8').strip()
-                if data.startswith("A:"):
-                    self.current_angle = float(data[2:])
-                    self.angle_var.set(f"{self.current_angle:.2f} 度")
-                    # 记录历史数据
-                    self.angle_history.append(self.current_angle)
-                    if len(self.angle_history) > self.max_history:
-                        self.angle_history.pop(0)
-                    # 发送到游戏（使用pyvjoy）
-                    self.send_to_game(self.current_angle)
-            except Exception as e:
-                pass  # 忽略临时通信错误
+        if self.is_connected and self.link:
+            # 链路层已在后台批量读取并解析，这里一次取走全部新角度
+            _, angles = self.link.drain_angles()
+            offset = self.state.center_offset
+            # 记录历史数据
+            append_history(self.angle_history, [angle - offset for angle in angles], self.max_history)
+            angle = self.state.angle
+            if angles and angle != self.shown_angle:
+                self.shown_angle = angle
+                self.angle_var.set(f"{angle:.2f} 度")
         self.root.after(100, self.receive_data)  # 持续接收
 
+    def on_angle(self, timestamp, angle):
+        """串口链路回调（读取线程）：更新角度状态，每帧角度直接送往游戏，不经过界面线程"""
+        angle = self.state.update_angle(timestamp, angle)
+        # 启用预测时发送外推后的角度
+        self.output_angle = self.predictor.update(timestamp, angle) if self.predictor else angle
+        self.send_to_game(self.output_angle)
+
     def send_to_game(self, angle):
         """将角度映射为vJoy设备的X轴值（游戏方向盘输入）"""
-        # pyvjoy 值范围：0（最小）- 16384（中值）- 32768（最大）
-        # 角度范围：-180度（左）- 0度（中）- 180度（右）
-        mapped_value = 16384 + int((angle / 180.0) * 16384)
-        mapped_value = max(0, min(32768, mapped_value))  # 确保在有效范围内
-        self.vjoy_device.set_axis(pyvjoy.HID_USAGE_X, mapped_value)
+        # 角度范围：默认 -180度（左）- 0度（中）- 180度（右），校准后使用实测行程
+        mapped_value = angle_to_axis(angle, self.state.half_range)
+        self.vjoy_output.set_axis("x", mapped_value)  # 只更新待提交状态，由输出线程合并提交
 
     def update_plot(self):
         """更新角度变化曲线"""
@@ -140,22 +184,11 @@ class MotorGameGUI:
             self.root.after(500, self.update_plot)
             return
 
-        # 计算坐标范围
-        min_angle = min(self.angle_history)
-        max_angle = max(self.angle_history)
-        range_angle = max_angle - min_angle if max_angle != min_angle else 1
-
-        # 绘制曲线
+        # 绘制曲线（一次性提交全部坐标，避免逐段创建线条）
         width = self.canvas.winfo_width() or 750
         height = self.canvas.winfo_height() or 200
-        x_step = width / (len(self.angle_history) - 1)
-
-        for i in range(1, len(self.angle_history)):
-            x1 = (i - 1) * x_step
-            y1 = height - ((self.angle_history[i - 1] - min_angle) / range_angle) * (height - 20)
-            x2 = i * x_step
-            y2 = height - ((self.angle_history[i] - min_angle) / range_angle) * (height - 20)
-            self.canvas.create_line(x1, y1, x2, y2, fill="blue", width=2)
+        points, _, _ = curve_points(self.angle_history, width, height)
+        self.canvas.create_line(points, fill="blue", width=2)
 
         self.root.after(500, self.update_plot)
 
@@ -163,4 +196,4 @@ class MotorGameGUI:
 if __name__ == "__main__":
     root = tk.Tk()
     app = MotorGameGUI(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
\ No newline at end of file
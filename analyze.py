@@ -0,0 +1,377 @@
+"""
+离线分析工具
+功能：以内存映射方式读取会话录制文件（session_rec 格式），分块导出 CSV/Parquet，
+并用 numpy 向量化计算：角度功率谱（查找振荡频率）、阻力指令→角度阶跃响应、
+指令→响应延迟分布、采样/力反馈循环周期抖动，用于调整增益和死区
+用法：
+    python analyze.py session.rks                      输出分析报告
+    python analyze.py session.rks --json report.json   同时保存 JSON 报告
+    python analyze.py session.rks --csv out.csv        分块导出 CSV
+    python analyze.py session.rks --parquet out.parquet  分块导出 Parquet（需要 pyarrow）
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+from session_rec import HEADER, MAGIC, VERSION, RECORD, KIND_NAMES, KIND_ANGLE, KIND_RESISTANCE, KIND_FORCE
+
+# 与 session_rec.RECORD（"<dBf"）逐字节一致的紧凑结构
+RECORD_DTYPE = np.dtype([("time", "<f8"), ("kind", "u1"), ("value", "<f4")])
+CHUNK_RECORDS = 1 << 20  # 导出时每块记录数
+
+STEP_THRESHOLD = 10.0  # 阶跃判定：相邻两条阻力指令的最小变化
+MOVE_THRESHOLD = 0.5  # 响应判定：角度偏离起始值的最小角度（度）
+RESPONSE_WINDOW = 0.5  # 阶跃后观察窗口（秒）
+STEP_MERGE = 0.25  # 逐周期同向变化合并为一个阶跃的最长时间（秒），限速后的阶跃指令会分多个周期到达
+
+
+def load_session(path):
+    """内存映射读取录制文件，返回结构化数组（字段 time/kind/value），不把文件读入内存"""
+    with open(path, "rb") as f:
+        magic, version = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"不是会话录制文件：{path}")
+    if version != VERSION:
+        raise ValueError(f"不支持的录制文件版本：{version}")
+
+    count = (os.path.getsize(path) - HEADER.size) // RECORD.size  # 忽略未写完的尾部记录
+    if count == 0:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER.size, shape=(count,))
+
+
+def channel(records, kind):
+    """取出某类记录，返回 (时间, 数值)，按时间排序"""
+    mask = records["kind"] == kind
+    times = np.asarray(records["time"][mask], dtype=np.float64)
+    values = np.asarray(records["value"][mask], dtype=np.float64)
+    if times.size > 1 and np.any(np.diff(times) < 0):
+        order = np.argsort(times, kind="stable")
+        times, values = times[order], values[order]
+    return times, values
+
+
+def export_csv(records, path, chunk=CHUNK_RECORDS):
+    """分块导出 CSV：time,kind,value"""
+    names = np.array([KIND_NAMES.get(k, str(k)) for k in range(256)])
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write("time,kind,value\n")
+        for start in range(0, len(records), chunk):
+            block = records[start:start + chunk]
+            times = np.char.mod("%.6f", block["time"])
+            values = np.char.mod("%.4f", block["value"].astype(np.float64))
+            rows = np.char.add(np.char.add(np.char.add(times, ","), names[block["kind"]]), np.char.add(",", values))
+            f.write("\n".join(rows.tolist()))
+            f.write("\n")
+
+
+def export_parquet(records, path, chunk=CHUNK_RECORDS):
+    """分块导出 Parquet（列：time float64、kind 字符串字典、value float32）"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("导出 Parquet 需要安装 pyarrow：pip install pyarrow")
+
+    names = [KIND_NAMES.get(k, str(k)) for k in range(256)]
+    schema = pa.schema([
+        ("time", pa.float64()),
+        ("kind", pa.dictionary(pa.uint8(), pa.string())),
+        ("value", pa.float32()),
+    ])
+    with pq.ParquetWriter(path, schema) as writer:
+        for start in range(0, len(records), chunk):
+            block = records[start:start + chunk]
+            kind = pa.DictionaryArray.from_arrays(
+                pa.array(np.ascontiguousarray(block["kind"])), pa.array(names)
+            )
+            table = pa.Table.from_arrays(
+                [pa.array(np.ascontiguousarray(block["time"])), kind, pa.array(np.ascontiguousarray(block["value"]))],
+                schema=schema,
+            )
+            writer.write_table(table)
+
+
+def spread_batches(times, values):
+    """
+    旧版链路一次读取的多帧共用同一个时间戳：把每批帧均匀分布到上一批与本批时间戳之间，
+    得到严格递增的采样时间（第一批没有参考，丢弃）；时间戳已严格递增时原样返回
+    """
+    if times.size < 2 or np.all(np.diff(times) > 0):
+        return times, values
+    unique, first, counts = np.unique(times, return_index=True, return_counts=True)
+    if unique.size < 2:
+        return unique, values[first]
+    group = np.repeat(np.arange(unique.size), counts)
+    order = np.arange(times.size) - first[group]
+    keep = group > 0
+    group, order = group[keep], order[keep]
+    prev = unique[group - 1]
+    spread = prev + (unique[group] - prev) * (order + 1) / counts[group]
+    return spread, values[keep]
+
+
+def sample_interval(times):
+    """中位采样周期：只统计正的间隔，没有时按总时长平均"""
+    intervals = np.diff(times)
+    positive = intervals[intervals > 0]
+    if positive.size:
+        return float(np.median(positive))
+    return float((times[-1] - times[0]) / max(times.size - 1, 1))
+
+
+def resample(times, values):
+    """按中位采样周期重采样为等间隔序列，返回 (采样率, 数值)"""
+    dt = sample_interval(times)
+    grid = np.arange(times[0], times[-1], dt)
+    return 1.0 / dt, np.interp(grid, times, values)
+
+
+def angle_psd(times, angles, nperseg=4096, peaks=3, neighborhood=16):
+    """
+    Welch 法估计角度功率谱，返回 (频率, 功率谱密度, [(峰值频率, 功率, 突出度)])
+    突出度为峰值与两侧 neighborhood 个频点中位数之比，按突出度排序，
+    避免宽带的转向动作（低频能量大）掩盖窄带振荡
+    """
+    if times.size < 64 or times[-1] <= times[0]:
+        return np.empty(0), np.empty(0), []
+    rate, signal = resample(times, angles)
+    nperseg = min(nperseg, 1 << int(np.log2(signal.size)))
+    step = nperseg // 2
+    segments = np.lib.stride_tricks.sliding_window_view(signal, nperseg)[::step]
+    segments = segments - segments.mean(axis=1, keepdims=True)
+    window = np.hanning(nperseg)
+    spectrum = np.abs(np.fft.rfft(segments * window, axis=1)) ** 2
+    psd = spectrum.mean(axis=0) / (rate * (window ** 2).sum())
+    psd[1:-1] *= 2  # 单边谱
+    freqs = np.fft.rfftfreq(nperseg, 1.0 / rate)
+
+    # 局部极大值（排除直流分量）及其突出度
+    local = np.flatnonzero((psd[1:-1] > psd[:-2]) & (psd[1:-1] >= psd[2:])) + 1
+    local = local[freqs[local] > 0.2]
+    padded = np.pad(psd, neighborhood, mode="edge")
+    background = np.median(np.lib.stride_tricks.sliding_window_view(padded, 2 * neighborhood + 1), axis=1)
+    prominence = psd[local] / np.maximum(background[local], 1e-12)
+    order = np.argsort(prominence)[::-1][:peaks]
+    return freqs, psd, [(float(freqs[local[i]]), float(psd[local[i]]), float(prominence[i])) for i in order]
+
+
+def detect_steps(cmd_times, commands, threshold=STEP_THRESHOLD, merge=STEP_MERGE):
+    """
+    检测阻力指令阶跃，返回 (阶跃时刻, 阶跃幅度)；
+    相邻周期的同向变化（如录制的限速输出）在 merge 秒内合并为一个阶跃，时刻取第一次变化
+    """
+    if commands.size < 2:
+        return np.empty(0), np.empty(0)
+    delta = np.diff(commands)
+    changed = np.flatnonzero(delta)
+    times = cmd_times[changed + 1].tolist()
+    step_times, steps = [], []
+    last, start, total = -2, 0.0, 0.0
+    for i, t, d in zip(changed.tolist(), times, delta[changed].tolist()):
+        if i == last + 1 and (d > 0) == (total > 0) and t - start <= merge:
+            total += d
+            last = i
+            continue
+        if abs(total) >= threshold:
+            step_times.append(start)
+            steps.append(total)
+        last, start, total = i, t, d
+    if abs(total) >= threshold:
+        step_times.append(start)
+        steps.append(total)
+    return np.asarray(step_times), np.asarray(steps)
+
+
+def response_windows(times, step_times, window=RESPONSE_WINDOW):
+    """为每个阶跃取出起始样本下标和观察窗口内的样本下标矩阵，窗口超出录制末尾的阶跃被丢弃"""
+    rate = 1.0 / sample_interval(times)
+    width = max(2, int(window * rate))
+    start = np.searchsorted(times, step_times)
+    valid = start + width < times.size
+    start = start[valid]
+    index = start[:, None] + np.arange(width)
+    return valid, start, index
+
+
+def step_response(times, angles, step_times, steps, move_threshold=MOVE_THRESHOLD, window=RESPONSE_WINDOW):
+    """
+    阶跃响应：以阶跃时刻的角度为起点，统计
+    延迟（首次偏离超过最终变化量的 10% 与 move_threshold 中的较大者）、
+    上升时间（最终变化量的 10%→90%）、超调量、调节时间（进入 ±5% 带）
+    返回 (指标, 每次阶跃的延迟数组)
+    """
+    empty = {"count": 0}
+    if step_times.size == 0 or times.size < 2 or times[-1] <= times[0]:
+        return empty, np.empty(0)
+    valid, start, index = response_windows(times, step_times, window)
+    if start.size == 0:
+        return empty, np.empty(0)
+    step_times = step_times[valid]
+
+    rel_times = times[index] - step_times[:, None]
+    moves = angles[index] - angles[start][:, None]
+    final = moves[:, -max(1, index.shape[1] // 10):].mean(axis=1)
+    span = np.abs(final)
+    direction = np.sign(final)
+    direction[direction == 0] = 1.0
+    norm = moves * direction[:, None]  # 统一为正向响应
+
+    # 延迟：首次偏离起点超过阈值（阈值随变化量放大，避免被角度噪声和小幅振荡提前触发）
+    moved = np.abs(moves) > np.maximum(move_threshold, 0.1 * span)[:, None]
+    responded = moved.any(axis=1)
+    rows = np.arange(start.size)
+    latencies = rel_times[rows, moved.argmax(axis=1)][responded]
+
+    # 上升时间、超调、调节时间只统计有明显最终变化的阶跃
+    significant = span > move_threshold * 2
+    metrics = {"count": int(start.size), "responded": int(responded.sum())}
+    if significant.any():
+        norm_s = norm[significant] / span[significant][:, None]
+        rel_s = rel_times[significant]
+        r = np.arange(norm_s.shape[0])
+        t10 = rel_s[r, (norm_s >= 0.1).argmax(axis=1)]
+        t90 = rel_s[r, (norm_s >= 0.9).argmax(axis=1)]
+        outside = np.abs(norm_s - 1.0) > 0.05
+        last_out = outside.shape[1] - 1 - outside[:, ::-1].argmax(axis=1)
+        settle = np.where(outside.any(axis=1), rel_s[r, np.minimum(last_out + 1, outside.shape[1] - 1)], 0.0)
+        metrics.update({
+            "rise_time": float(np.median(t90 - t10)),
+            "overshoot": float(np.median(np.maximum(norm_s.max(axis=1) - 1.0, 0.0))),
+            "settling_time": float(np.median(settle)),
+            "gain": float(np.median(final[significant] / steps[valid][significant])),  # 度/阻力单位
+        })
+    return metrics, latencies
+
+
+def distribution(values):
+    """分位数统计"""
+    if values.size == 0:
+        return {"count": 0}
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {
+        "count": int(values.size),
+        "mean": float(values.mean()),
+        "p50": float(p50),
+        "p90": float(p90),
+        "p99": float(p99),
+        "max": float(values.max()),
+    }
+
+
+def loop_jitter(times):
+    """周期抖动：频率、周期标准差、分位数，以及超过两倍中位周期的间隔数（丢帧/错过截止时间）"""
+    if times.size < 3:
+        return {"count": int(times.size)}
+    intervals = np.diff(times)
+    median = sample_interval(times)
+    stats = distribution(intervals)
+    stats.update({
+        "rate": float(1.0 / median) if median > 0 else 0.0,
+        "std": float(intervals.std()),
+        "gaps": int(np.count_nonzero(intervals > 2 * median)),
+    })
+    return stats
+
+
+def analyze(records):
+    """生成完整分析报告（dict）"""
+    angle_t, angles = spread_batches(*channel(records, KIND_ANGLE))
+    cmd_t, commands = channel(records, KIND_RESISTANCE)
+    force_t, forces = channel(records, KIND_FORCE)
+
+    report = {
+        "records": int(len(records)),
+        "duration": float(records["time"].max() - records["time"].min()) if len(records) else 0.0,
+        "channels": {KIND_NAMES.get(k, str(k)): int(n) for k, n in zip(*np.unique(records["kind"], return_counts=True))},
+    }
+
+    _, _, peaks = angle_psd(angle_t, angles)
+    report["angle_psd_peaks"] = [{"frequency": f, "power": p, "prominence": r} for f, p, r in peaks]
+
+    step_times, steps = detect_steps(cmd_t, commands)
+    metrics, latencies = step_response(angle_t, angles, step_times, steps)
+    report["step_response"] = metrics
+    report["latency"] = distribution(latencies)
+
+    report["angle_jitter"] = loop_jitter(angle_t)
+    report["ffb_jitter"] = loop_jitter(cmd_t)
+    if forces.size:
+        report["force"] = distribution(np.abs(forces))
+    return report
+
+
+def print_report(report):
+    print(f"记录 {report['records']} 条，时长 {report['duration']:.1f} 秒  "
+          + "  ".join(f"{name} {count}" for name, count in report["channels"].items()))
+
+    print("\n角度功率谱峰值：")
+    for peak in report["angle_psd_peaks"]:
+        print(f"  {peak['frequency']:8.2f} Hz  {peak['power']:.3g} °²/Hz  突出度 {peak['prominence']:.0f}")
+    if not report["angle_psd_peaks"]:
+        print("  无")
+
+    step = report["step_response"]
+    print(f"\n阶跃响应（阻力变化 ≥ {STEP_THRESHOLD:g}）：{step['count']} 次")
+    if "rise_time" in step:
+        print(f"  上升时间 {step['rise_time'] * 1000:.1f} ms  超调 {step['overshoot'] * 100:.1f}%  "
+              f"调节时间 {step['settling_time'] * 1000:.1f} ms  增益 {step['gain']:.2f} °/单位")
+
+    latency = report["latency"]
+    print(f"\n指令→响应延迟：{latency['count']} 次")
+    if latency["count"]:
+        print(f"  P50 {latency['p50'] * 1000:.1f} ms  P90 {latency['p90'] * 1000:.1f} ms  "
+              f"P99 {latency['p99'] * 1000:.1f} ms  最大 {latency['max'] * 1000:.1f} ms")
+
+    for key, name in (("angle_jitter", "角度采样"), ("ffb_jitter", "力反馈循环")):
+        jitter = report[key]
+        if jitter["count"] < 3:
+            continue
+        print(f"\n{name}：{jitter['rate']:.1f} Hz  周期标准差 {jitter['std'] * 1000:.2f} ms  "
+              f"P99 {jitter['p99'] * 1000:.2f} ms  最大 {jitter['max'] * 1000:.1f} ms  间隔过长 {jitter['gaps']} 次")
+
+    # 调参提示
+    hints = []
+    strong = [p for p in report["angle_psd_peaks"] if 1.0 <= p["frequency"] <= 30.0]
+    if strong and "rise_time" in step and step["overshoot"] > 0.2:
+        hints.append(f"角度在 {strong[0]['frequency']:.1f} Hz 附近振荡且超调较大，可尝试降低力反馈增益")
+    if latency["count"] and latency["p50"] > 0.05:
+        hints.append(f"响应延迟中位数 {latency['p50'] * 1000:.0f} ms，可启用角度预测（补偿延迟设为该值）")
+    if hints:
+        print("\n调参建议：")
+        for hint in hints:
+            print(f"  - {hint}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="会话录制离线分析")
+    parser.add_argument("session", help="录制文件（session_rec 格式）")
+    parser.add_argument("--csv", help="导出 CSV 路径")
+    parser.add_argument("--parquet", help="导出 Parquet 路径（需要 pyarrow）")
+    parser.add_argument("--json", help="保存 JSON 报告路径")
+    parser.add_argument("--no-report", action="store_true", help="只导出，不生成报告")
+    args = parser.parse_args()
+
+    records = load_session(args.session)
+    if args.csv:
+        export_csv(records, args.csv)
+        print(f"已导出 CSV：{args.csv}")
+    if args.parquet:
+        export_parquet(records, args.parquet)
+        print(f"已导出 Parquet：{args.parquet}")
+    if args.no_report:
+        return
+
+    report = analyze(records)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n报告已保存到 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,703 @@
+"""
+性能基准测试
+功能：无界面、无硬件运行热点路径基准（帧解析、轴值映射、vJoy 提交、历史追加、曲线坐标、力反馈计算、
+端到端延迟、每周期内存分配与 GC 停顿、逐周期下发与本地效果模式的串口流量），串口/vJoy/画布使用模拟对象，端到端测试连接 esp32_sim 伪终端模拟器；
+结果可保存为 JSON 基线，并与基线对比找出性能回退；带上限的基准（如每周期分配）超出上限时返回非零退出码
+用法：
+    python bench.py                       运行全部基准
+    python bench.py -k parse              只运行名称包含 parse 的基准
+    python bench.py --save bench_baseline.json
+    python bench.py --compare bench_baseline.json [--threshold 0.2]
+"""
+
+import argparse
+import ctypes
+import gc
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+from collections import deque
+
+from calibration import compensate_friction
+from control import ControlState, angle_to_axis, force_to_resistance, resistance_command, append_history, curve_points
+from safety import SafetyWatchdog, TorqueLimiter, drive_resistance
+from session_rec import SessionRecorder, RECORD, KIND_RESISTANCE, KIND_FORCE
+from plot_view import MinMaxPyramid, TimeWindow, PlotView
+from serial_link import SerialLink
+from sim_clock import VirtualClock
+from telemetry import DECODERS, TelemetryState, TelemetryEffects, TelemetryListener
+from effects import EffectCompiler
+from vjoy_output import VJoyOutput
+
+BASELINE_FILE = "bench_baseline.json"
+REPEAT = 5  # 每项基准重复次数，取最优值
+
+BENCHMARKS = []
+
+
+def benchmark(name, unit, limit=None):
+    """注册基准函数，函数返回测量值（越小越好）；limit 为允许的上限，超出视为失败"""
+    def register(fn):
+        BENCHMARKS.append((name, unit, fn, limit))
+        return fn
+    return register
+
+
+def best_of(fn, number, repeat=REPEAT):
+    """重复执行 number 次取最优，返回单次耗时（纳秒）"""
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(number)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best / number * 1e9
+
+
+class FakeSerial(io.RawIOBase):
+    """模拟串口：从内存数据中读取；与 pyserial 一样继承 RawIOBase，readline 逐字节调用 read(1)"""
+
+    def __init__(self, data):
+        super().__init__()
+        self.data = data
+        self.pos = 0
+        self.is_open = True
+
+    def readable(self):
+        return True
+
+    @property
+    def in_waiting(self):
+        return len(self.data) - self.pos
+
+    def read(self, size=1):
+        chunk = self.data[self.pos:self.pos + size]
+        self.pos += len(chunk)
+        return chunk
+
+    def readinto(self, buffer):
+        with memoryview(self.data) as data:
+            chunk = data[self.pos:self.pos + len(buffer)]
+            size = len(chunk)
+            buffer[:size] = chunk
+        self.pos += size
+        return size
+
+    def write(self, data):
+        return len(data)
+
+    def close(self):
+        self.is_open = False
+        super().close()
+
+
+class FakeVJoy:
+    """模拟 pyvjoy.VJoyDevice，只记录调用次数"""
+
+    def __init__(self):
+        self.calls = 0
+        self.axes = {}
+
+    def set_axis(self, axis, value):
+        self.calls += 1
+        self.axes[axis] = value
+
+
+class JoystickPosition(ctypes.Structure):
+    """与 vJoy SDK 的 JOYSTICK_POSITION_V2 布局一致"""
+    _fields_ = [("bDevice", ctypes.c_ubyte)] + [
+        (name, ctypes.c_long) for name in (
+            "wThrottle", "wRudder", "wAileron", "wAxisX", "wAxisY", "wAxisZ", "wAxisXRot", "wAxisYRot",
+            "wAxisZRot", "wSlider", "wDial", "wWheel", "wAxisVX", "wAxisVY", "wAxisVZ", "wAxisVBRX",
+            "wAxisVBRY", "wAxisVBRZ", "lButtons")
+    ] + [(name, ctypes.c_ulong) for name in ("bHats", "bHatsEx1", "bHatsEx2", "bHatsEx3")] + [
+        (name, ctypes.c_long) for name in ("lButtonsEx1", "lButtonsEx2", "lButtonsEx3")
+    ]
+
+
+class FakeVJoyDriver:
+    """
+    模拟 vJoy 驱动：SetAxis/SetBtn 与 UpdateVJD 在驱动中都会提交一份完整的位置报告，
+    这里每次调用都复制一次位置结构体来模拟这部分开销，并统计驱动调用次数
+    """
+
+    def __init__(self):
+        self.data = JoystickPosition()
+        self.report = JoystickPosition()
+        self.calls = 0
+
+    def submit(self):
+        ctypes.memmove(ctypes.byref(self.report), ctypes.byref(self.data), ctypes.sizeof(self.data))
+        self.calls += 1
+
+    def set_axis(self, field, value):
+        """逐轴接口（对应 pyvjoy set_axis）"""
+        setattr(self.data, field, value)
+        self.submit()
+
+    def set_button(self, index, pressed):
+        """逐按键接口（对应 pyvjoy set_button）"""
+        bit = 1 << (index - 1)
+        self.data.lButtons = (self.data.lButtons | bit) if pressed else (self.data.lButtons & ~bit)
+        self.submit()
+
+    def update(self):
+        """整体提交接口（对应 pyvjoy update）"""
+        self.submit()
+
+
+def make_ticks(number):
+    """生成每个控制周期的方向盘/油门/刹车/按键值，每隔一个周期重复上一周期（模拟数据未变化）"""
+    ticks = []
+    for i in range(number):
+        k = i // 2
+        ticks.append((angle_to_axis((k % 720) / 2.0 - 180.0, 450.0), (k * 37) % 32768, (k * 91) % 32768, k % 3 == 0))
+    return ticks
+
+
+class FakeCanvas:
+    """模拟 Tk Canvas，只统计绘制图元数量"""
+
+    def __init__(self, width=850, height=180):
+        self.width = width
+        self.height = height
+        self.items = 0
+
+    def winfo_width(self):
+        return self.width
+
+    def winfo_height(self):
+        return self.height
+
+    def delete(self, tag):
+        self.items = 0
+
+    def create_line(self, *args, **kwargs):
+        self.items += 1
+
+    def create_text(self, *args, **kwargs):
+        self.items += 1
+
+
+HOT_PATH_CALIBRATION = {"center_offset": 1.5, "range": 900.0, "static_friction": 12.0, "dynamic_friction": 8.0}
+DRAIN_TICKS = 100  # 界面线程每 100 个周期（1kHz 下 100ms）取走一次角度
+STALL_TICKS = (4000, 5000)  # 每 5000 个周期中有 1000 个周期界面线程被阻塞（拖动窗口、模态对话框等）
+
+
+class FakeVar:
+    """模拟 Tk StringVar，只保存最近一次的值"""
+
+    def __init__(self):
+        self.value = ""
+
+    def set(self, value):
+        self.value = value
+
+
+class ControlHotPath:
+    """
+    控制热点路径的一个周期（与 contrl.ffb_tick 相同的步骤）：解析一帧角度并更新状态和 vJoy 轴，提交 vJoy，
+    经 drive_resistance 计算并下发阻力（增益/死区、摩擦补偿、限幅限速、预编码 R: 指令），
+    数值变化时更新界面变量，追加阻力曲线并录制；界面线程按 DRAIN_TICKS 取走角度；
+    链路时间戳来自按周期推进的虚拟时钟，同样的周期序列每次运行的状态都相同
+    """
+
+    def __init__(self):
+        self.clock = VirtualClock()
+        self.link = SerialLink(FakeSerial(b""), clock=self.clock)
+        self.state = ControlState(HOT_PATH_CALIBRATION)
+        self.output = VJoyOutput(FakeVJoyDriver(), clock=self.clock)
+        self.safety = SafetyWatchdog(self.link)
+        self.recorder = SessionRecorder(os.devnull)
+        self.resistance_series = MinMaxPyramid()
+        self.ff_var = FakeVar()
+        self.link.add_listener(self.on_angle)
+        self.frames = [b"A:%.2f\r\n" % ((i % 720) / 2.0 - 180.0) for i in range(1000)]
+        self.forces = [(i % 200) / 200.0 for i in range(1000)]
+
+    def on_angle(self, timestamp, angle):
+        state = self.state
+        angle = state.update_angle(timestamp, angle)
+        self.output.set_axis("x", angle_to_axis(angle, state.half_range))
+
+    def tick(self, i, now):
+        self.clock.run_until(now)
+        self.link.feed(self.frames[i % 1000])
+        self.output.flush()
+        state = self.state
+        state.force = self.forces[i % 1000]
+        adjusted_force = drive_resistance(state, 1.0, 5, HOT_PATH_CALIBRATION, self.safety, self.link, None, now)
+        if adjusted_force != state.adjusted_force:
+            self.ff_var.set(f"{adjusted_force:.2f}")
+            state.adjusted_force = adjusted_force
+        self.resistance_series.append(now, state.resistance)
+        self.recorder.write(now, KIND_FORCE, state.force)
+        self.recorder.write(now, KIND_RESISTANCE, self.safety.limiter.output)
+        if i % DRAIN_TICKS == DRAIN_TICKS - 1 and not STALL_TICKS[0] <= i % STALL_TICKS[1]:
+            self.link.drain_angles()
+
+    def close(self):
+        self.recorder.close()
+
+
+class LegacyHotPath(ControlHotPath):
+    """原实现的同一周期：角度以 (时间, 角度) 元组入队、轴值字典快照、f-string 格式化指令、录制缓冲按记录拼接"""
+
+    def __init__(self):
+        super().__init__()
+        self.angles = deque(maxlen=4096)
+        self.axes = {}
+        self.last_sent = None
+        self.buffer = bytearray()
+
+    def tick(self, i, now):
+        frame = self.frames[i % 1000]
+        angle = float(frame[2:]) - HOT_PATH_CALIBRATION["center_offset"]
+        self.angles.append((now, angle))
+        self.axes["x"] = angle_to_axis(angle, HOT_PATH_CALIBRATION["range"] / 2)
+        snapshot = (tuple(self.axes.items()), 0, 0)
+        if snapshot != self.last_sent:
+            self.last_sent = snapshot
+        _, resistance = force_to_resistance(self.forces[i % 1000], 1.0, 5)
+        resistance = self.safety.tick(compensate_friction(resistance, HOT_PATH_CALIBRATION, False), now)
+        self.link.write(f"R:{resistance:.1f}\n".encode("utf-8"))
+        self.buffer += RECORD.pack(now, KIND_RESISTANCE, resistance)
+        if len(self.buffer) >= 4096 * RECORD.size:
+            self.buffer.clear()
+        if i % DRAIN_TICKS == DRAIN_TICKS - 1 and not STALL_TICKS[0] <= i % STALL_TICKS[1]:
+            angles = []
+            while self.angles:
+                angles.append(self.angles.popleft())
+
+
+def gc_pauses(path, number):
+    """运行 number 个周期，返回 (GC 停顿总时长（秒）, 各代回收次数)；期间保留一批长期对象模拟界面和日志缓冲"""
+    long_lived = [[i] for i in range(100000)]
+    pauses = []
+    started = [0.0]
+
+    def on_gc(phase, info):
+        if phase == "start":
+            started[0] = time.perf_counter()
+        else:
+            pauses.append((info["generation"], time.perf_counter() - started[0]))
+
+    gc.collect()
+    gc.callbacks.append(on_gc)
+    try:
+        for i in range(number):
+            path.tick(i, i * 0.001)
+    finally:
+        gc.callbacks.remove(on_gc)
+        path.close()
+    del long_lived
+    return sum(p for _, p in pauses), [sum(1 for g, _ in pauses if g == k) for k in range(3)]
+
+
+def make_stream(frames):
+    """生成模拟 ESP32 角度数据流"""
+    return b"".join(b"A:%.2f\r\n" % ((i % 7200) / 20.0 - 180.0) for i in range(frames))
+
+
+@benchmark("parse_readline", "ns/帧")
+def bench_parse_readline(frames=100000):
+    """原实现：每帧一次 readline + decode + strip + float"""
+    data = make_stream(frames)
+
+    def run(number):
+        ser = FakeSerial(data)
+        for _ in range(number):
+            line = ser.readline().decode('utf-8').strip()
+            if line.startswith("A:"):
+                float(line[2:])
+
+    return best_of(run, frames)
+
+
+@benchmark("parse_link", "ns/帧")
+def bench_parse_link(frames=100000, chunk=4096):
+    """链路层：按块读入预分配的接收缓冲后原地切帧解析"""
+    data = make_stream(frames)
+
+    def run(number):
+        ser = FakeSerial(data)
+        link = SerialLink(ser, max_queue=number)
+        while ser.in_waiting:
+            link.fill(chunk)
+
+    return best_of(run, frames)
+
+
+@benchmark("send_to_game", "ns/次")
+def bench_send_to_game(number=200000):
+    """角度映射并写入 vJoy X 轴"""
+    device = FakeVJoy()
+    angles = [(i % 720) / 2.0 - 180.0 for i in range(1000)]
+
+    def run(number):
+        for i in range(number):
+            device.set_axis(0x30, angle_to_axis(angles[i % 1000], 450.0))
+
+    return best_of(run, number)
+
+
+@benchmark("vjoy_per_axis", "ns/周期")
+def bench_vjoy_per_axis(number=100000):
+    """原实现：每个周期逐个调用 set_axis/set_button（方向盘、油门、刹车、一个按键）"""
+    ticks = make_ticks(number)
+    device = FakeVJoyDriver()
+
+    def run(number):
+        for wheel, throttle, brake, button in ticks[:number]:
+            device.set_axis("wAxisX", wheel)
+            device.set_axis("wAxisY", throttle)
+            device.set_axis("wAxisZ", brake)
+            device.set_button(1, button)
+
+    device.calls = 0
+    result = best_of(run, number)
+    calls_per_tick = device.calls / (number * REPEAT)
+    print(f"  驱动调用 {calls_per_tick:.2f} 次/周期，{calls_per_tick * 1e9 / result:,.0f} 次/秒")
+    return result
+
+
+@benchmark("vjoy_batched", "ns/周期")
+def bench_vjoy_batched(number=100000):
+    """输出级：修改待提交状态后每周期整体提交一次，未变化的周期跳过"""
+    ticks = make_ticks(number)
+    device = FakeVJoyDriver()
+    output = VJoyOutput(device)
+
+    def run(number):
+        for wheel, throttle, brake, button in ticks[:number]:
+            output.set_axis("x", wheel)
+            output.set_axis("y", throttle)
+            output.set_axis("z", brake)
+            output.set_button(1, button)
+            output.flush()
+
+    result = best_of(run, number)
+    calls_per_tick = device.calls / (number * REPEAT)
+    print(f"  驱动调用 {calls_per_tick:.2f} 次/周期，{calls_per_tick * 1e9 / result:,.0f} 次/秒，"
+          f"跳过 {output.skipped / (number * REPEAT) * 100:.0f}% 周期")
+    return result
+
+
+@benchmark("history_append", "ns/次")
+def bench_history_append(number=200000, max_history=200):
+    """逐帧追加历史数据并裁剪"""
+    history = [0.0] * max_history
+
+    def run(number):
+        for i in range(number):
+            append_history(history, (float(i),), max_history)
+
+    return best_of(run, number)
+
+
+@benchmark("plot_points", "ns/次")
+def bench_plot_points(number=2000, max_history=200):
+    """生成 200 点曲线坐标并提交到画布"""
+    history = [(i % 90) - 45.0 for i in range(max_history)]
+    canvas = FakeCanvas()
+
+    def run(number):
+        for _ in range(number):
+            canvas.delete("all")
+            points, _, _ = curve_points(history, canvas.winfo_width(), canvas.winfo_height())
+            canvas.create_line(points, fill="blue", width=2, smooth=True)
+
+    return best_of(run, number)
+
+
+@benchmark("plot_view", "µs/帧")
+def bench_plot_view(samples=500000, number=200):
+    """多分辨率曲线：50 万样本会话，交替绘制实时窗口和整个会话（开销只与画布宽度有关）"""
+    series = MinMaxPyramid()
+    for i in range(samples):
+        series.append(i * 0.001, (i % 900) / 10.0 - 45.0)
+    latest = samples * 0.001
+    window = TimeWindow()
+    view = PlotView(FakeCanvas(), series, window, "blue", "角度")
+
+    def run(number):
+        for i in range(number):
+            if i & 1:
+                window.show_all(0.0, latest)
+            else:
+                window.follow()
+            view.draw(latest, 0.0)
+
+    return best_of(run, number) / 1000
+
+
+@benchmark("pyramid_append", "ns/样本")
+def bench_pyramid_append(number=200000):
+    """曲线历史追加（金字塔各层同时更新）"""
+
+    def run(number):
+        series = MinMaxPyramid()
+        for i in range(number):
+            series.append(i * 0.001, float(i % 100))
+
+    return best_of(run, number)
+
+
+@benchmark("ffb_effect", "ns/次")
+def bench_ffb_effect(number=200000):
+    """力反馈计算：增益/死区、摩擦补偿、生成 R: 指令"""
+    calibration = {"static_friction": 12.0, "dynamic_friction": 8.0}
+
+    def run(number):
+        for i in range(number):
+            _, resistance = force_to_resistance((i % 100) / 100.0, 1.2, 5)
+            resistance = compensate_friction(resistance, calibration, i & 1)
+            resistance_command(resistance)
+
+    return best_of(run, number)
+
+
+@benchmark("safety_limit", "ns/次")
+def bench_safety_limit(number=200000):
+    """安全监督每周期开销：阻力限幅 + 变化速率限制"""
+    limiter = TorqueLimiter(max_torque=80.0)
+    requests = [float((i * 37) % 101) for i in range(1000)]
+
+    def run(number):
+        for i in range(number):
+            limiter.limit(requests[i % 1000], i * 0.002)
+
+    return best_of(run, number)
+
+
+@benchmark("telemetry_decode", "ns/包")
+def bench_telemetry_decode(number=100000):
+    """遥测数据包解码并合成力反馈（Forza Data Out 格式）"""
+    source = DECODERS["forza"]()
+    packets = [source.synthesize(i / 360.0) for i in range(360)]
+    state = TelemetryState()
+    effects = TelemetryEffects()
+
+    def run(number):
+        for i in range(number):
+            if source.decode(packets[i % 360], state):
+                effects.base_force(state)
+
+    return best_of(run, number)
+
+
+class CountingLink:
+    """只统计写入字节数的链路"""
+
+    def __init__(self):
+        self.bytes_sent = 0
+
+    def write(self, data):
+        self.bytes_sent += len(data)
+
+
+def ffb_traffic(offload, seconds=60, rate=100):
+    """用合成遥测数据运行 seconds 秒的力反馈循环，返回上位机到下位机的平均流量（字节/秒）"""
+    source = DECODERS["forza"]()
+    listener = TelemetryListener({"game": "forza"})
+    link = CountingLink()
+    effects = EffectCompiler(link)
+    effects.slot_count = 8  # 假定固件已应答 E:OK
+    for i in range(seconds * rate):
+        now = i / rate
+        listener.on_packet(source.synthesize(now))
+        listener.last_packet = now
+        if offload:
+            force = effects.compile_telemetry(listener, 1.0, now)
+            _, resistance = force_to_resistance(force, 1.0, 5)
+            effects.send_resistance(resistance)
+        else:
+            _, resistance = force_to_resistance(listener.force(now), 1.0, 5)
+            link.write(resistance_command(resistance))
+    return link.bytes_sent / seconds
+
+
+@benchmark("ffb_traffic_stream", "字节/秒")
+def bench_ffb_traffic_stream():
+    """逐周期下发 R: 阻力时的串口下行流量（100Hz 力反馈循环，合成 Forza 遥测）"""
+    return ffb_traffic(False)
+
+
+@benchmark("ffb_traffic_offload", "字节/秒")
+def bench_ffb_traffic_offload():
+    """本地效果模式的串口下行流量：回正弹簧和路肩振动只在参数变化时上传，恒定阻力只在变化时发送"""
+    return ffb_traffic(True)
+
+
+def hot_path_blocks(path, start, number):
+    """
+    在已开启的 tracemalloc 下运行热点路径 number 个周期，返回仓库模块（不含本文件）各代码行净增内存块的统计；
+    快照前完整回收一次，清空浮点数等类型的空闲链表（其中的对象仍计为已分配的块，数量取决于进程此前的运行情况）
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    here = os.path.abspath(__file__)
+    gc.collect()
+    before = tracemalloc.take_snapshot()
+    for i in range(start, start + number):
+        path.tick(i, i * 0.001)
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    return [
+        stat for stat in after.compare_to(before, "lineno")
+        if stat.count_diff and stat.traceback[0].filename.startswith(root) and stat.traceback[0].filename != here
+    ]
+
+
+def alloc_per_tick(path_class=None, short=8000, long=16000, warmup=40000):
+    """
+    热点路径预热后接连运行 short、long 个周期，返回 (每周期净增块数, 较长窗口的统计)；
+    快照时刻状态字段引用的对象等一次性变化不随周期数增长，按两窗口净增之差折算到每周期即可排除；
+    从创建热点路径起就开启跟踪，预热越过曲线金字塔新建一层的样本数（8^5），两个窗口内都不新建层；
+    窗口边界取输入序列周期（1000）和金字塔低层桶大小的公倍数，各快照时刻的状态结构相同
+    """
+    tracemalloc.start()
+    path = (path_class or ControlHotPath)()
+    try:
+        for i in range(warmup):
+            path.tick(i, i * 0.001)
+        first = hot_path_blocks(path, warmup, short)
+        second = hot_path_blocks(path, warmup + short, long)
+    finally:
+        tracemalloc.stop()
+        path.close()
+    growth = sum(stat.count_diff for stat in second) - sum(stat.count_diff for stat in first)
+    return growth / (long - short), second
+
+
+@benchmark("alloc_per_tick", "块/周期", limit=0)
+def bench_alloc_per_tick():
+    """tracemalloc：热点路径稳态下每周期净增（未释放）的内存块数，应为 0（test_hot_path.py 在 pytest 中做同样的检查）"""
+    per_tick, stats = alloc_per_tick()
+    if per_tick > 0:
+        for stat in stats[:5]:
+            print(f"  {stat}")  # 列出净增最多的代码行
+    return max(per_tick, 0.0)  # 一次性变化可能使较长窗口少几个块，不报告负值
+
+
+@benchmark("gc_pause_legacy", "µs/10万周期")
+def bench_gc_pause_legacy(number=100000):
+    """原实现热点路径运行期间的 GC 停顿（含界面线程阻塞、角度元组在队列中积压的时段）"""
+    total, counts = gc_pauses(LegacyHotPath(), number)
+    print(f"  各代回收次数 {counts}")
+    return total * 1e6 * 100000 / number
+
+
+@benchmark("gc_pause", "µs/10万周期")
+def bench_gc_pause(number=100000):
+    """当前热点路径运行期间的 GC 停顿（角度存于定长数组，取走时返回数组，不产生 GC 跟踪对象）"""
+    total, counts = gc_pauses(ControlHotPath(), number)
+    print(f"  各代回收次数 {counts}")
+    return total * 1e6 * 100000 / number
+
+
+@benchmark("pipeline_latency", "µs")
+def bench_pipeline_latency(rounds=200):
+    """端到端：经伪终端模拟器回传探测帧，测量往返延迟中位数（含串口读写和链路解析）"""
+    try:
+        from esp32_sim import Esp32Simulator
+        from serial_link import open_serial
+        simulator = Esp32Simulator(sample_rate=1000)
+        ser = open_serial(simulator.port)
+    except (ImportError, OSError) as e:
+        print(f"  跳过 pipeline_latency：{e}")
+        return None
+
+    simulator.start()
+    link = SerialLink(ser)
+    link.start()
+    try:
+        delays = []
+        for seq in range(rounds):
+            link.frames.clear()
+            t0 = time.perf_counter()
+            link.write(b"P:%d\n" % seq)
+            if link.wait_frame(b"P:", 0.5) is not None:
+                delays.append(time.perf_counter() - t0)
+        if not delays:
+            return None
+        delays.sort()
+        return delays[len(delays) // 2] * 1e6
+    finally:
+        link.close()
+        simulator.stop()
+
+
+def run_benchmarks(pattern=None):
+    """运行基准，返回 ({名称: {"value": 值, "unit": 单位}}, 超出上限的基准名称列表)"""
+    results = {}
+    failures = []
+    for name, unit, fn, limit in BENCHMARKS:
+        if pattern and pattern not in name:
+            continue
+        value = fn()
+        if value is None:
+            continue
+        results[name] = {"value": round(value, 1), "unit": unit}
+        flag = ""
+        if limit is not None and value > limit:  # 按未取整的测量值判断，避免小于 0.05 的净增被取整为 0
+            failures.append(name)
+            flag = f"  <- 超出上限 {limit}"
+        print(f"{name:<20} {value:12.1f} {unit}{flag}" if value >= 0.05 or not value else f"{name:<20} {value:12.4g} {unit}{flag}")
+    return results, failures
+
+
+def compare(results, baseline, threshold):
+    """与基线对比，返回回退的基准名称列表"""
+    regressions = []
+    print(f"\n{'基准':<20} {'基线':>12} {'当前':>12} {'变化':>8}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old = baseline[name]["value"]
+        new = result["value"]
+        if old:
+            change = (new - old) / old
+        else:
+            change = float("inf") if new > 0 else 0.0  # 基线为 0（如零分配）时任何增长都算回退
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  <- 回退"
+        print(f"{name:<20} {old:12.1f} {new:12.1f} {change * 100:7.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RickyTech 力反馈控制系统性能基准")
+    parser.add_argument("-k", dest="pattern", help="只运行名称包含该字符串的基准")
+    parser.add_argument("--save", nargs="?", const=BASELINE_FILE, help="保存结果为基线 JSON")
+    parser.add_argument("--compare", nargs="?", const=BASELINE_FILE, help="与基线 JSON 对比")
+    parser.add_argument("--threshold", type=float, default=0.2, help="判定回退的变化比例（默认 0.2）")
+    args = parser.parse_args()
+
+    results, failures = run_benchmarks(args.pattern)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n基线已保存到 {args.save}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n性能回退：{', '.join(regressions)}")
+            sys.exit(1)
+        print("\n未发现性能回退")
+
+    if failures:
+        print(f"\n超出上限：{', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
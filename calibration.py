@@ -0,0 +1,284 @@
+"""
+自动校准
+功能：通过 R: 指令驱动阻力扫描并高速记录 A: 角度响应，
+拟合中心偏移、行程范围、静/动摩擦和响应延迟，结果写入当前配置档案；
+连接了安全监督时指令经其限幅限速（档案的阻力上限和变化速率），校准期间由校准器驱动看门狗的截止时间；
+计时、休眠和校准流程的后台执行来自注入的时钟（见 sim_clock.py）
+"""
+
+from control import resistance_command
+from sim_clock import CLOCK, STOP
+
+# 校准参数
+RANGE_DURATION = 8.0  # 行程测量时长（秒），期间请把方向盘左右打到底
+SWEEP_MAX = 60.0  # 摩擦扫描的最大阻力值
+SWEEP_RATE = 10.0  # 摩擦扫描速度（阻力值/秒）
+MOVE_THRESHOLD = 0.5  # 判定方向盘开始转动的角度变化（度）
+STOP_VELOCITY = 2.0  # 判定方向盘停止的角速度（度/秒）
+VELOCITY_WINDOW = 0.02  # 角速度按该时间窗口内的角度变化计算（秒），避免角度量化噪声
+MIN_RANGE = 90.0  # 行程下限（度），低于该值视为行程测量时方向盘没有打动
+STILL_TIMEOUT = 5.0  # 摩擦扫描前等待方向盘静止的最长时间（秒）
+LATENCY_STEPS = 5  # 延迟测量的阶跃次数
+SETTLE_TIME = 0.5  # 每次阶跃前的静置时间（秒）
+STEP_HOLD = 0.5  # 阶跃保持时间（秒）
+
+
+def fit_range(angles, min_range=MIN_RANGE):
+    """根据左右打到底的角度数据拟合中心偏移和行程范围，没有数据或行程小于 min_range 时抛出 ValueError"""
+    if len(angles) < 2:
+        raise ValueError("行程测量期间没有收到角度数据")
+    min_angle = min(angles)
+    max_angle = max(angles)
+    if max_angle - min_angle < min_range:
+        raise ValueError(f"测得行程只有 {max_angle - min_angle:.1f}°，请在行程测量时把方向盘左右打到底")
+    return (min_angle + max_angle) / 2, max_angle - min_angle
+
+
+def velocities(times, angles, window=VELOCITY_WINDOW):
+    """各采样点的角速度（度/秒）：与 window 秒前的采样比较，不足一个窗口的开头部分与第一个采样比较"""
+    result = [0.0]
+    j = 0
+    for i in range(1, len(angles)):
+        while times[i] - times[j + 1] >= window:
+            j += 1
+        dt = times[i] - times[j]
+        result.append((angles[i] - angles[j]) / dt if dt > 0 else result[-1])
+    return result
+
+
+def fit_friction(times, commands, angles, threshold=MOVE_THRESHOLD, stop_velocity=STOP_VELOCITY):
+    """
+    根据阻力上升/下降扫描拟合静摩擦（起转阻力）和动摩擦：
+    下降段中找到最后一次真实转动（角速度不低于 stop_velocity 且转过 threshold 以上的连续区间，
+    排除停住前后速度噪声造成的短暂越限），角速度达到峰值、开始减速时
+    电机力矩与动摩擦平衡，此时的指令即为动摩擦（停住时的指令会因减速过程偏低）；
+    下降段中方向盘始终没有转动（如停在端点）时测不出动摩擦，取静摩擦
+    """
+    if len(angles) < 2:
+        return 0.0, 0.0
+
+    start_angle = angles[0]
+    peak = max(range(len(commands)), key=lambda i: commands[i])
+
+    # 上升段：角度偏离起点超过阈值时的指令即为静摩擦
+    static_friction = commands[peak]
+    moving_from = peak
+    for i in range(peak + 1):
+        if abs(angles[i] - start_angle) > threshold:
+            static_friction = commands[i]
+            moving_from = i
+            break
+
+    # 下降段：最后一次转动开始减速时的指令即为动摩擦
+    speed = [abs(v) for v in velocities(times, angles)]
+    dynamic_friction = static_friction
+    last = len(angles) - 1
+    begin = max(peak, moving_from)
+    while last >= begin:
+        if speed[last] < stop_velocity:
+            last -= 1
+            continue
+        first = last
+        while first > begin and speed[first - 1] >= stop_velocity:
+            first -= 1
+        if abs(angles[last] - angles[first]) > threshold:
+            decel = max(range(first, last + 1), key=lambda i: speed[i])
+            dynamic_friction = commands[decel]
+            break
+        last = first - 1
+
+    return static_friction, dynamic_friction
+
+
+def fit_latency(step_times, times, angles, threshold=MOVE_THRESHOLD):
+    """根据阶跃指令时刻和角度响应拟合响应延迟（取中位数，秒）"""
+    delays = []
+    for step_time in step_times:
+        base = None
+        for t, angle in zip(times, angles):
+            if t < step_time:
+                base = angle
+                continue
+            if base is None:
+                break
+            if abs(angle - base) > threshold:
+                delays.append(t - step_time)
+                break
+    if not delays:
+        return 0.0
+    delays.sort()
+    return delays[len(delays) // 2]
+
+
+def compensate_friction(resistance, calibration, moving=False):
+    """摩擦补偿：把 0-100 的目标阻力映射到死区之外，使电机更快达到目标力矩"""
+    if not calibration or resistance <= 0:
+        return resistance
+    offset = calibration["dynamic_friction"] if moving else calibration["static_friction"]
+    return min(100.0, offset + resistance * (100.0 - offset) / 100.0)
+
+
+class Calibrator:
+    def __init__(self, link, safety=None, clock=None):
+        self.link = link
+        self.safety = safety  # SafetyWatchdog，None 时直接下发指令
+        self.clock = clock or CLOCK
+        self.status = "就绪"
+        self.result = None
+        self.error = None
+        self.running = False
+        self.thread = None
+
+        # 采样数据（由串口读取线程通过回调写入）
+        self.times = []
+        self.commands = []
+        self.angles = []
+        self.command = 0.0  # 请求的阻力
+        self.output = None  # 经安全监督限幅限速后最近一次下发的阻力
+
+    def start(self):
+        """通过时钟启动校准（真实时钟下为后台线程）"""
+        self.running = True
+        self.result = None
+        self.error = None
+        self.thread = self.clock.spawn(self.step, 0.0, name="calibration")
+
+    def step(self):
+        """时钟循环单步：执行一次完整校准流程后结束"""
+        self.run()
+        return STOP
+
+    def stop(self):
+        """中止校准"""
+        self.running = False
+
+    def send(self, resistance):
+        """请求阻力：经安全监督限幅限速，输出变化时才下发；需要在采集循环中反复调用以推进限速"""
+        self.command = resistance
+        if self.safety is not None:
+            resistance = self.safety.tick(resistance)
+        if resistance != self.output:
+            self.output = resistance
+            self.link.write(resistance_command(resistance))
+
+    def ramp_time(self, level):
+        """阻力经限速从 0 升到 level 所需的时间（秒）"""
+        if self.safety is None:
+            return 0.0
+        return min(level, self.safety.limiter.max_torque) / self.safety.limiter.slew_rate
+
+    def release(self, timeout=1.0):
+        """把阻力按限速降到 0，再把阻力控制交还力反馈循环"""
+        self.send(0.0)
+        if self.safety is None:
+            return
+        deadline = self.clock.now() + timeout
+        while self.output > 0 and self.clock.now() < deadline:
+            self.clock.sleep(0.002)
+            self.send(0.0)
+        self.safety.release()
+
+    def on_angle(self, timestamp, angle):
+        """串口链路回调：按接收速率记录每一帧角度"""
+        self.times.append(timestamp)
+        self.commands.append(self.command)
+        self.angles.append(angle)
+
+    def capture(self, duration, command_fn=None):
+        """在指定时长内采集角度，command_fn(已用时间) 返回要发送的阻力值"""
+        start = len(self.times)
+        t0 = self.clock.now()
+        while self.running:
+            elapsed = self.clock.now() - t0
+            if elapsed >= duration:
+                break
+            self.send(command_fn(elapsed) if command_fn is not None else self.command)
+            self.clock.sleep(0.002)
+        return start, len(self.times)
+
+    def wait_still(self, timeout=STILL_TIMEOUT):
+        """等待方向盘静止（SETTLE_TIME 内角度变化不超过 MOVE_THRESHOLD），超时抛出 ValueError"""
+        waited = 0.0
+        while self.running:
+            start, end = self.capture(SETTLE_TIME)
+            window = self.angles[start:end]
+            if window and max(window) - min(window) <= MOVE_THRESHOLD:
+                return
+            waited += SETTLE_TIME
+            if waited >= timeout:
+                raise ValueError("方向盘没有静止，请松开方向盘后重新校准")
+
+    def sweep_command(self):
+        """摩擦扫描的指令函数：以 SWEEP_RATE 上升，角度偏离起点超过 MOVE_THRESHOLD 或到达 SWEEP_MAX 后以同样速率下降"""
+        start_angle = self.angles[-1] if self.angles else None
+        turn = []  # 折返时刻
+
+        def command(t):
+            if not turn:
+                moved = start_angle is not None and abs(self.angles[-1] - start_angle) > MOVE_THRESHOLD
+                if SWEEP_RATE * t < SWEEP_MAX and not moved:
+                    return round(SWEEP_RATE * t, 1)
+                turn.append(t)
+            return max(0.0, round(SWEEP_RATE * (2 * turn[0] - t), 1))
+
+        return command
+
+    def run(self):
+        """完整校准流程：行程 -> 摩擦扫描 -> 响应延迟"""
+        self.link.add_listener(self.on_angle)
+        try:
+            # 1. 行程测量：零阻力下由用户把方向盘左右打到底
+            self.status = "行程测量：请将方向盘向左、向右各打到底"
+            self.send(0.0)
+            start, end = self.capture(RANGE_DURATION)
+            center_offset, wheel_range = fit_range(self.angles[start:end])
+
+            # 2. 摩擦扫描：阻力线性上升，方向盘起转（或到达 SWEEP_MAX）后折返下降，
+            #    方向盘在转动中随阻力下降而停住，不会一直加速到端点
+            self.status = "摩擦扫描：请松开方向盘"
+            self.wait_still()
+            sweep_time = SWEEP_MAX / SWEEP_RATE
+            start, end = self.capture(sweep_time * 2, self.sweep_command())
+            static_friction, dynamic_friction = fit_friction(
+                self.times[start:end], self.commands[start:end], self.angles[start:end]
+            )
+
+            # 3. 响应延迟：多次阶跃，测量指令到角度变化的时间
+            self.status = "延迟测量"
+            step_level = min(100.0, max(20.0, static_friction * 1.5))
+            ramp = self.ramp_time(static_friction)  # 限速使阻力达到起转阻力有一段延时，不计入响应延迟
+            step_times = []
+            start = len(self.times)
+            for i in range(LATENCY_STEPS):
+                if not self.running:
+                    break
+                self.status = f"延迟测量：{i + 1}/{LATENCY_STEPS}"
+                self.send(0.0)
+                self.capture(SETTLE_TIME)
+                step_times.append(self.clock.now() + ramp)
+                self.send(step_level)
+                self.capture(STEP_HOLD)
+            latency = fit_latency(step_times, self.times[start:], self.angles[start:])
+
+            if not self.running:
+                self.status = "校准已中止"
+                return
+
+            self.result = {
+                "center_offset": round(center_offset, 3),
+                "range": round(wheel_range, 3),
+                "static_friction": round(static_friction, 2),
+                "dynamic_friction": round(dynamic_friction, 2),
+                "latency": round(latency, 4),
+            }
+            self.status = "校准完成"
+        except Exception as e:
+            self.error = str(e)
+            self.status = f"校准失败：{e}"
+        finally:
+            self.link.remove_listener(self.on_angle)
+            try:
+                self.release()
+            except Exception:
+                pass
+            self.running = False
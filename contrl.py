@@ -1,21 +1,48 @@
 import serial
 import serial.tools.list_ports
 import tkinter as tk
-from tkinter import ttk, Canvas, messagebox, StringVar, Frame
+from tkinter import ttk, Canvas, simpledialog, filedialog, StringVar
 import time
-import threading
 import ctypes
-from ctypes import wintypes
-import os
+import logging
 from tkinter import font
 
+from profiles import ProfileStore
+from calibration import Calibrator
+from serial_link import SerialLink, open_serial, link_settings
+from control import ControlState, angle_to_axis
+from devtools import TIMINGS, LoopMonitor, TkLagMonitor, ProfileCapture
+from event_log import EventLog, get_logger, matches, format_record, export_records, CATEGORIES, LEVELS
+from session_rec import SessionRecorder, KIND_ANGLE, KIND_RESISTANCE, KIND_FORCE, KIND_AXIS
+from vjoy_output import VJoyOutput, load_vjoy_ffb
+from safety import SafetyWatchdog, ManualResistance, safety_settings, drive_resistance
+from telemetry import TelemetryListener, telemetry_settings, DECODERS
+from plot_view import MinMaxPyramid, TimeWindow, PlotView
+from effects import EffectCompiler
+from predictor import AnglePredictor, predictor_settings
+from sim_clock import CLOCK, STOP, TkScheduler
+
+DEV_PASSWORD = "admin"  # 开发者模式密码
+FFB_INTERVAL = 0.05  # 力反馈循环间隔（秒），20Hz
+
 
 class MotorGameGUI:
-    def __init__(self, root):
+    def __init__(self, root, clock=None):
         self.root = root
+        # 时钟：力反馈循环、串口链路、校准、录制和曲线时间轴都从这里取时间；
+        # 界面泵在真实时钟下用 Tk after 调度，注入虚拟时钟时由虚拟时钟的事件队列调度
+        self.clock = clock or CLOCK
+        self.scheduler = self.clock if self.clock.virtual else TkScheduler(self.root)
+        self.closing = False
         self.root.title("RickyTech™️ 力反馈控制系统")
         self.root.geometry("900x700")
         self.root.configure(bg="#f5f5f5")
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # 事件日志：后台线程写文件，界面线程只入队
+        self.event_log = EventLog()
+        self.event_log.start()
+        self.logger = get_logger("ui")
 
         # 确保中文显示正常
         self.default_font = font.nametofont("TkDefaultFont")
@@ -33,26 +60,63 @@ class MotorGameGUI:
 
         # 串口/游戏控制变量
         self.ser = None
+        self.link = None  # 串口链路层，后台批量读取
+        self.negotiating = False  # 链路协商循环是否在运行
+        self.negotiate_result = None
+        self.safety = None  # 安全监督：阻力限幅限速、看门狗与心跳
+        self.manual = ManualResistance()  # 手动阻力目标，由力反馈循环限幅限速后下发
+        self.effects = None  # 本地效果编译器：固件支持时弹簧和振动由固件计算，只发送变化的参数
+        self.telemetry = None  # UDP 遥测力源，为 None 时使用 vJoy 力反馈
         self.is_connected = False
         self.vjoy_device = None
-        self.current_angle = 0.0
-        self.target_resistance = 0.0
-        self.force_feedback = 0.0
+        self.vjoy_output = None  # vJoy 输出级，后台线程合并提交
         self.mode = "manual"
 
-        # 力反馈配置参数
-        self.ff_gain = 1.0  # 力反馈增益
-        self.ff_deadzone = 5  # 死区范围
+        # 配置档案（按游戏保存）
+        self.profiles = ProfileStore()
+        profile = self.profiles.get()
 
-        # 角度/阻力历史数据
-        self.angle_history = []
-        self.resistance_history = []
-        self.max_history = 200
+        # vJoy 设备 ID（多台方向盘时每台使用不同的设备，见 fleet.py）
+        self.vjoy_id = profile["vjoy_id"]
+
+        # 力反馈配置参数
+        self.ff_gain = profile["ff_gain"]  # 力反馈增益
+        self.ff_deadzone = profile["ff_deadzone"]  # 死区范围
+        self.max_torque = safety_settings(profile["safety"])["max_torque"]  # 阻力上限
+
+        # 自动校准
+        self.calibration = profile["calibration"]
+        self.calibrator = None
+
+        # 角度预测：按链路延迟外推角度后再送给游戏（档案未启用时为 None）
+        self.predictor = None
+        self.load_predictor(profile)
+
+        # 热点路径状态（角度、角速度、阻力、力反馈），由读取线程和力反馈循环原地更新
+        self.state = ControlState(self.calibration)
+        self.shown_angle = None  # 界面上显示的角度，未变化时不重新格式化
+
+        # 角度/阻力历史数据：整个会话保存在多分辨率金字塔中，曲线可暂停、缩放和平移
+        self.angle_series = MinMaxPyramid()
+        self.resistance_series = MinMaxPyramid()
+        self.plot_window = TimeWindow()
+        self.plot_origin = self.clock.now()  # 时间轴零点
+
+        # 会话录制（用于离线分析）
+        self.recorder = None
+
+        # 开发者诊断
+        self.dev_mode = False
+        self.pump_monitor = LoopMonitor()  # 数据接收循环
+        self.ffb_monitor = LoopMonitor()  # 力反馈循环
+        self.tk_lag = TkLagMonitor(self.root)
+        self.profile_capture = ProfileCapture(self.root)
 
         # 配置ttk样式
         self.setup_styles()
 
-        # 创建UI
+        # 创建UI（状态栏需最先放置在底部才能横跨整个窗口）
+        self.create_status_bar()
         self.create_navigation()
         self.create_pages()
 
@@ -60,12 +124,18 @@ class MotorGameGUI:
         self.show_page("device")
 
         # 启动数据接收
-        self.root.after(100, self.receive_data)
-        self.root.after(500, self.update_plots)
+        self.scheduler.call_later(0.1, self.receive_data)
+        self.scheduler.call_later(0.2, self.update_plots)
 
-        # 力反馈监听线程
-        self.ff_thread = threading.Thread(target=self.listen_for_force_feedback, daemon=True)
-        self.ff_thread.start()
+        # 方向盘角度输出到 vJoy
+        self.open_vjoy_output()
+
+        # 力反馈来源（vJoy 力反馈或 UDP 遥测）
+        self.apply_force_source(profile)
+
+        # 力反馈循环（真实时钟下为后台线程）
+        self.ffb_source = None  # ffb_tick 的 vJoy 力反馈参数，循环首次执行时加载
+        self.ff_thread = self.clock.spawn(self.ffb_step, FFB_INTERVAL, name="ffb")
 
     def setup_styles(self):
         """配置ttk样式"""
@@ -135,6 +205,7 @@ class MotorGameGUI:
             ("data", "实时数据"),
             ("ff_config", "力反馈配置"),
             ("game_config", "游戏配置"),
+            ("log", "系统日志"),
             ("about", "联系我们")
         ]
 
@@ -148,6 +219,15 @@ class MotorGameGUI:
             btn.pack(fill=tk.X, pady=2)
             self.nav_buttons[page_id] = btn
 
+        # 开发者页面按钮，验证密码后才显示
+        self.dev_nav_btn = ttk.Button(
+            nav_frame,
+            text="开发者",
+            command=lambda: self.show_page("dev"),
+            style="NavButton.TButton"
+        )
+        self.nav_buttons["dev"] = self.dev_nav_btn
+
         # 状态指示器
         status_frame = tk.Frame(nav_frame, bg=self.card_color, pady=10)
         status_frame.pack(side=tk.BOTTOM, fill=tk.X)
@@ -163,6 +243,15 @@ class MotorGameGUI:
         )
         self.status_label.pack(anchor="w", padx=10)
 
+        # 开发者模式开关
+        self.dev_mode_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            nav_frame,
+            text="开发者模式",
+            variable=self.dev_mode_var,
+            command=self.toggle_dev_mode
+        ).pack(side=tk.BOTTOM, anchor="w", padx=10, pady=5)
+
     def create_pages(self):
         """创建所有页面"""
         self.pages = {}
@@ -190,18 +279,32 @@ class MotorGameGUI:
         game_config_frame.pack_forget()
         self.pages["game_config"] = game_config_frame
 
+        # 系统日志页面
+        log_frame = tk.Frame(self.root, bg=self.bg_color)
+        log_frame.pack(fill=tk.BOTH, expand=True, padx=(0, 10), pady=10)
+        log_frame.pack_forget()
+        self.pages["log"] = log_frame
+
         # 联系我们页面
         about_frame = tk.Frame(self.root, bg=self.bg_color)
         about_frame.pack(fill=tk.BOTH, expand=True, padx=(0, 10), pady=10)
         about_frame.pack_forget()
         self.pages["about"] = about_frame
 
+        # 开发者页面
+        dev_frame = tk.Frame(self.root, bg=self.bg_color)
+        dev_frame.pack(fill=tk.BOTH, expand=True, padx=(0, 10), pady=10)
+        dev_frame.pack_forget()
+        self.pages["dev"] = dev_frame
+
         # 填充各页面内容
         self.create_device_page()
         self.create_data_page()
         self.create_ff_config_page()
         self.create_game_config_page()
+        self.create_log_page()
         self.create_about_page()
+        self.create_dev_page()
 
     def show_page(self, page_id):
         """显示指定页面"""
@@ -270,6 +373,37 @@ class MotorGameGUI:
         )
         self.connect_btn.grid(row=0, column=3, padx=10, pady=10)
 
+        # 链路参数（保存在当前档案中）
+        link_config = link_settings(self.profiles.get()["link"])
+
+        ttk.Label(serial_frame, text="波特率：").grid(row=1, column=0, padx=10, pady=5)
+        self.baud_var = tk.StringVar(value=str(link_config["baudrate"]))
+        ttk.Combobox(
+            serial_frame,
+            textvariable=self.baud_var,
+            values=[str(b) for b in sorted(link_config["baud_candidates"])],
+            width=10
+        ).grid(row=1, column=1, padx=10, pady=5)
+
+        self.flow_var = tk.StringVar(
+            value="RTS/CTS" if link_config["rtscts"] else "XON/XOFF" if link_config["xonxoff"] else "无流控"
+        )
+        ttk.Combobox(
+            serial_frame,
+            textvariable=self.flow_var,
+            values=["无流控", "RTS/CTS", "XON/XOFF"],
+            state="readonly",
+            width=10
+        ).grid(row=1, column=2, padx=10, pady=5)
+
+        self.auto_tune_var = tk.BooleanVar(value=link_config["auto_tune"])
+        ttk.Checkbutton(serial_frame, text="自动协商", variable=self.auto_tune_var).grid(row=1, column=3, padx=10, pady=5)
+
+        self.link_status_var = tk.StringVar(value="")
+        ttk.Label(serial_frame, textvariable=self.link_status_var).grid(
+            row=2, column=0, columnspan=4, padx=10, pady=5, sticky="w"
+        )
+
         # 阻力控制（手动模式）
         self.resistance_frame = self.create_card_frame(self.pages["device"], "阻力设置（0-100）")
         self.resistance_frame.pack(padx=10, pady=10, fill=tk.X)
@@ -302,6 +436,26 @@ class MotorGameGUI:
         )
         self.ff_label.grid(row=0, column=1, padx=10, pady=10)
 
+        # 自动校准
+        calib_frame = self.create_card_frame(self.pages["device"], "自动校准")
+        calib_frame.pack(padx=10, pady=10, fill=tk.X)
+
+        self.calib_btn = ttk.Button(
+            calib_frame,
+            text="开始校准",
+            command=self.toggle_calibration,
+            style="Primary.TButton"
+        )
+        self.calib_btn.grid(row=0, column=0, padx=10, pady=10)
+
+        self.calib_status_var = tk.StringVar(value="就绪")
+        ttk.Label(calib_frame, textvariable=self.calib_status_var).grid(row=0, column=1, padx=10, pady=10, sticky="w")
+
+        self.calib_result_var = tk.StringVar(value=self.format_calibration(self.calibration))
+        ttk.Label(calib_frame, textvariable=self.calib_result_var).grid(
+            row=1, column=0, columnspan=2, padx=10, pady=5, sticky="w"
+        )
+
         # 初始化UI状态
         self.change_mode()
 
@@ -318,20 +472,47 @@ class MotorGameGUI:
             font=("SimHei", 24, "bold"),
             foreground=self.primary_color
         )
-        angle_value_label.pack(pady=15)
+        angle_value_label.pack(side=tk.LEFT, padx=20, pady=15)
+
+        self.record_btn = ttk.Button(
+            angle_frame,
+            text="开始录制",
+            command=self.toggle_recording,
+            style="Primary.TButton"
+        )
+        self.record_btn.pack(side=tk.RIGHT, padx=20, pady=15)
 
         # 图表区域
         chart_frame = self.create_card_frame(self.pages["data"], "实时数据")
         chart_frame.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
 
+        # 曲线工具栏（滚轮缩放、拖动平移、双击恢复实时）
+        toolbar = tk.Frame(chart_frame, bg=self.card_color)
+        toolbar.pack(fill=tk.X, padx=10)
+
+        self.pause_btn = ttk.Button(toolbar, text="暂停", command=self.toggle_plot_pause, style="Primary.TButton")
+        self.pause_btn.pack(side=tk.LEFT, padx=5)
+        ttk.Button(toolbar, text="放大", command=lambda: self.zoom_plots(0.5), style="Primary.TButton").pack(side=tk.LEFT, padx=5)
+        ttk.Button(toolbar, text="缩小", command=lambda: self.zoom_plots(2.0), style="Primary.TButton").pack(side=tk.LEFT, padx=5)
+        ttk.Button(toolbar, text="全部", command=self.show_all_plots, style="Primary.TButton").pack(side=tk.LEFT, padx=5)
+        ttk.Label(toolbar, text="滚轮缩放，拖动平移，双击恢复实时").pack(side=tk.RIGHT, padx=5)
+
         # 角度曲线图
         self.angle_canvas = Canvas(chart_frame, bg="white", highlightthickness=0)
         self.angle_canvas.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
-        # 阻力曲线图
+        # 阻力曲线图（纵轴固定 0-100）
         self.resistance_canvas = Canvas(chart_frame, bg="white", highlightthickness=0)
         self.resistance_canvas.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
+        self.plot_views = [
+            PlotView(self.angle_canvas, self.angle_series, self.plot_window, self.primary_color, "角度变化曲线", "°"),
+            PlotView(self.resistance_canvas, self.resistance_series, self.plot_window, self.secondary_color,
+                     "阻力变化曲线", fixed_range=(0.0, 100.0)),
+        ]
+        for view in self.plot_views:
+            view.bind(self.clock.now, self.redraw_plots)
+
     def create_ff_config_page(self):
         """创建力反馈配置页面"""
         config_frame = self.create_card_frame(self.pages["ff_config"], "力反馈参数配置")
@@ -379,6 +560,27 @@ class MotorGameGUI:
         self.deadzone_value_label = ttk.Label(deadzone_frame, text=f"{self.ff_deadzone}")
         self.deadzone_value_label.pack(side=tk.LEFT, padx=10, pady=5)
 
+        # 阻力上限（按档案保存，超出部分由安全监督截断）
+        torque_frame = tk.Frame(config_frame, bg=self.card_color)
+        torque_frame.pack(fill=tk.X, padx=20, pady=10)
+
+        ttk.Label(torque_frame, text="阻力上限：").pack(side=tk.LEFT, padx=10, pady=5)
+
+        self.max_torque_var = tk.IntVar(value=int(self.max_torque))
+        torque_scale = ttk.Scale(
+            torque_frame,
+            variable=self.max_torque_var,
+            from_=10,
+            to=100,
+            orient="horizontal",
+            length=300,
+            command=lambda s: self.max_torque_var.set(round(float(s)))
+        )
+        torque_scale.pack(side=tk.LEFT, padx=10, pady=5)
+
+        self.max_torque_label = ttk.Label(torque_frame, text=f"{self.max_torque:.0f}")
+        self.max_torque_label.pack(side=tk.LEFT, padx=10, pady=5)
+
         # 保存配置按钮
         save_frame = tk.Frame(config_frame, bg=self.card_color)
         save_frame.pack(fill=tk.X, padx=20, pady=20)
@@ -399,7 +601,7 @@ class MotorGameGUI:
         ttk.Label(game_frame, text="支持的游戏：").pack(anchor="w", padx=20, pady=10)
 
         games = ["赛车游戏", "飞行模拟", "驾驶模拟", "其他游戏"]
-        self.game_var = tk.StringVar(value=games[0])
+        self.game_var = tk.StringVar(value=self.profiles.active if self.profiles.active in games else games[0])
 
         for game in games:
             ttk.Radiobutton(
@@ -414,7 +616,7 @@ class MotorGameGUI:
         options_frame.pack(fill=tk.X, padx=20, pady=20)
 
         # 开关动效实现
-        self.enable_ff_var = tk.BooleanVar(value=True)
+        self.enable_ff_var = tk.BooleanVar(value=self.profiles.get()["enable_ff"])
 
         enable_ff_frame = tk.Frame(options_frame, bg=self.card_color)
         enable_ff_frame.pack(fill=tk.X, pady=5)
@@ -435,6 +637,24 @@ class MotorGameGUI:
         switch_frame.bind("<Button-1>", self.toggle_switch)
         self.switch_circle.bind("<Button-1>", self.toggle_switch)
 
+        # 力反馈来源：vJoy 力反馈或各游戏的 UDP 遥测
+        source_frame = tk.Frame(options_frame, bg=self.card_color)
+        source_frame.pack(fill=tk.X, pady=5)
+
+        ttk.Label(source_frame, text="力反馈来源：").pack(side=tk.LEFT, padx=10)
+
+        self.force_sources = {"vJoy 力反馈": None}
+        for name, cls in DECODERS.items():
+            self.force_sources[f"遥测：{cls.LABEL}"] = name
+        self.force_source_var = tk.StringVar(value=self.force_source_label(self.profiles.get()))
+        ttk.Combobox(
+            source_frame,
+            textvariable=self.force_source_var,
+            values=list(self.force_sources),
+            state="readonly",
+            width=30
+        ).pack(side=tk.LEFT, padx=10)
+
         # 保存配置按钮
         save_frame = tk.Frame(game_frame, bg=self.card_color)
         save_frame.pack(fill=tk.X, padx=20, pady=20)
@@ -446,6 +666,229 @@ class MotorGameGUI:
             style="Primary.TButton"
         ).pack(side=tk.RIGHT, padx=10, pady=5)
 
+    def create_log_page(self):
+        """创建系统日志页面（虚拟列表：只渲染可见行，十万条以上日志也能流畅滚动）"""
+        log_frame = self.create_card_frame(self.pages["log"], "系统日志")
+        log_frame.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
+
+        # 筛选栏
+        filter_frame = tk.Frame(log_frame, bg=self.card_color)
+        filter_frame.pack(fill=tk.X, pady=5)
+
+        ttk.Label(filter_frame, text="级别：").pack(side=tk.LEFT, padx=5)
+        self.log_level_var = tk.StringVar(value="全部")
+        level_combo = ttk.Combobox(
+            filter_frame, textvariable=self.log_level_var, values=["全部"] + list(LEVELS.values()),
+            state="readonly", width=6
+        )
+        level_combo.pack(side=tk.LEFT, padx=5)
+        level_combo.bind("<<ComboboxSelected>>", lambda e: self.apply_log_filter())
+
+        ttk.Label(filter_frame, text="分类：").pack(side=tk.LEFT, padx=5)
+        self.log_category_var = tk.StringVar(value="全部")
+        category_combo = ttk.Combobox(
+            filter_frame, textvariable=self.log_category_var, values=["全部"] + list(CATEGORIES.values()),
+            state="readonly", width=6
+        )
+        category_combo.pack(side=tk.LEFT, padx=5)
+        category_combo.bind("<<ComboboxSelected>>", lambda e: self.apply_log_filter())
+
+        ttk.Label(filter_frame, text="搜索：").pack(side=tk.LEFT, padx=5)
+        self.log_search_var = tk.StringVar()
+        search_entry = ttk.Entry(filter_frame, textvariable=self.log_search_var, width=15)
+        search_entry.pack(side=tk.LEFT, padx=5)
+        search_entry.bind("<Return>", lambda e: self.apply_log_filter())
+
+        ttk.Button(filter_frame, text="清空", command=self.clear_logs, style="Warning.TButton").pack(
+            side=tk.RIGHT, padx=5
+        )
+        ttk.Button(filter_frame, text="导出", command=self.export_logs, style="Primary.TButton").pack(
+            side=tk.RIGHT, padx=5
+        )
+
+        # 虚拟列表
+        list_frame = tk.Frame(log_frame, bg=self.card_color)
+        list_frame.pack(fill=tk.BOTH, expand=True)
+
+        self.log_scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.on_log_scroll)
+        self.log_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.log_listbox = tk.Listbox(list_frame, activestyle="none", font=("SimHei", 9))
+        self.log_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.log_listbox.bind("<MouseWheel>", lambda e: self.on_log_scroll("scroll", -e.delta // 120, "units"))
+        self.log_listbox.bind("<Button-4>", lambda e: self.on_log_scroll("scroll", -3, "units"))
+        self.log_listbox.bind("<Button-5>", lambda e: self.on_log_scroll("scroll", 3, "units"))
+        self.log_listbox.bind("<Configure>", lambda e: self.render_log_view())
+        self.log_line_height = font.Font(font=self.log_listbox.cget("font")).metrics("linespace") + 1
+
+        self.log_count_var = tk.StringVar(value="")
+        ttk.Label(log_frame, textvariable=self.log_count_var).pack(anchor="w", pady=5)
+
+        # 筛选结果（记录元组的引用）、已处理的最大序号、当前首行位置、是否跟随最新
+        self.log_filtered = []
+        self.log_seq = 0
+        self.log_offset = 0
+        self.log_follow = True
+        self.scheduler.call_later(0.5, self.refresh_log_view)
+
+    def log_filter(self):
+        """当前筛选条件：(最低级别, 分类, 关键字)"""
+        level_names = {v: k for k, v in LEVELS.items()}
+        category_names = {v: k for k, v in CATEGORIES.items()}
+        level = self.log_level_var.get()
+        min_level = logging.getLevelName(level_names[level]) if level in level_names else logging.DEBUG
+        category = category_names.get(self.log_category_var.get())
+        return min_level, category, self.log_search_var.get().strip() or None
+
+    def apply_log_filter(self):
+        """筛选条件变化时重新筛选全部日志"""
+        self.log_filtered = []
+        self.log_seq = 0
+        self.log_follow = True
+        self.refresh_log_view(reschedule=False)
+
+    def refresh_log_view(self, reschedule=True):
+        """增量筛选新日志，页面可见时重绘"""
+        buffer = self.event_log.buffer
+        new_records = buffer.since(self.log_seq)
+        if new_records:
+            self.log_seq = new_records[-1][0]
+            min_level, category, text = self.log_filter()
+            self.log_filtered.extend(r for r in new_records if matches(r, min_level, category, text))
+
+        # 缓冲区已淘汰的旧记录同步移除
+        oldest = buffer.oldest_seq()
+        stale = 0
+        while stale < len(self.log_filtered) and self.log_filtered[stale][0] < oldest:
+            stale += 1
+        if stale:
+            del self.log_filtered[:stale]
+            self.log_offset = max(0, self.log_offset - stale)
+
+        if self.pages["log"].winfo_ismapped():
+            self.render_log_view()
+        if reschedule:
+            self.scheduler.call_later(0.5, self.refresh_log_view)
+
+    def log_visible_rows(self):
+        return max(1, self.log_listbox.winfo_height() // self.log_line_height)
+
+    def render_log_view(self):
+        """只渲染当前可见的日志行"""
+        total = len(self.log_filtered)
+        visible = self.log_visible_rows()
+        if self.log_follow:
+            self.log_offset = max(0, total - visible)
+        rows = self.log_filtered[self.log_offset:self.log_offset + visible]
+
+        self.log_listbox.delete(0, tk.END)
+        for i, record in enumerate(rows):
+            self.log_listbox.insert(tk.END, format_record(record))
+            if record[2] >= logging.ERROR:
+                self.log_listbox.itemconfig(i, foreground=self.warning_color)
+            elif record[2] >= logging.WARNING:
+                self.log_listbox.itemconfig(i, foreground="#e67e22")
+
+        if total:
+            self.log_scrollbar.set(self.log_offset / total, min(1.0, (self.log_offset + visible) / total))
+        else:
+            self.log_scrollbar.set(0.0, 1.0)
+        self.log_count_var.set(f"共 {total} 条（缓冲区 {len(self.event_log.buffer.records)} 条）")
+
+    def on_log_scroll(self, action, amount, unit=None):
+        """滚动条/鼠标滚轮：只移动可见窗口的起始位置"""
+        total = len(self.log_filtered)
+        visible = self.log_visible_rows()
+        if action == "moveto":
+            offset = int(float(amount) * total)
+        else:
+            step = visible if unit == "pages" else 1
+            offset = self.log_offset + int(amount) * step
+        self.log_offset = max(0, min(offset, total - visible))
+        self.log_follow = self.log_offset >= total - visible
+        self.render_log_view()
+
+    def export_logs(self):
+        """导出当前筛选结果"""
+        path = filedialog.asksaveasfilename(
+            defaultextension=".txt", initialfile="motor_game_logs_export.txt", filetypes=[("文本文件", "*.txt")]
+        )
+        if not path:
+            return
+        export_records(self.log_filtered, path)
+        self.set_status(f"已导出 {len(self.log_filtered)} 条日志到 {path}")
+
+    def clear_logs(self):
+        """清空内存中的日志（日志文件不受影响）"""
+        self.event_log.buffer.clear()
+        self.log_filtered = []
+        self.log_offset = 0
+        self.render_log_view()
+
+    def create_status_bar(self):
+        """创建底部状态栏，用于显示临时提示（替代弹窗，不阻塞界面）"""
+        status_bar = tk.Frame(self.root, bg=self.card_color)
+        status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+
+        self.status_bar_var = StringVar(value="就绪")
+        self.status_bar_label = tk.Label(
+            status_bar, textvariable=self.status_bar_var, bg=self.card_color, fg=self.text_color, anchor="w"
+        )
+        self.status_bar_label.pack(fill=tk.X, padx=10, pady=3)
+        self.status_serial = 0  # 每次设置提示加 1，过期的自动清除回调不再生效
+
+    def set_status(self, text, level=logging.INFO, category="ui"):
+        """在状态栏显示提示并记录日志，5秒后自动清除"""
+        get_logger(category).log(level, text)
+        self.status_bar_var.set(text)
+        self.status_bar_label.configure(fg=self.warning_color if level >= logging.WARNING else self.text_color)
+        self.status_serial += 1
+        serial = self.status_serial
+        self.scheduler.call_later(5.0, lambda: self.clear_status(serial))
+
+    def clear_status(self, serial):
+        """清除状态栏提示（之后又设置过新提示时不清除）"""
+        if serial == self.status_serial:
+            self.status_bar_var.set("就绪")
+
+    def on_close(self):
+        """关闭窗口：断开串口并写完剩余日志"""
+        self.closing = True
+        if self.safety:
+            self.safety.stop()
+        if self.link:
+            self.link.close()
+        if self.recorder:
+            self.recorder.close()
+        if self.vjoy_output:
+            self.vjoy_output.stop()
+        if self.telemetry:
+            self.telemetry.stop()
+        self.event_log.stop()
+        self.root.destroy()
+
+    def force_source_label(self, profile):
+        """档案中的力反馈来源对应的下拉框文字"""
+        if profile["force_source"] == "telemetry":
+            game = telemetry_settings(profile["telemetry"])["game"]
+            if game in DECODERS:
+                return f"遥测：{DECODERS[game].LABEL}"
+        return "vJoy 力反馈"
+
+    def apply_force_source(self, profile):
+        """按档案启动或停止 UDP 遥测监听"""
+        if self.telemetry:
+            self.telemetry.stop()
+            self.telemetry = None
+        if profile["force_source"] != "telemetry":
+            return
+        try:
+            telemetry = TelemetryListener(profile["telemetry"], self.clock)
+        except KeyError as e:
+            self.set_status(f"未知的遥测解码器：{e}", logging.WARNING, "ffb")
+            return
+        telemetry.start()
+        self.telemetry = telemetry
+
     def toggle_switch(self, event=None):
         """切换开关状态"""
         self.enable_ff_var.set(not self.enable_ff_var.get())
@@ -516,6 +959,153 @@ class MotorGameGUI:
             font=("SimHei", 10)
         ).pack(anchor="center", pady=5)
 
+    def create_dev_page(self):
+        """创建开发者诊断页面"""
+        # 运行状态
+        status_frame = self.create_card_frame(self.pages["dev"], "运行状态")
+        status_frame.pack(padx=10, pady=10, fill=tk.X)
+
+        self.dev_vars = {}
+        items = [
+            ("pump", "接收循环"), ("ffb", "力反馈循环"), ("tk_lag", "界面延迟"),
+            ("link_rate", "串口吞吐"), ("link_errors", "丢帧/错误帧"), ("queues", "队列深度"),
+            ("vjoy", "vJoy 提交"), ("safety", "安全监督"), ("telemetry", "遥测"),
+            ("effects", "本地效果"),
+        ]
+        for i, (key, text) in enumerate(items):
+            ttk.Label(status_frame, text=f"{text}：").grid(row=i // 2, column=(i % 2) * 2, padx=10, pady=3, sticky="w")
+            var = tk.StringVar(value="-")
+            ttk.Label(status_frame, textvariable=var).grid(row=i // 2, column=(i % 2) * 2 + 1, padx=10, pady=3, sticky="w")
+            self.dev_vars[key] = var
+
+        # 函数耗时
+        timing_frame = self.create_card_frame(self.pages["dev"], "函数耗时")
+        timing_frame.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
+
+        columns = ("name", "count", "avg", "max")
+        self.timing_tree = ttk.Treeview(timing_frame, columns=columns, show="headings", height=8)
+        for column, text, width in zip(columns, ("函数", "调用次数", "平均(ms)", "最大(ms)"), (220, 100, 100, 100)):
+            self.timing_tree.heading(column, text=text)
+            self.timing_tree.column(column, width=width, anchor="w" if column == "name" else "e")
+        self.timing_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+
+        # 性能采集
+        profile_frame = self.create_card_frame(self.pages["dev"], "性能采集")
+        profile_frame.pack(padx=10, pady=10, fill=tk.X)
+
+        self.profile_btn = ttk.Button(
+            profile_frame,
+            text=f"采集 {self.profile_capture.duration:.0f} 秒",
+            command=self.start_profile_capture,
+            style="Primary.TButton"
+        )
+        self.profile_btn.grid(row=0, column=0, padx=10, pady=10)
+
+        ttk.Button(
+            profile_frame,
+            text="重置统计",
+            command=self.reset_dev_stats,
+            style="Primary.TButton"
+        ).grid(row=0, column=1, padx=10, pady=10)
+
+        self.profile_status_var = tk.StringVar(value="")
+        ttk.Label(profile_frame, textvariable=self.profile_status_var).grid(
+            row=1, column=0, columnspan=2, padx=10, pady=5, sticky="w"
+        )
+
+    def toggle_dev_mode(self):
+        """开启开发者模式需验证密码"""
+        if self.dev_mode_var.get():
+            password = simpledialog.askstring("开发者模式", "请输入密码：", show="*", parent=self.root)
+            if password != DEV_PASSWORD:
+                self.dev_mode_var.set(False)
+                if password is not None:
+                    self.set_status("开发者模式密码错误", logging.WARNING)
+                return
+            self.dev_mode = True
+            self.dev_nav_btn.pack(fill=tk.X, pady=2, after=self.nav_buttons["about"])
+            self.scheduler.call_later(0.5, self.update_dev_page)
+        else:
+            self.dev_mode = False
+            self.dev_nav_btn.pack_forget()
+            if self.pages["dev"].winfo_ismapped():
+                self.show_page("device")
+
+    def update_dev_page(self):
+        """刷新开发者页面指标"""
+        if not self.dev_mode:
+            return
+
+        self.dev_vars["pump"].set(
+            f"{self.pump_monitor.rate():.1f} Hz  抖动 {self.pump_monitor.jitter() * 1000:.1f} ms  超时 {self.pump_monitor.missed}"
+        )
+        self.dev_vars["ffb"].set(
+            f"{self.ffb_monitor.rate():.1f} Hz  抖动 {self.ffb_monitor.jitter() * 1000:.1f} ms  超时 {self.ffb_monitor.missed}"
+        )
+        self.dev_vars["tk_lag"].set(f"{self.tk_lag.lag * 1000:.1f} ms  最大 {self.tk_lag.max_lag * 1000:.1f} ms")
+
+        if self.link:
+            stats = self.link.stats()
+            self.dev_vars["link_rate"].set(f"{stats['bytes_per_sec']:.0f} B/s  {stats['frames_per_sec']:.0f} 帧/s")
+            self.dev_vars["link_errors"].set(f"丢帧 {stats['dropped_frames']}  错误帧 {stats['parse_errors']}")
+            self.dev_vars["queues"].set(f"角度 {stats['angle_queue']}  其他帧 {stats['frame_queue']}")
+        else:
+            for key in ("link_rate", "link_errors", "queues"):
+                self.dev_vars[key].set("未连接")
+
+        if self.vjoy_output:
+            stats = self.vjoy_output.stats()
+            self.dev_vars["vjoy"].set(f"提交 {stats['updates']}  跳过 {stats['skipped']}  错误 {stats['errors']}")
+        else:
+            self.dev_vars["vjoy"].set("不可用")
+
+        if self.telemetry:
+            self.dev_vars["telemetry"].set(
+                f"{self.telemetry.monitor.rate():.0f} 包/s  共 {self.telemetry.packets}  无效 {self.telemetry.invalid}"
+            )
+        else:
+            self.dev_vars["telemetry"].set("未启用")
+
+        if self.safety:
+            limiter = self.safety.limiter
+            state = limiter.fault or "正常"
+            self.dev_vars["safety"].set(f"{state}  输出 {limiter.output:.1f}/{limiter.max_torque:.0f}  故障 {self.safety.faults}")
+        else:
+            self.dev_vars["safety"].set("未连接")
+
+        if self.effects and self.effects.active:
+            stats = self.effects.stats()
+            self.dev_vars["effects"].set(
+                f"效果 {stats['active_effects']}/{stats['slots']}  指令 {stats['commands']}  "
+                f"{stats['bytes_sent']} 字节  未发送周期 {stats['skipped']}"
+            )
+        else:
+            self.dev_vars["effects"].set("未启用（逐周期下发阻力）")
+
+        self.timing_tree.delete(*self.timing_tree.get_children())
+        for name, count, avg, peak in TIMINGS.snapshot():
+            self.timing_tree.insert("", tk.END, values=(name, count, f"{avg * 1000:.3f}", f"{peak * 1000:.3f}"))
+
+        if self.profile_capture.running:
+            self.profile_status_var.set("采集中...")
+        elif self.profile_capture.files:
+            self.profile_status_var.set("已保存：" + "、".join(self.profile_capture.files))
+            self.profile_btn.config(state="normal")
+
+        self.scheduler.call_later(0.5, self.update_dev_page)
+
+    def start_profile_capture(self):
+        """一键采集性能数据"""
+        self.profile_btn.config(state="disabled")
+        self.profile_capture.start()
+
+    def reset_dev_stats(self):
+        """清空函数耗时和界面延迟统计"""
+        TIMINGS.reset()
+        self.tk_lag.max_lag = 0.0
+        self.pump_monitor.missed = 0
+        self.ffb_monitor.missed = 0
+
     def create_card_frame(self, parent, title):
         """创建带有圆角的卡片式框架"""
         frame = ttk.LabelFrame(parent, text=title, padding=10)
@@ -555,193 +1145,344 @@ class MotorGameGUI:
     def toggle_connection(self):
         """切换串口连接状态"""
         if self.is_connected:
-            if self.ser and self.ser.is_open:
-                self.ser.close()
             self.is_connected = False
+            self.manual.skip()  # 断开后不再下发未到达的手动阻力
+            if self.safety:
+                self.safety.stop()
+                self.safety = None
+            self.effects = None
+            if self.link:
+                self.link.close()
+                self.link = None
+            self.link_status_var.set("")
             self.connect_btn.config(text="连接")
             self.status_var.set("未连接")
             self.status_label.configure(foreground=self.warning_color)
-            messagebox.showinfo("提示", "串口已断开")
+            self.set_status("串口已断开", category="serial")
         else:
             try:
                 port = self.port_var.get()
-                self.ser = serial.Serial(port, 115200, timeout=0.1)
+                link_config = self.read_link_settings()
+                self.profiles.update(link=link_config)
+                self.ser = open_serial(port, link_config)
+                self.link = SerialLink(self.ser, clock=self.clock)
+                self.link.add_listener(self.on_angle)
+                self.link.start()
+                self.safety = SafetyWatchdog(self.link, self.profiles.get()["safety"])
+                self.safety.start()
+                self.effects = EffectCompiler(self.link, self.profiles.get()["effects"], self.max_torque)
+                self.link_status_var.set(f"{self.ser.baudrate} bps")
+                if link_config["auto_tune"] or self.effects.enabled:
+                    self.link_status_var.set("链路协商中...")
+                    self.negotiate_result = None
+                    self.negotiating = True
+                    link, effects = self.link, self.effects
+                    self.clock.spawn(lambda: self.negotiate_link(link, link_config, effects), 0.0, name="negotiate")
+                    self.scheduler.call_later(0.2, self.poll_negotiation)
                 self.is_connected = True
                 self.connect_btn.config(text="断开")
                 self.status_var.set("已连接")
                 self.status_label.configure(foreground=self.secondary_color)
-                messagebox.showinfo("提示", f"已连接到 {port}")
+                self.set_status(f"已连接到 {port}（{self.ser.baudrate} bps）", category="serial")
             except Exception as e:
-                messagebox.showerror("错误", f"连接失败：{str(e)}")
+                self.set_status(f"连接失败：{str(e)}", logging.ERROR, "serial")
+
+    def read_link_settings(self):
+        """从界面读取链路参数（在档案原有配置基础上修改）"""
+        link_config = link_settings(self.profiles.get()["link"])
+        try:
+            link_config["baudrate"] = int(self.baud_var.get())
+        except ValueError:
+            pass
+        flow = self.flow_var.get()
+        link_config["rtscts"] = flow == "RTS/CTS"
+        link_config["xonxoff"] = flow == "XON/XOFF"
+        link_config["auto_tune"] = self.auto_tune_var.get()
+        return link_config
+
+    def negotiate_link(self, link, link_config, effects):
+        """协商单步（真实时钟下在后台线程运行，只执行一次）：与固件协商波特率和采样率，并查询固件是否支持本地效果"""
+        try:
+            if link_config["auto_tune"]:
+                self.negotiate_result = link.negotiate(link_config)
+            else:
+                self.negotiate_result = (link.ser.baudrate, None, None)
+            slots = effects.negotiate()
+            if slots:
+                get_logger("ffb").info(f"固件支持本地效果（{slots} 个槽位），弹簧和振动由固件计算，只在变化时发送参数")
+        except Exception as e:
+            self.negotiate_result = None
+            get_logger("serial").error(f"链路协商错误：{e}")
+        finally:
+            self.negotiating = False
+        return STOP
+
+    def poll_negotiation(self):
+        """轮询链路协商结果"""
+        if self.negotiating:
+            self.scheduler.call_later(0.2, self.poll_negotiation)
+            return
+        if not self.is_connected:
+            return
+        if self.negotiate_result is None:
+            text = f"链路协商失败，保持 {self.ser.baudrate} bps"
+        else:
+            baud, rate, error_rate = self.negotiate_result
+            if rate is None:
+                text = f"{baud} bps（固件不支持协商）" if self.auto_tune_var.get() else f"{baud} bps"
+            else:
+                text = f"{baud} bps  采样率 {rate} Hz  误码率 {error_rate * 100:.2f}%"
+            if self.effects is not None and self.effects.active:
+                text += "  本地效果"
+        self.link_status_var.set(text)
+        get_logger("serial").info(f"链路协商结果：{text}")
 
     def send_resistance(self):
         """发送阻力值到设备"""
         if not self.is_connected:
-            messagebox.showwarning("警告", "请先连接串口")
+            self.set_status("请先连接串口", logging.WARNING)
             return
         try:
             resistance = float(self.resistance_var.get())
             if 0 <= resistance <= 100:
-                cmd = f"R:{resistance:.1f}\n"
-                self.ser.write(cmd.encode('utf-8'))
-                self.target_resistance = resistance
-                self.resistance_history.append(resistance)
-                if len(self.resistance_history) > self.max_history:
-                    self.resistance_history.pop(0)
+                self.manual.set(resistance)  # 由力反馈循环经阻力上限和限速逐步下发
                 # 添加按钮动画
                 self.send_btn.configure(style="Success.TButton")
-                self.root.after(200, lambda: self.send_btn.configure(style="Primary.TButton"))
+                self.scheduler.call_later(0.2, lambda: self.send_btn.configure(style="Primary.TButton"))
             else:
-                messagebox.showwarning("警告", "阻力值需在0-100之间")
+                self.set_status("阻力值需在0-100之间", logging.WARNING)
         except ValueError:
-            messagebox.showerror("错误", "请输入有效的数字")
+            self.set_status("请输入有效的数字", logging.WARNING)
+
+    def toggle_recording(self):
+        """开始/停止会话录制"""
+        if self.recorder is None:
+            path = time.strftime("session_%Y%m%d_%H%M%S.rks")
+            self.recorder = SessionRecorder(path)
+            self.record_btn.config(text="停止录制")
+            self.set_status(f"开始录制：{path}", category="ui")
+        else:
+            recorder, self.recorder = self.recorder, None
+            recorder.close()
+            self.record_btn.config(text="开始录制")
+            self.set_status(f"录制已保存：{recorder.path}（{recorder.count} 条记录）", category="ui")
+
+    def toggle_calibration(self):
+        """开始/中止自动校准"""
+        if self.calibrator is not None and self.calibrator.running:
+            self.calibrator.stop()
+            return
+        if not self.is_connected:
+            self.set_status("请先连接串口", logging.WARNING)
+            return
+        self.calibrator = Calibrator(self.link, self.safety, self.clock)  # 校准指令同样经过阻力上限和限速
+        self.calibrator.start()
+        self.calib_btn.config(text="中止校准")
+        self.scheduler.call_later(0.2, self.poll_calibration)
+
+    def poll_calibration(self):
+        """轮询校准进度，完成后写入当前档案"""
+        calibrator = self.calibrator
+        self.calib_status_var.set(calibrator.status)
+        if calibrator.running:
+            self.scheduler.call_later(0.2, self.poll_calibration)
+            return
+
+        self.calib_btn.config(text="开始校准")
+        if calibrator.result:
+            self.calibration = calibrator.result
+            self.state.set_calibration(self.calibration)
+            self.load_predictor(self.profiles.update(calibration=self.calibration))  # 补偿延迟随校准结果更新
+            self.calib_result_var.set(self.format_calibration(self.calibration))
+            self.set_status("校准完成：" + self.format_calibration(self.calibration), category="calibration")
+        elif calibrator.error:
+            self.set_status(calibrator.status, logging.ERROR, "calibration")
+
+    def format_calibration(self, calibration):
+        """格式化校准结果用于显示"""
+        if not calibration:
+            return "未校准（角度相对上电位置，按±180°映射）"
+        return (
+            f"中心偏移 {calibration['center_offset']:.1f}°  行程 {calibration['range']:.1f}°  "
+            f"静摩擦 {calibration['static_friction']:.1f}  动摩擦 {calibration['dynamic_friction']:.1f}  "
+            f"延迟 {calibration['latency'] * 1000:.0f} ms"
+        )
 
+    @TIMINGS.timed("receive_data")
     def receive_data(self):
         """接收来自设备的数据"""
-        if self.is_connected and self.ser:
-            try:
-                data = self.ser.readline().decode('utf-8').strip()
-                if data.startswith("A:"):
-                    self.current_angle = float(data[2:])
-                    self.angle_var.set(f"{self.current_angle:.2f} 度")
-                    self.angle_history.append(self.current_angle)
-                    if len(self.angle_history) > self.max_history:
-                        self.angle_history.pop(0)
-            except Exception as e:
-                pass
-        self.root.after(100, self.receive_data)
-
-    def listen_for_force_feedback(self):
-        """监听游戏力反馈数据"""
+        self.pump_monitor.tick(0.1)
+        if self.is_connected and self.link:
+            # 链路层已在后台批量读取并解析，角度和角速度由读取线程更新，这里一次取走全部新角度用于录制和曲线
+            times, angles = self.link.drain_angles()
+            recorder = self.recorder
+            offset = self.state.center_offset
+            for now, angle in zip(times, angles):
+                angle -= offset  # 相对校准中心
+                if recorder:
+                    recorder.write(now, KIND_ANGLE, angle)
+                self.angle_series.append(now, angle)
+            angle = self.state.angle
+            if angles and angle != self.shown_angle:
+                self.shown_angle = angle
+                self.angle_var.set(f"{angle:.2f} 度")
+            if not self.link.running:
+                self.status_var.set("连接异常")
+                self.status_label.configure(foreground=self.warning_color)
+        self.scheduler.call_later(0.1, self.receive_data)
+
+    def open_vjoy_output(self):
+        """打开 vJoy 设备并启动输出线程，不可用时只记录警告"""
         try:
-            # 加载vJoyInterface.dll
-            dll_path = os.path.join(os.getcwd(), "vJoyInterface.dll")
-            if not os.path.exists(dll_path):
-                print("警告：未找到vJoyInterface.dll，力反馈功能将无法使用")
-                return
-
-            vjoy_dll = ctypes.windll.LoadLibrary(dll_path)
-
-            # 定义函数原型
-            GetVJFFBState = vjoy_dll.GetVJFFBState
-            GetVJFFBState.argtypes = [ctypes.c_int, ctypes.POINTER(ctypes.c_int)]
-            GetVJFFBState.restype = ctypes.c_bool
-
-            # 力反馈状态结构体
-            class FFState(ctypes.Structure):
-                _fields_ = [
-                    ("Device", ctypes.c_int),
-                    ("Enabled", ctypes.c_bool),
-                    ("MasterGain", ctypes.c_int),
-                    ("ConditionCount", ctypes.c_int),
-                    ("Conditions", ctypes.c_int * 8),  # 简化版本，实际有更多字段
-                    ("PeriodicCount", ctypes.c_int),
-                    ("Periodics", ctypes.c_int * 8),
-                    ("ConstantCount", ctypes.c_int),
-                    ("Constants", ctypes.c_int * 8),
-                    ("RampCount", ctypes.c_int),
-                    ("Ramps", ctypes.c_int * 8),
-                    ("EffectCount", ctypes.c_int),
-                    ("Effects", ctypes.c_int * 8)
-                ]
-
-            ff_state = FFState()
-            device_id = 1  # vJoy设备ID
-
-            while True:
-                if self.is_connected and self.mode == "auto" and self.enable_ff_var.get():
-                    if GetVJFFBState(device_id, ctypes.byref(ff_state)):
-                        # 提取力反馈数据（简化版，仅使用主增益）
-                        self.force_feedback = ff_state.MasterGain / 100.0  # 转换为0-100
-
-                        # 应用增益和死区
-                        adjusted_force = self.force_feedback * self.ff_gain
-                        if abs(adjusted_force) < self.ff_deadzone / 100.0:
-                            adjusted_force = 0
-
-                        self.ff_var.set(f"{adjusted_force:.2f}")
-
-                        # 计算阻力值
-                        resistance = min(100, max(0, adjusted_force * 100))  # 转换为0-100
-                        self.target_resistance = resistance
-                        self.resistance_history.append(resistance)
-                        if len(self.resistance_history) > self.max_history:
-                            self.resistance_history.pop(0)
-
-                        # 发送到ESP32
-                        cmd = f"R:{resistance:.1f}\n"
-                        self.ser.write(cmd.encode('utf-8'))
-                time.sleep(0.05)  # 20Hz采样率
+            import pyvjoy
+            self.vjoy_device = pyvjoy.VJoyDevice(self.vjoy_id)
         except Exception as e:
-            print(f"力反馈监听错误：{e}")
+            get_logger("ffb").warning(f"vJoy 设备不可用，方向盘角度不会输出到游戏：{e}")
+            return
+        self.vjoy_output = VJoyOutput(self.vjoy_device, clock=self.clock)
+        self.vjoy_output.start()
+
+    def load_predictor(self, profile):
+        """按档案和校准结果创建角度预测器，未启用时为 None"""
+        config = predictor_settings(profile["predictor"], self.calibration)
+        self.predictor = AnglePredictor(**config) if config["enabled"] else None
+
+    def on_angle(self, timestamp, angle):
+        """
+        串口链路回调（读取线程）：更新角度状态，每帧角度（启用预测时为外推后的角度）直接映射到 vJoy X 轴，
+        不经过界面线程；录制时同时记录预测后的输出，供 predictor.py 离线对比
+        """
+        state = self.state
+        angle = state.update_angle(timestamp, angle)
+        predictor = self.predictor
+        if predictor is not None:
+            angle = predictor.update(timestamp, angle)
+            recorder = self.recorder
+            if recorder:
+                recorder.write(timestamp, KIND_AXIS, angle)
+        if self.vjoy_output is not None:
+            self.vjoy_output.set_axis("x", angle_to_axis(angle, state.half_range))
+
+    def load_vjoy_ffb(self):
+        """加载 vJoyInterface.dll 的力反馈接口，返回 (GetVJFFBState, 状态结构体)，不可用时返回 (None, None)"""
+        GetVJFFBState, ff_state = load_vjoy_ffb()
+        if GetVJFFBState is None:
+            get_logger("ffb").warning("未找到vJoyInterface.dll，vJoy 力反馈将无法使用（遥测力源不受影响）")
+        return GetVJFFBState, ff_state
+
+    def open_ffb_source(self):
+        """加载 vJoy 力反馈接口，返回 ffb_tick 的参数 (GetVJFFBState, 状态结构体, 结构体指针, 设备 ID)"""
+        try:
+            GetVJFFBState, ff_state = self.load_vjoy_ffb()
+        except Exception as e:
+            get_logger("ffb").warning(f"vJoy 力反馈加载失败：{e}")
+            GetVJFFBState, ff_state = None, None
+        ff_ref = ctypes.byref(ff_state) if ff_state is not None else None  # 复用同一个指针参数
+        return GetVJFFBState, ff_state, ff_ref, self.vjoy_id
+
+    def ffb_step(self):
+        """力反馈循环单步：监听游戏力反馈数据（vJoy 力反馈或 UDP 遥测）并下发阻力；窗口关闭或出错时结束循环"""
+        if self.closing:
+            return STOP
+        try:
+            if self.ffb_source is None:
+                self.ffb_source = self.open_ffb_source()
+            self.ffb_monitor.tick(FFB_INTERVAL, self.clock.now())
+            calibrating = self.calibrator is not None and self.calibrator.running
+            busy = calibrating or self.negotiating
+            if self.is_connected and self.mode == "auto" and self.enable_ff_var.get() and not busy:
+                self.manual.skip()
+                with TIMINGS.measure("ffb_tick"):
+                    self.ffb_tick(*self.ffb_source)
+            elif self.is_connected and self.safety and self.manual.pending() and not busy:
+                self.manual_tick()
+            elif self.safety and not calibrating:
+                self.safety.release()  # 循环未驱动阻力，看门狗不检查其截止时间（校准时由校准器驱动）
+                if self.effects is not None and self.effects.active and not busy:
+                    self.effects.release()  # 手动模式下不保留游戏的弹簧和振动
+        except Exception as e:
+            get_logger("ffb").exception(f"力反馈监听错误：{e}")
+            return STOP
+        return None
+
+    def ffb_tick(self, GetVJFFBState, ff_state, ff_ref, device_id):
+        """力反馈循环单次处理：读取力反馈（遥测或 vJoy）并下发阻力"""
+        state = self.state
+        telemetry = self.telemetry
+        effects = self.effects
+        if effects is not None and not effects.active:
+            effects = None
+        if telemetry is not None:
+            # 本地效果可用时回正和路肩震动由固件计算，主机只下发恒定部分
+            state.force = telemetry.force() if effects is None else effects.compile_telemetry(telemetry, self.ff_gain)
+        elif GetVJFFBState is not None and GetVJFFBState(device_id, ff_ref):
+            # 提取力反馈数据（简化版，仅使用主增益）
+            state.force = ff_state.MasterGain / 100.0  # 转换为0-100
+        else:
+            return
+        safety = self.safety
+        if safety is None:
+            return
 
+        # 增益/死区、摩擦补偿、限幅限速后发送到ESP32（与多设备模式共用）
+        now = self.clock.now()
+        adjusted_force = drive_resistance(state, self.ff_gain, self.ff_deadzone, self.calibration,
+                                          safety, self.link, effects, now)
+        if adjusted_force != state.adjusted_force:
+            self.ff_var.set(f"{adjusted_force:.2f}")  # 数值变化时才格式化并通知界面
+            state.adjusted_force = adjusted_force
+        self.resistance_series.append(now, state.resistance)
+
+        recorder = self.recorder
+        if recorder:
+            recorder.write(now, KIND_FORCE, state.force)
+            recorder.write(now, KIND_RESISTANCE, safety.limiter.output)
+
+    def manual_tick(self):
+        """力反馈循环单次处理（手动模式）：手动阻力经限幅限速后下发，并记录实际下发的值"""
+        now = self.clock.now()
+        resistance = self.manual.step(self.safety, self.link, now)
+        self.state.resistance = resistance
+        self.resistance_series.append(now, resistance)
+        if self.recorder:
+            self.recorder.write(now, KIND_RESISTANCE, resistance)
+
+    @TIMINGS.timed("update_plots")
     def update_plots(self):
         """更新角度和阻力变化曲线"""
-        # 角度曲线
-        self.angle_canvas.delete("all")
-        if len(self.angle_history) >= 2:
-            min_angle = min(self.angle_history)
-            max_angle = max(self.angle_history)
-            range_angle = max_angle - min_angle if max_angle != min_angle else 1
-
-            width = self.angle_canvas.winfo_width() or 850
-            height = self.angle_canvas.winfo_height() or 180
-            x_step = width / (len(self.angle_history) - 1)
-
-            # 绘制背景网格
-            for i in range(5):
-                y = i * height / 4
-                self.angle_canvas.create_line(0, y, width, y, fill="#e0e0e0", dash=(2, 2))
-
-            # 绘制曲线
-            points = []
-            for i in range(len(self.angle_history)):
-                x = i * x_step
-                y = height - ((self.angle_history[i] - min_angle) / range_angle) * (height - 20)
-                points.extend([x, y])
-
-            # 创建平滑曲线
-            if len(points) >= 4:
-                self.angle_canvas.create_line(points, fill=self.primary_color, width=2, smooth=True)
-
-            # 添加标题和坐标轴
-            self.angle_canvas.create_text(width / 2, 15, text="角度变化曲线", font=("SimHei", 10, "bold"))
-            self.angle_canvas.create_text(30, height / 2, text=f"{max_angle:.1f}°", font=("SimHei", 8))
-            self.angle_canvas.create_text(30, height - 20, text=f"{min_angle:.1f}°", font=("SimHei", 8))
-
-        # 阻力曲线
-        self.resistance_canvas.delete("all")
-        if len(self.resistance_history) >= 2:
-            min_resistance = min(self.resistance_history)
-            max_resistance = max(self.resistance_history)
-            range_resistance = max_resistance - min_resistance if max_resistance != min_resistance else 1
-
-            width = self.resistance_canvas.winfo_width() or 850
-            height = self.resistance_canvas.winfo_height() or 180
-            x_step = width / (len(self.resistance_history) - 1)
-
-            # 绘制背景网格
-            for i in range(5):
-                y = i * height / 4
-                self.resistance_canvas.create_line(0, y, width, y, fill="#e0e0e0", dash=(2, 2))
-
-            # 绘制曲线
-            points = []
-            for i in range(len(self.resistance_history)):
-                x = i * x_step
-                y = height - ((self.resistance_history[i] - min_resistance) / range_resistance) * (height - 20)
-                points.extend([x, y])
-
-            # 创建平滑曲线
-            if len(points) >= 4:
-                self.resistance_canvas.create_line(points, fill=self.secondary_color, width=2, smooth=True)
-
-            # 添加标题和坐标轴
-            self.resistance_canvas.create_text(width / 2, 15, text="阻力变化曲线", font=("SimHei", 10, "bold"))
-            self.resistance_canvas.create_text(30, height / 2, text=f"{max_resistance:.1f}", font=("SimHei", 8))
-            self.resistance_canvas.create_text(30, height - 20, text=f"{min_resistance:.1f}", font=("SimHei", 8))
-
-        self.root.after(500, self.update_plots)
+        self.redraw_plots()
+        self.scheduler.call_later(0.2, self.update_plots)
+
+    def redraw_plots(self):
+        """按当前时间窗口重绘全部曲线（绘制开销只与画布宽度有关）"""
+        if not self.pages["data"].winfo_ismapped():
+            return
+        now = self.clock.now()
+        for view in self.plot_views:
+            view.draw(now, self.plot_origin)
+        self.pause_btn.config(text="继续" if self.plot_window.paused else "暂停")
+
+    def toggle_plot_pause(self):
+        """暂停/恢复实时曲线"""
+        if self.plot_window.paused:
+            self.plot_window.follow()
+        else:
+            self.plot_window.pause(self.clock.now())
+        self.redraw_plots()
+
+    def zoom_plots(self, factor):
+        """按钮缩放，以可视范围中心为锚点"""
+        now = self.clock.now()
+        t0, t1 = self.plot_window.range(now)
+        self.plot_window.zoom(factor, now, (t0 + t1) / 2)
+        self.redraw_plots()
+
+    def show_all_plots(self):
+        """显示整个会话"""
+        bounds = self.angle_series.bounds() or self.resistance_series.bounds()
+        start = bounds[0] if bounds else self.plot_origin
+        self.plot_window.show_all(start, self.clock.now())
+        self.redraw_plots()
 
     def save_ff_config(self):
         """保存力反馈配置"""
@@ -749,20 +1490,54 @@ class MotorGameGUI:
         self.ff_deadzone = self.deadzone_var.get()
         self.gain_value_label.config(text=f"{self.ff_gain:.1f}")
         self.deadzone_value_label.config(text=f"{self.ff_deadzone}")
-        messagebox.showinfo("提示", "力反馈配置已保存")
+        self.max_torque = float(self.max_torque_var.get())
+        self.max_torque_label.config(text=f"{self.max_torque:.0f}")
+        safety_config = dict(self.profiles.get()["safety"], max_torque=self.max_torque)
+        self.profiles.update(ff_gain=self.ff_gain, ff_deadzone=self.ff_deadzone, safety=safety_config)
+        if self.safety:
+            self.safety.limiter.set_max_torque(self.max_torque)
+        if self.effects:
+            self.effects.set_max_torque(self.max_torque)
+        self.set_status(
+            f"力反馈配置已保存（增益 {self.ff_gain:.1f}，死区 {self.ff_deadzone}，阻力上限 {self.max_torque:.0f}）",
+            category="config"
+        )
 
     def save_game_config(self):
         """保存游戏配置"""
         selected_game = self.game_var.get()
         enable_ff = self.enable_ff_var.get()
 
-        # 这里可以添加实际保存配置的代码
-        print(f"保存游戏配置: {selected_game}, 力反馈: {'启用' if enable_ff else '禁用'}")
-
-        messagebox.showinfo("提示", f"游戏配置已保存\n游戏: {selected_game}\n力反馈: {'启用' if enable_ff else '禁用'}")
+        # 切换到所选游戏的档案并保存
+        profile = self.profiles.set_active(selected_game)
+        game = self.force_sources[self.force_source_var.get()]
+        if game is None:
+            profile = self.profiles.update(enable_ff=enable_ff, force_source="vjoy")
+        else:
+            telemetry_config = dict(profile["telemetry"], game=game)
+            profile = self.profiles.update(enable_ff=enable_ff, force_source="telemetry", telemetry=telemetry_config)
+        self.apply_force_source(profile)
+        self.ff_gain = profile["ff_gain"]
+        self.ff_deadzone = profile["ff_deadzone"]
+        self.gain_var.set(self.ff_gain)
+        self.deadzone_var.set(self.ff_deadzone)
+        self.gain_value_label.config(text=f"{self.ff_gain:.1f}")
+        self.deadzone_value_label.config(text=f"{self.ff_deadzone}")
+        self.max_torque = safety_settings(profile["safety"])["max_torque"]
+        self.max_torque_var.set(int(self.max_torque))
+        self.max_torque_label.config(text=f"{self.max_torque:.0f}")
+        if self.safety:
+            self.safety.limiter.set_max_torque(self.max_torque)
+        if self.effects:
+            self.effects.set_max_torque(self.max_torque)
+        self.calibration = profile["calibration"]
+        self.state.set_calibration(self.calibration)
+        self.load_predictor(profile)
+        self.calib_result_var.set(self.format_calibration(self.calibration))
+        self.set_status(f"游戏配置已保存：{selected_game}，力反馈{'启用' if enable_ff else '禁用'}", category="config")
 
 
 if __name__ == "__main__":
     root = tk.Tk()
     app = MotorGameGUI(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
\ No newline at end of file
@@ -0,0 +1,100 @@
+"""
+控制计算
+功能：角度到 vJoy 轴值映射、力反馈到阻力换算、历史数据维护和曲线坐标生成，
+不依赖界面和驱动，供各上位机程序和性能基准共用；
+热点路径上的状态用 __slots__ 对象原地更新，阻力指令使用预编码的字节串，每帧不产生新的长期对象
+"""
+
+# pyvjoy 值范围：0（最小）- 16384（中值）- 32768（最大）
+AXIS_MIN = 0
+AXIS_CENTER = 16384
+AXIS_MAX = 32768
+DEFAULT_HALF_RANGE = 180.0  # 未校准时按 -180度（左）- 180度（右）映射
+
+# 预编码的阻力指令：下标为阻力值×10（0.1 精度），发送时直接查表，不做格式化和编码
+RESISTANCE_COMMANDS = tuple(b"R:%.1f\n" % (i / 10) for i in range(1001))
+
+
+def half_range_for(calibration):
+    """由校准结果得到单侧行程（度）"""
+    if calibration and calibration["range"] > 0:
+        return calibration["range"] / 2
+    return DEFAULT_HALF_RANGE
+
+
+def angle_to_axis(angle, half_range=DEFAULT_HALF_RANGE):
+    """将角度映射为 vJoy 轴值"""
+    mapped_value = AXIS_CENTER + int((angle / half_range) * AXIS_CENTER)
+    return max(AXIS_MIN, min(AXIS_MAX, mapped_value))  # 确保在有效范围内
+
+
+def resistance_command(resistance):
+    """返回阻力值（0-100）对应的预编码 R: 指令"""
+    index = int(resistance * 10 + 0.5)
+    return RESISTANCE_COMMANDS[0 if index < 0 else 1000 if index > 1000 else index]
+
+
+class ControlState:
+    """
+    控制路径状态（角度、角速度、阻力、力反馈、计数），读取线程和力反馈循环每帧原地更新，
+    __slots__ 固定布局，不为每帧新建字典
+    """
+
+    __slots__ = ("angle", "velocity", "angle_time", "center_offset", "half_range",
+                 "force", "adjusted_force", "resistance", "frames", "ticks")
+
+    def __init__(self, calibration=None):
+        self.angle = 0.0  # 相对校准中心的角度
+        self.velocity = 0.0  # 角速度（度/秒），用于摩擦补偿
+        self.angle_time = 0.0
+        self.force = 0.0  # 游戏力反馈值
+        self.adjusted_force = 0.0  # 应用增益和死区后的力
+        self.resistance = 0.0  # 目标阻力
+        self.frames = 0  # 收到的角度帧数
+        self.ticks = 0  # 力反馈循环周期数
+        self.set_calibration(calibration)
+
+    def set_calibration(self, calibration):
+        """缓存校准结果中热点路径用到的值，避免每帧查字典"""
+        self.center_offset = calibration["center_offset"] if calibration else 0.0
+        self.half_range = half_range_for(calibration)
+
+    def update_angle(self, now, angle):
+        """输入原始角度，更新角度和角速度，返回相对校准中心的角度"""
+        angle -= self.center_offset
+        if self.frames and now > self.angle_time:
+            self.velocity = (angle - self.angle) / (now - self.angle_time)
+        self.angle_time = now
+        self.angle = angle
+        self.frames += 1
+        return angle
+
+
+def force_to_resistance(force, gain, deadzone):
+    """应用增益和死区，返回 (调整后的力, 0-100 阻力值)"""
+    adjusted_force = force * gain
+    if abs(adjusted_force) < deadzone / 100.0:
+        adjusted_force = 0
+    return adjusted_force, min(100, max(0, adjusted_force * 100))
+
+
+def append_history(history, values, max_history):
+    """追加历史数据并裁剪到最大长度"""
+    history.extend(values)
+    if len(history) > max_history:
+        del history[:-max_history]
+
+
+def curve_points(history, width, height, margin=20):
+    """生成曲线坐标，按数据自身的最小/最大值缩放，返回 (坐标列表, 最小值, 最大值)"""
+    min_value = min(history)
+    max_value = max(history)
+    value_range = max_value - min_value if max_value != min_value else 1
+    x_step = width / (len(history) - 1)
+    scale = (height - margin) / value_range
+
+    points = []
+    for i, value in enumerate(history):
+        points.append(i * x_step)
+        points.append(height - (value - min_value) * scale)
+    return points, min_value, max_value
@@ -0,0 +1,197 @@
+"""
+开发者诊断工具
+功能：函数耗时统计、循环频率/抖动监测、Tk 事件循环延迟监测，
+以及一键采样分析（全线程统计采样 + 界面线程 cProfile），结果写入文件
+"""
+
+import contextlib
+import cProfile
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import deque
+
+
+class FunctionTimings:
+    """按名称累计调用次数、总耗时和最大耗时"""
+
+    def __init__(self):
+        self.stats = {}  # 名称 -> [次数, 总耗时, 最大耗时]
+
+    def record(self, name, elapsed):
+        entry = self.stats.get(name)
+        if entry is None:
+            self.stats[name] = [1, elapsed, elapsed]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed
+            if elapsed > entry[2]:
+                entry[2] = elapsed
+
+    def timed(self, name):
+        """装饰器：统计函数耗时"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                t0 = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - t0)
+            return wrapper
+        return decorator
+
+    @contextlib.contextmanager
+    def measure(self, name):
+        """上下文管理器：统计代码块耗时"""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t0)
+
+    def snapshot(self):
+        """返回 [(名称, 次数, 平均耗时, 最大耗时)]，按总耗时降序"""
+        rows = [(name, count, total / count, peak) for name, (count, total, peak) in list(self.stats.items())]
+        rows.sort(key=lambda row: row[1] * row[2], reverse=True)
+        return rows
+
+    def reset(self):
+        self.stats.clear()
+
+
+# 全局耗时统计，各模块用 @TIMINGS.timed("名称") 标注需要关注的函数
+TIMINGS = FunctionTimings()
+
+
+class LoopMonitor:
+    """记录循环每次执行的时间戳，计算频率和抖动"""
+
+    def __init__(self, window=200):
+        self.ticks = deque(maxlen=window)
+        self.missed = 0  # 超过期望周期两倍的次数
+
+    def tick(self, expected_interval=None, now=None):
+        if now is None:
+            now = time.perf_counter()
+        if expected_interval and self.ticks and now - self.ticks[-1] > expected_interval * 2:
+            self.missed += 1
+        self.ticks.append(now)
+
+    def rate(self):
+        """频率（Hz）"""
+        if len(self.ticks) < 2:
+            return 0.0
+        span = self.ticks[-1] - self.ticks[0]
+        return (len(self.ticks) - 1) / span if span > 0 else 0.0
+
+    def jitter(self):
+        """周期抖动（周期的标准差，秒）"""
+        if len(self.ticks) < 3:
+            return 0.0
+        ticks = list(self.ticks)
+        intervals = [b - a for a, b in zip(ticks, ticks[1:])]
+        mean = sum(intervals) / len(intervals)
+        return (sum((x - mean) ** 2 for x in intervals) / len(intervals)) ** 0.5
+
+
+class TkLagMonitor:
+    """定时调度 after() 回调，测量实际执行时间与预期的差值（事件循环延迟）"""
+
+    def __init__(self, root, interval_ms=100):
+        self.root = root
+        self.interval_ms = interval_ms
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.expected = None
+        self.schedule()
+
+    def schedule(self):
+        self.expected = time.perf_counter() + self.interval_ms / 1000.0
+        self.root.after(self.interval_ms, self.check)
+
+    def check(self):
+        self.lag = max(0.0, time.perf_counter() - self.expected)
+        self.max_lag = max(self.max_lag, self.lag)
+        self.schedule()
+
+
+class SamplingProfiler:
+    """统计采样分析：定时采集所有线程调用栈，按折叠栈格式（可用 flamegraph 工具绘图）写入文件"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = {}
+        self.sample_count = 0
+
+    def sample(self):
+        own_id = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            stack.append(names.get(thread_id, str(thread_id)))
+            key = ";".join(reversed(stack))
+            self.samples[key] = self.samples.get(key, 0) + 1
+        self.sample_count += 1
+
+    def run(self, duration):
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            self.sample()
+            time.sleep(self.interval)
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.samples.items(), key=lambda item: item[1], reverse=True):
+                f.write(f"{stack} {count}\n")
+
+
+class ProfileCapture:
+    """一键性能采集：后台线程做全线程统计采样，同时在界面线程开启 cProfile"""
+
+    def __init__(self, root, duration=5.0, prefix="profile"):
+        self.root = root
+        self.duration = duration
+        self.prefix = prefix
+        self.running = False
+        self.files = []
+
+    def start(self):
+        """开始采集，结束后结果写入 <prefix>_<时间>.txt（折叠栈）和 .prof/.stats.txt（cProfile）"""
+        if self.running:
+            return
+        self.running = True
+        self.files = []
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        self.base = f"{self.prefix}_{stamp}"
+
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+        self.sampler = SamplingProfiler()
+        self.thread = threading.Thread(target=self.sampler.run, args=(self.duration,), daemon=True)
+        self.thread.start()
+        self.root.after(int(self.duration * 1000), self.finish)
+
+    def finish(self):
+        self.profiler.disable()
+        self.thread.join()
+
+        self.sampler.write(self.base + ".txt")
+        self.profiler.dump_stats(self.base + ".prof")
+        text = io.StringIO()
+        pstats.Stats(self.profiler, stream=text).sort_stats("cumulative").print_stats(40)
+        with open(self.base + ".stats.txt", "w", encoding="utf-8") as f:
+            f.write(text.getvalue())
+
+        self.files = [self.base + ".txt", self.base + ".prof", self.base + ".stats.txt"]
+        self.running = False
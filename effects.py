@@ -0,0 +1,284 @@
+"""
+本地力反馈效果
+功能：把弹簧、阻尼、周期振动等效果的参数上传到下位机，由固件在每个角度采样时本地计算力矩，
+刚度和阻尼环路不经过串口和上位机循环；上位机只在游戏改变效果时发送有变化的参数（超过容差才重发），
+恒定力仍使用 R: 指令，同样只在变化时发送；esp32_sim 使用同一个 EffectModel，可在没有硬件时验证
+
+协议：
+    主机 -> 固件  E?                                查询是否支持本地效果
+    固件 -> 主机  E:OK,<槽位数>                       支持；旧固件不应答，主机继续每周期下发 R:
+    主机 -> 固件  E:M,<力矩上限>                      本地效果与 R: 阻力求和后的上限
+    主机 -> 固件  E:<槽>,S,<中心(度)>,<刚度>,<饱和>     弹簧：-刚度×(角度-中心)，限幅 ±饱和
+    主机 -> 固件  E:<槽>,D,<系数>,<饱和>               阻尼：-系数×角速度（度/秒），限幅 ±饱和
+    主机 -> 固件  E:<槽>,P,<频率Hz>,<幅度>,<波形>       周期振动：波形 0 正弦、1 方波
+    主机 -> 固件  E:<槽>,X                            删除槽位
+    主机 -> 固件  E:CLR                               删除全部效果
+力矩与 R: 阻力同单位（100 对应电机满量程），正值使角度增大；固件看门狗超时时本地效果和阻力一起降为 0
+"""
+
+import math
+
+from control import resistance_command
+from event_log import get_logger
+
+logger = get_logger("ffb")
+
+QUERY_TIMEOUT = 0.3  # 等待固件应答 E? 的时间（秒）
+MAX_SLOTS = 8  # 模拟器提供的槽位数
+SINE, SQUARE = 0, 1  # 周期振动波形
+
+# 效果类型 -> 参数个数
+KINDS = {
+    b"S": 3,  # 弹簧
+    b"D": 2,  # 阻尼
+    b"P": 3,  # 周期振动
+}
+
+# 默认本地效果配置，保存在配置档案的 "effects" 字段中
+DEFAULT_EFFECTS = {
+    "offload": True,  # 固件支持时把弹簧/振动交给固件计算
+    "tolerance": 0.02,  # 效果参数相对变化超过该比例才重发
+    "resistance_step": 0.5,  # 恒定阻力变化超过该值才重发 R:
+    "spring_angle": 90.0,  # 回正弹簧：方向盘转过该角度时回正力达到遥测回正增益
+    "damper": 0.0,  # 固定阻尼系数（阻力/(度/秒)），0 表示不启用
+    "damper_saturation": 30.0,  # 阻尼力上限
+}
+
+
+def effect_settings(settings=None):
+    """合并档案中的本地效果配置与默认值"""
+    config = dict(DEFAULT_EFFECTS)
+    config.update(settings or {})
+    return config
+
+
+class EffectModel:
+    """本地效果模型（固件与模拟器执行同一套计算）：各槽位力矩求和后按上限限幅"""
+
+    __slots__ = ("slots", "max_torque", "gain")
+
+    def __init__(self, slot_count=MAX_SLOTS):
+        self.slots = [None] * slot_count  # 每个槽位 (类型, 参数1, 参数2, 参数3) 或 None
+        self.max_torque = 100.0
+        self.gain = 1.0  # 看门狗超时后渐降到 0，收到主机指令后恢复
+
+    def apply(self, line):
+        """处理一条 E: 指令（不含换行），格式错误返回 False"""
+        body = line[2:]
+        if body == b"CLR":
+            self.slots = [None] * len(self.slots)
+            return True
+        fields = body.split(b",")
+        try:
+            if fields[0] == b"M":
+                self.max_torque = float(fields[1])
+                return True
+            slot = int(fields[0])
+            if not 0 <= slot < len(self.slots):
+                return False
+            kind = fields[1]
+            if kind == b"X":
+                self.slots[slot] = None
+                return True
+            params = [float(value) for value in fields[2:]]
+        except (IndexError, ValueError):
+            return False
+        if KINDS.get(kind) != len(params):
+            return False
+        self.slots[slot] = (kind, *params, 0.0) if len(params) == 2 else (kind, *params)
+        return True
+
+    def torque(self, angle, velocity, t, base=0.0):
+        """当前角度（度）、角速度（度/秒）和时间（秒）下的电机力矩：R: 阻力 base 加本地效果，按上限限幅"""
+        total = 0.0
+        for effect in self.slots:
+            if effect is None:
+                continue
+            kind, a, b, c = effect
+            if kind == b"S":
+                value = -b * (angle - a)
+                total += c if value > c else -c if value < -c else value
+            elif kind == b"D":
+                value = -a * velocity
+                total += b if value > b else -b if value < -b else value
+            elif c == SQUARE:
+                total += b if (t * a) % 1.0 < 0.5 else -b
+            else:
+                total += b * math.sin(2 * math.pi * a * t)
+        total = base + total * self.gain
+        limit = self.max_torque
+        return limit if total > limit else -limit if total < -limit else total
+
+
+class EffectCompiler:
+    """
+    上位机效果编译器：按名称维护期望的效果描述，分配固件槽位，flush 时只发送变化的槽位；
+    恒定阻力通过 send_resistance 发送，同样只在变化超过 resistance_step 时写串口
+    """
+
+    def __init__(self, link, settings=None, max_torque=100.0):
+        config = effect_settings(settings)
+        self.link = link
+        self.enabled = config["offload"]
+        self.tolerance = config["tolerance"]
+        self.resistance_step = config["resistance_step"]
+        self.spring_angle = config["spring_angle"]
+        self.damper = config["damper"]
+        self.damper_saturation = config["damper_saturation"]
+        self.max_torque = max_torque
+        self.limit_changed = False  # 力矩上限已修改，下次 flush 时发送 E:M
+
+        self.slot_count = 0  # 固件槽位数，0 表示不支持或未协商
+        self.names = {}  # 效果名称 -> 槽位
+        self.desired = {}  # 槽位 -> 期望的 (类型, 参数...)
+        self.sent = {}  # 槽位 -> 已发送的 (类型, 参数...)
+        self.sent_resistance = None
+
+        # 统计
+        self.commands = 0
+        self.bytes_sent = 0
+        self.skipped = 0  # 因变化未超过容差而未发送的周期
+
+    @property
+    def active(self):
+        return self.enabled and self.slot_count > 0
+
+    def negotiate(self, timeout=QUERY_TIMEOUT):
+        """查询固件是否支持本地效果，支持时设置力矩上限和固定阻尼，返回槽位数（不支持为 0）"""
+        if not self.enabled:
+            return 0
+        self.link.frames.clear()
+        self.link.write(b"E?\n")
+        reply = self.link.wait_frame(b"E:", timeout)
+        self.slot_count = 0
+        if reply is not None and reply.startswith(b"E:OK"):
+            try:
+                self.slot_count = int(reply.split(b",")[1])
+            except (IndexError, ValueError):
+                logger.warning(f"本地效果应答格式错误：{reply!r}")
+        if not self.slot_count:
+            return 0
+        self.clear()
+        self.flush()
+        return self.slot_count
+
+    def write(self, command):
+        self.link.write(command)
+        self.commands += 1
+        self.bytes_sent += len(command)
+
+    def set(self, name, kind, *params):
+        """设置效果（在下次 flush 时发送），没有空闲槽位时忽略"""
+        slot = self.names.get(name)
+        if slot is None:
+            used = set(self.names.values())
+            free = [i for i in range(self.slot_count) if i not in used]
+            if not free:
+                logger.warning(f"本地效果槽位已满，忽略效果 {name}")
+                return
+            slot = self.names[name] = free[0]
+        self.desired[slot] = (kind, *params)
+
+    def remove(self, name):
+        slot = self.names.pop(name, None)
+        if slot is not None:
+            self.desired.pop(slot, None)
+
+    def changed(self, old, new):
+        """效果类型不同或任一参数的相对变化超过容差"""
+        if old is None or old[0] != new[0]:
+            return True
+        tolerance = self.tolerance
+        return any(abs(b - a) > tolerance * max(abs(a), 1.0) for a, b in zip(old[1:], new[1:]))
+
+    def set_max_torque(self, max_torque):
+        """修改力矩上限（可在其他线程调用），下次发送时生效"""
+        self.max_torque = max_torque
+        self.limit_changed = True
+
+    def flush(self):
+        """发送新增、变化和删除的槽位，返回发送的指令数"""
+        count = 0
+        if self.limit_changed:
+            self.limit_changed = False
+            self.write(b"E:M,%.1f\n" % self.max_torque)
+            count += 1
+        for slot in list(self.sent):
+            if slot not in self.desired:
+                self.write(b"E:%d,X\n" % slot)
+                del self.sent[slot]
+                count += 1
+        for slot, effect in self.desired.items():
+            if self.changed(self.sent.get(slot), effect):
+                params = b"".join(b",%.4g" % value for value in effect[1:])
+                self.write(b"E:%d,%s%s\n" % (slot, effect[0], params))
+                self.sent[slot] = effect
+                count += 1
+        return count
+
+    def clear(self):
+        """删除固件中的全部效果并重设力矩上限，固定阻尼和之后的恒定阻力会在下次发送时重新上传"""
+        self.limit_changed = False
+        self.write(b"E:CLR\n")
+        self.write(b"E:M,%.1f\n" % self.max_torque)
+        self.names.clear()
+        self.desired.clear()
+        self.sent.clear()
+        self.sent_resistance = None
+        if self.damper > 0:
+            self.set("damper", b"D", self.damper, self.damper_saturation)
+
+    def compile_telemetry(self, listener, gain, now=None):
+        """
+        把遥测力源编译为本地效果：回正力矩改为刚度随车速和抓地衰减的回正弹簧，路肩震动改为方波振动；
+        返回仍由主机下发的恒定部分（路面颠簸，0-1）
+        """
+        if now is None:
+            now = listener.clock.now()
+        state = listener.state
+        fresh = listener.last_packet is not None and now - listener.last_packet <= listener.timeout
+        if not fresh or not state.on_track:
+            self.remove("spring")
+            self.remove("kerb")
+            return 0.0
+
+        effects = listener.effects
+        stiffness = effects.sat_gain * effects.sat_scale(state) * gain * 100.0 / self.spring_angle
+        self.set("spring", b"S", 0.0, stiffness, min(100.0, 100.0 * gain))
+        if state.kerb:
+            self.set("kerb", b"P", effects.kerb_rate, effects.kerb_gain * gain * 50.0, SQUARE)
+        else:
+            self.remove("kerb")
+        return state.surface * effects.road_gain
+
+    def send_resistance(self, resistance, fault=None):
+        """
+        每个力反馈周期调用：发送变化的效果和恒定阻力，返回是否写了串口；
+        安全故障时删除全部本地效果（阻力由安全监督线程降为 0）
+        """
+        if fault:
+            self.release()
+            return False
+        sent = self.flush() > 0
+        last = self.sent_resistance
+        if last is None or abs(resistance - last) >= self.resistance_step or (resistance == 0) != (last == 0):
+            self.write(resistance_command(resistance))
+            self.sent_resistance = resistance
+            sent = True
+        if not sent:
+            self.skipped += 1
+        return sent
+
+    def release(self):
+        """力反馈循环暂停或安全故障时删除固件中的本地效果"""
+        if self.sent or self.sent_resistance is not None:
+            self.clear()
+
+    def stats(self):
+        return {
+            "slots": self.slot_count,
+            "active_effects": len(self.sent),
+            "commands": self.commands,
+            "bytes_sent": self.bytes_sent,
+            "skipped": self.skipped,
+        }
@@ -0,0 +1,256 @@
+"""
+ESP32 下位机模拟器（Linux/macOS，基于伪终端 pty）
+功能：实现与下位机相同的串口协议（R: 阻力、A: 角度、L:/P: 链路协商、W:/H: 看门狗与心跳、E: 本地效果），
+内置简单的方向盘电机模型（惯量、静/动摩擦、端点限位、指令延迟），本地效果使用与固件相同的 effects.EffectModel，
+可在没有硬件时连接上位机程序或运行端到端性能测试；transport="memory" 时不创建伪终端，
+上位机通过内存串口 simulator.serial 直接交换数据，配合虚拟时钟（sim_clock.py）做确定性测试
+用法：python esp32_sim.py [采样率Hz]，然后在上位机中连接打印出的串口路径
+"""
+
+import os
+import select
+import sys
+import time
+from collections import deque
+
+from effects import EffectModel
+from sim_clock import CLOCK, STOP
+
+WATCHDOG_FADE_TIME = 0.5  # 看门狗超时后阻力降到 0 的时间（秒）
+RX_BUFFER = 65536  # 内存串口接收缓冲大小（字节），上位机未及时读取时丢弃新数据
+
+
+class WheelModel:
+    """方向盘电机模型：阻力值视为 0-100 的电机力矩指令"""
+
+    def __init__(self, static_friction=12.0, dynamic_friction=8.0, inertia=0.02, damping=0.05,
+                 torque_gain=0.5, half_range=450.0, spring=0.0):
+        self.static_friction = static_friction
+        self.dynamic_friction = dynamic_friction
+        self.inertia = inertia
+        self.damping = damping
+        self.torque_gain = torque_gain
+        self.half_range = half_range
+        self.spring = spring  # 回位弹簧刚度（力矩/度），0 表示没有弹簧
+        self.angle = 0.0
+        self.velocity = 0.0
+        self.resistance = 0.0
+        self.driver_torque = 0.0  # 模拟驾驶者施加的力矩
+
+    def step(self, dt):
+        """推进 dt 秒"""
+        torque = self.resistance + self.driver_torque - self.spring * self.angle
+        if self.velocity == 0.0:
+            # 静止：力矩不超过静摩擦则保持不动
+            if abs(torque) <= self.static_friction:
+                return
+            friction = self.dynamic_friction if torque > 0 else -self.dynamic_friction
+        else:
+            friction = self.dynamic_friction if self.velocity > 0 else -self.dynamic_friction
+
+        acceleration = (torque - friction - self.damping * self.velocity) * self.torque_gain / self.inertia
+        new_velocity = self.velocity + acceleration * dt
+        # 速度过零时由摩擦停住
+        if self.velocity != 0.0 and (new_velocity > 0) != (self.velocity > 0):
+            new_velocity = 0.0
+        self.velocity = new_velocity
+        self.angle += self.velocity * dt
+
+        # 端点限位
+        if abs(self.angle) >= self.half_range:
+            self.angle = self.half_range if self.angle > 0 else -self.half_range
+            self.velocity = 0.0
+
+
+class MemorySerial:
+    """内存串口（上位机一侧）：提供 SerialLink 用到的 pyserial 接口，数据直接与模拟器交换"""
+
+    def __init__(self, simulator):
+        self.simulator = simulator
+        self.rx = bytearray()  # 模拟器 -> 上位机
+        self.baudrate = 115200
+        self.is_open = True
+
+    @property
+    def in_waiting(self):
+        return len(self.rx)
+
+    def read(self, size=1):
+        data = bytes(self.rx[:size])
+        del self.rx[:size]
+        return data
+
+    def readinto(self, buffer):
+        size = min(len(buffer), len(self.rx))
+        with memoryview(self.rx) as rx:
+            buffer[:size] = rx[:size]
+        del self.rx[:size]
+        return size
+
+    def write(self, data):
+        self.simulator.inbound += data
+        return len(data)
+
+    def close(self):
+        self.is_open = False
+
+
+class Esp32Simulator:
+    def __init__(self, sample_rate=500, latency=0.005, model=None, clock=None, transport="pty"):
+        self.sample_rate = sample_rate
+        self.latency = latency  # 阻力指令生效延迟（秒）
+        self.model = model or WheelModel()
+        self.effects = EffectModel()  # 本地效果，与 R: 阻力求和后作为电机力矩
+        self.command = 0.0  # 最近生效的 R: 阻力
+        self.clock = clock or CLOCK
+        self.running = False
+        self.thread = None
+        self.last = self.next_tick = 0.0
+
+        if transport == "memory":
+            self.serial = MemorySerial(self)
+            self.port = None
+            self.master_fd = self.slave_fd = None
+        else:
+            # 伪终端：上位机打开 port，模拟器读写 master
+            import tty
+            self.serial = None
+            self.master_fd, self.slave_fd = os.openpty()
+            tty.setraw(self.slave_fd)
+            os.set_blocking(self.master_fd, False)
+            self.port = os.ttyname(self.slave_fd)
+
+        self.inbound = bytearray()
+        self.pending_commands = deque()  # (生效时间, 阻力值)
+        self.received_commands = 0
+
+        # 看门狗：W:<超时ms> 启用，超时未收到任何指令时阻力渐降到 0
+        self.watchdog_timeout = 0.0
+        self.last_host_time = self.clock.now()
+        self.watchdog_tripped = False
+
+    def start(self):
+        """启动模拟循环（真实时钟下为线程）"""
+        self.running = True
+        self.last = self.next_tick = self.clock.now()
+        self.thread = self.clock.spawn(self.step, 0.0, name="esp32-sim")
+
+    def stop(self):
+        """停止模拟并关闭伪终端"""
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+        if self.master_fd is not None:
+            os.close(self.master_fd)
+            os.close(self.slave_fd)
+            self.master_fd = self.slave_fd = None
+
+    def send(self, data):
+        """向上位机发送数据，缓冲区满（上位机未读取）时丢弃，与真实串口一致"""
+        if self.serial is not None:
+            if len(self.serial.rx) + len(data) <= RX_BUFFER:
+                self.serial.rx += data
+            return
+        try:
+            os.write(self.master_fd, data)
+        except BlockingIOError:
+            pass
+
+    def handle_line(self, line, now):
+        """处理一行上位机指令"""
+        line = line.strip()
+        self.last_host_time = now
+        self.watchdog_tripped = False
+        self.effects.gain = 1.0
+        if line == b"H:":
+            pass  # 心跳只用于喂狗
+        elif line.startswith(b"W:"):
+            try:
+                self.watchdog_timeout = int(line[2:]) / 1000.0
+            except ValueError:
+                pass
+        elif line.startswith(b"R:"):
+            try:
+                self.pending_commands.append((now + self.latency, float(line[2:])))
+                self.received_commands += 1
+            except ValueError:
+                pass
+        elif line == b"E?":
+            self.send(b"E:OK,%d\r\n" % len(self.effects.slots))
+        elif line.startswith(b"E:"):
+            self.effects.apply(line)
+        elif line.startswith(b"P:"):
+            self.send(line + b"\r\n")  # 探测帧原样回传
+        elif line == b"L:ACK":
+            pass  # 伪终端无需真正切换波特率
+        elif line.startswith(b"L:"):
+            # 伪终端没有真实波特率，只按协议应答并调整采样率
+            try:
+                _, rate = line[2:].split(b",")
+                self.sample_rate = int(rate)
+                self.send(b"L:OK\r\n")
+            except ValueError:
+                self.send(b"L:NO\r\n")
+
+    def poll_input(self, now):
+        """读取并处理上位机发来的数据（内存串口的数据已由上位机直接写入 inbound）"""
+        while self.master_fd is not None and select.select([self.master_fd], [], [], 0)[0]:
+            try:
+                data = os.read(self.master_fd, 4096)
+            except (BlockingIOError, OSError):
+                break
+            if not data:
+                break
+            self.inbound += data
+        start = 0
+        while True:
+            end = self.inbound.find(b"\n", start)
+            if end < 0:
+                break
+            self.handle_line(bytes(self.inbound[start:end]), now)
+            start = end + 1
+        del self.inbound[:start]
+
+        while self.pending_commands and self.pending_commands[0][0] <= now:
+            self.command = self.pending_commands.popleft()[1]
+
+    def check_watchdog(self, now, dt):
+        """看门狗超时后按固定速率把阻力和本地效果降到 0，直到再次收到上位机指令"""
+        if self.watchdog_timeout <= 0 or now - self.last_host_time <= self.watchdog_timeout:
+            return
+        self.watchdog_tripped = True
+        self.pending_commands.clear()
+        self.command = max(0.0, self.command - 100.0 / WATCHDOG_FADE_TIME * dt)
+        self.effects.gain = max(0.0, self.effects.gain - dt / WATCHDOG_FADE_TIME)
+
+    def step(self):
+        """模拟循环单步：推进模型并上报角度，返回到下一个采样时刻的等待时间"""
+        if not self.running:
+            return STOP
+        clock = self.clock
+        now = clock.now()
+        self.poll_input(now)
+        self.check_watchdog(now, now - self.last)
+        model = self.model
+        model.resistance = self.effects.torque(model.angle, model.velocity, now, self.command)
+        model.step(now - self.last)
+        self.last = now
+        self.send(b"A:%.2f\r\n" % model.angle)
+
+        self.next_tick += 1.0 / self.sample_rate
+        delay = self.next_tick - clock.now()
+        if delay <= 0:
+            self.next_tick = clock.now()  # 落后时不补偿
+            return 0.0
+        return delay
+
+
+if __name__ == "__main__":
+    simulator = Esp32Simulator(sample_rate=int(sys.argv[1]) if len(sys.argv) > 1 else 500)
+    simulator.start()
+    print(f"模拟 ESP32 已启动，串口：{simulator.port}（Ctrl+C 退出）")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        simulator.stop()
@@ -0,0 +1,143 @@
+"""
+事件日志
+功能：基于 logging 的结构化日志，调用方只把记录放入队列（不阻塞界面和控制线程），
+由后台线程写入按大小或按时间轮转的日志文件，并保存到内存环形缓冲区供日志页面筛选、导出
+"""
+
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from collections import deque
+
+LOG_FILE = "motor_game_logs.txt"
+ROOT_LOGGER = "rickytech"
+MAX_RECORDS = 200000  # 内存中保留的日志条数
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+# 日志分类：对应 rickytech.<分类> 子日志器
+CATEGORIES = {
+    "serial": "串口",
+    "ffb": "力反馈",
+    "config": "配置",
+    "calibration": "校准",
+    "safety": "安全",
+    "ui": "界面",
+    "fleet": "多机",
+}
+
+LEVELS = {
+    "DEBUG": "调试",
+    "INFO": "信息",
+    "WARNING": "警告",
+    "ERROR": "错误",
+}
+
+
+def get_logger(category):
+    """获取分类日志器"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{category}")
+
+
+class LogBuffer(logging.Handler):
+    """内存环形缓冲区：每条记录存为元组 (序号, 时间, 级别数值, 级别, 分类, 消息)"""
+
+    def __init__(self, capacity=MAX_RECORDS):
+        super().__init__()
+        self.records = deque(maxlen=capacity)
+        self.seq = 0
+        self.records_lock = threading.Lock()
+
+    def emit(self, record):
+        category = record.name[len(ROOT_LOGGER) + 1:] if record.name.startswith(ROOT_LOGGER + ".") else record.name
+        with self.records_lock:
+            self.seq += 1
+            self.records.append(
+                (self.seq, record.created, record.levelno, record.levelname, category, record.getMessage())
+            )
+
+    def since(self, seq):
+        """返回序号大于 seq 的记录（从尾部向前查找，只复制新增部分）"""
+        with self.records_lock:
+            new_records = []
+            for item in reversed(self.records):
+                if item[0] <= seq:
+                    break
+                new_records.append(item)
+        new_records.reverse()
+        return new_records
+
+    def oldest_seq(self):
+        with self.records_lock:
+            return self.records[0][0] if self.records else self.seq + 1
+
+    def clear(self):
+        with self.records_lock:
+            self.records.clear()
+
+
+def matches(record, min_level=logging.DEBUG, category=None, text=None):
+    """判断记录是否满足筛选条件"""
+    if record[2] < min_level:
+        return False
+    if category and record[4] != category:
+        return False
+    if text and text not in record[5]:
+        return False
+    return True
+
+
+def format_record(record):
+    """把缓冲区记录格式化为一行文本"""
+    stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record[1]))
+    millis = int((record[1] % 1) * 1000)
+    return f"{stamp}.{millis:03d} [{record[3]}] {record[4]}: {record[5]}"
+
+
+def export_records(records, path):
+    """导出记录到文本文件"""
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(format_record(record) + "\n")
+
+
+class EventLog:
+    def __init__(self, path=LOG_FILE, max_bytes=5 * 1024 * 1024, backup_count=5, when=None,
+                 level=logging.DEBUG):
+        """
+        path: 日志文件路径
+        max_bytes/backup_count: 按大小轮转（when 为 None 时）
+        when: 按时间轮转，如 "midnight"、"H"，取值同 TimedRotatingFileHandler
+        """
+        if when:
+            file_handler = logging.handlers.TimedRotatingFileHandler(
+                path, when=when, backupCount=backup_count, encoding="utf-8"
+            )
+        else:
+            file_handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+            )
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+        self.buffer = LogBuffer()
+        self.queue = queue.SimpleQueue()
+        self.listener = logging.handlers.QueueListener(
+            self.queue, file_handler, self.buffer, respect_handler_level=True
+        )
+
+        self.logger = logging.getLogger(ROOT_LOGGER)
+        self.logger.setLevel(level)
+        self.queue_handler = logging.handlers.QueueHandler(self.queue)
+        self.logger.addHandler(self.queue_handler)
+        self.file_handler = file_handler
+
+    def start(self):
+        """启动后台写入线程"""
+        self.listener.start()
+
+    def stop(self):
+        """停止后台线程并写完剩余日志"""
+        self.listener.stop()
+        self.logger.removeHandler(self.queue_handler)
+        self.file_handler.close()
@@ -0,0 +1,574 @@
+"""
+多方向盘模式
+功能：一台电脑同时驱动多台方向盘（赛车体验馆），每台设备有独立的 ESP32 串口、vJoy 设备 ID 和游戏配置档案；
+每台设备的串口链路和力反馈循环运行在独立的工作进程中（设备数多于 CPU 核数时按核数分组共用进程），
+某台设备异常（串口断开、循环卡顿、进程崩溃）不会拖慢其他设备的循环；
+工作进程定时上报健康和延迟指标，由监督进程汇总到一个面板（控制台表格或 Tk 窗口），退出的工作进程自动重启
+用法：
+    python fleet.py [motor_fleet.json] [--gui] [--workers N]
+配置文件（JSON）：
+    {"rigs": [
+        {"name": "1号机", "port": "COM3", "vjoy_id": 1, "profile": "赛车游戏"},
+        {"name": "2号机", "port": "COM4", "vjoy_id": 2, "profile": "拉力赛", "telemetry_port": 20778}
+    ]}
+port 为 "sim" 时在工作进程内启动 esp32_sim 模拟器（Linux/macOS）
+"""
+
+import argparse
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from array import array
+
+from control import ControlState, angle_to_axis, resistance_command
+from devtools import LoopMonitor
+from effects import EffectCompiler
+from event_log import EventLog, get_logger, ROOT_LOGGER
+from profiles import ProfileStore
+from safety import SafetyWatchdog, drive_resistance
+from serial_link import SerialLink, open_serial, link_settings
+from sim_clock import CLOCK, STOP
+from telemetry import TelemetryListener
+from vjoy_output import VJoyOutput, load_vjoy_ffb
+
+logger = get_logger("fleet")
+
+FLEET_FILE = "motor_fleet.json"
+FLEET_LOG_FILE = "motor_fleet_logs.txt"
+
+# 单台设备配置默认值
+DEFAULT_RIG = {
+    "name": None,  # 显示名称，默认取串口名
+    "port": None,  # ESP32 串口，"sim" 表示内置模拟器
+    "vjoy_id": None,  # vJoy 设备 ID，None 使用档案中的 vjoy_id
+    "profile": None,  # 配置档案名称，None 使用当前激活档案
+    "telemetry_port": None,  # 遥测力源的 UDP 端口（多台设备运行同一款游戏时需各不相同）
+    "rate": 100,  # 力反馈循环频率（Hz）
+}
+
+REPORT_INTERVAL = 0.5  # 工作进程上报健康数据的间隔（秒）
+RETRY_INTERVAL = 2.0  # 串口断开后重连间隔（秒）
+RESTART_DELAY = 2.0  # 工作进程退出后至少间隔该时间再重启（秒）
+STALE_TIME = 3.0  # 超过该时间没有上报视为无响应（秒）
+TICK_WINDOW = 256  # 统计循环耗时的周期数
+
+
+def load_fleet(path=FLEET_FILE):
+    """读取多设备配置，补齐默认值并检查串口和 vJoy 设备 ID 不重复"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    rigs = []
+    for item in data.get("rigs", []):
+        rig = dict(DEFAULT_RIG)
+        rig.update(item)
+        if not rig["port"]:
+            raise ValueError(f"设备配置缺少串口：{item}")
+        rig["name"] = rig["name"] or rig["port"]
+        rigs.append(rig)
+
+    for key in ("port", "vjoy_id", "telemetry_port", "name"):
+        values = [rig[key] for rig in rigs if rig[key] is not None and rig[key] != "sim"]
+        duplicated = sorted({str(v) for v in values if values.count(v) > 1})
+        if duplicated:
+            raise ValueError(f"多台设备的 {key} 重复：{', '.join(duplicated)}")
+    return rigs
+
+
+def plan_workers(rigs, cores=None):
+    """分配工作进程：设备数不超过核数时每台设备一个进程，否则按核数分组轮流分配，返回 [[设备配置]]"""
+    cores = max(1, cores or os.cpu_count() or 1)
+    if len(rigs) <= cores:
+        return [[rig] for rig in rigs]
+    groups = [[] for _ in range(cores)]
+    for index, rig in enumerate(rigs):
+        groups[index % cores].append(rig)
+    return groups
+
+
+class RigRunner:
+    """
+    单台设备：串口链路、vJoy 输出、安全监督和力反馈循环，运行在工作进程内的独立线程中；
+    注入虚拟时钟时各循环由时钟调度（不打开 vJoy），simulator 为预先创建的模拟器（port 为 "sim" 时使用），
+    force_source 为提供 force(now) 的外部力源（如会话回放），优先于档案中的力源
+    """
+
+    def __init__(self, rig, clock=None, profile=None, simulator=None, force_source=None):
+        self.rig = rig
+        self.name = rig["name"]
+        self.clock = clock or CLOCK
+        if profile is None:
+            store = ProfileStore()
+            profile = store.get(rig["profile"] or store.active)
+        self.profile = profile
+        self.vjoy_id = rig["vjoy_id"] or self.profile["vjoy_id"]
+        self.interval = 1.0 / rig["rate"]
+        self.state = ControlState(self.profile["calibration"])
+
+        self.simulator = simulator
+        self.owns_simulator = False  # 模拟器由本设备创建，断开时一起停止
+        self.force_source = force_source
+        self.link = None
+        self.safety = None
+        self.effects = None  # 本地效果编译器，固件不支持时为 None
+        self.vjoy_output = None
+        self.telemetry = None
+        self.GetVJFFBState = None
+        self.ff_state = None
+        self.ff_ref = None
+
+        # 循环统计
+        self.monitor = LoopMonitor()
+        self.tick_times = array("d", bytes(8 * TICK_WINDOW))  # 最近 TICK_WINDOW 个周期的耗时
+        self.ticks = 0
+        self.status = "启动中"
+        self.error = None
+        self.reconnects = 0
+
+        self.stopped = threading.Event()
+        self.thread = None
+        self.next_tick = 0.0
+
+    def start(self):
+        self.open_outputs()
+        self.next_tick = self.clock.now()
+        self.thread = self.clock.spawn(self.step, self.interval, name=self.name)
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(timeout=RETRY_INTERVAL + 1.0)
+
+    def open_outputs(self):
+        """打开本设备的 vJoy 输出和力反馈来源（遥测或 vJoy 力反馈），不可用时只记录警告"""
+        if self.force_source is None and self.profile["force_source"] == "telemetry":
+            config = dict(self.profile["telemetry"])
+            if self.rig["telemetry_port"]:
+                config["port"] = self.rig["telemetry_port"]
+            self.telemetry = TelemetryListener(config, self.clock)
+            if not self.clock.virtual:
+                self.telemetry.start()  # 虚拟时钟下由调用方直接送入数据包
+        if self.clock.virtual:
+            return
+        try:
+            import pyvjoy
+            self.vjoy_output = VJoyOutput(pyvjoy.VJoyDevice(self.vjoy_id), clock=self.clock)
+            self.vjoy_output.start()
+        except Exception as e:
+            logger.warning(f"[{self.name}] vJoy 设备 {self.vjoy_id} 不可用，角度不会输出到游戏：{e}")
+
+        if self.telemetry is not None or self.force_source is not None:
+            return
+        try:
+            import ctypes
+            self.GetVJFFBState, self.ff_state = load_vjoy_ffb()
+            if self.ff_state is not None:
+                self.ff_ref = ctypes.byref(self.ff_state)
+        except Exception as e:
+            logger.warning(f"[{self.name}] vJoy 力反馈加载失败：{e}")
+
+    def close_outputs(self):
+        if self.vjoy_output is not None:
+            self.vjoy_output.stop()
+        if self.telemetry is not None:
+            self.telemetry.stop()
+
+    def connect(self):
+        """打开串口（或模拟器），按档案协商链路后启动安全监督"""
+        port = self.rig["port"]
+        link_config = link_settings(self.profile["link"])
+        if port == "sim":
+            if self.simulator is None:
+                from esp32_sim import Esp32Simulator, WheelModel
+                self.simulator = Esp32Simulator(model=WheelModel(spring=0.25), clock=self.clock)
+                self.owns_simulator = True
+            if not self.simulator.running:
+                self.simulator.start()
+            port = self.simulator.port or "内存串口"
+        simulator = self.simulator
+        if simulator is not None and simulator.serial is not None:
+            ser = simulator.serial
+        else:
+            ser = open_serial(port, link_config)
+        self.link = SerialLink(ser, clock=self.clock)
+        self.link.add_listener(self.on_angle)
+        self.link.start()
+        if link_config["auto_tune"]:
+            baud, rate, _ = self.link.negotiate(link_config)
+            logger.info(f"[{self.name}] 链路协商结果：{baud} bps，采样率 {rate or '固件默认'}")
+        self.safety = SafetyWatchdog(self.link, self.profile["safety"])
+        self.safety.start()
+        effects = EffectCompiler(self.link, self.profile["effects"], self.safety.limiter.max_torque)
+        if effects.negotiate():
+            self.effects = effects
+            logger.info(f"[{self.name}] 固件支持本地效果，弹簧和振动由固件计算")
+        self.status = "运行"
+        self.error = None
+        logger.info(f"[{self.name}] 已连接 {port}，vJoy 设备 {self.vjoy_id}")
+
+    def disconnect(self):
+        self.effects = None
+        if self.safety is not None:
+            self.safety.stop()
+            self.safety = None
+        if self.link is not None:
+            try:
+                self.link.write(resistance_command(0.0))
+            except Exception:
+                pass
+            self.link.close()
+            self.link = None
+        if self.owns_simulator:
+            self.simulator.stop()
+            self.simulator = None
+            self.owns_simulator = False
+
+    def reconnect(self):
+        """串口未连接或已断开时重连，返回到下次尝试的等待时间（断开后或连接失败时为 RETRY_INTERVAL）"""
+        if self.link is not None:
+            logger.warning(f"[{self.name}] 串口断开，{RETRY_INTERVAL:.0f} 秒后重连")
+            self.disconnect()
+            self.status = "重连中"
+            self.reconnects += 1
+            return RETRY_INTERVAL
+        try:
+            self.connect()
+        except Exception as e:
+            self.disconnect()
+            self.status = "错误"
+            self.error = str(e)
+            logger.error(f"[{self.name}] 连接失败：{e}")
+            return RETRY_INTERVAL
+        return 0.0
+
+    def on_angle(self, timestamp, angle):
+        """串口链路回调（读取线程）：更新角度状态并映射到本设备的 vJoy X 轴"""
+        state = self.state
+        angle = state.update_angle(timestamp, angle)
+        if self.vjoy_output is not None:
+            self.vjoy_output.set_axis("x", angle_to_axis(angle, state.half_range))
+
+    def step(self):
+        """力反馈循环单步：按设定频率执行，落后时不补偿，从当前时刻重新计时；返回到下次执行的等待时间"""
+        clock = self.clock
+        if self.stopped.is_set():
+            self.disconnect()
+            self.close_outputs()
+            return STOP
+        try:
+            if self.link is None or not self.link.running:
+                delay = self.reconnect()
+                self.next_tick = clock.now() + delay
+                return delay
+            now = clock.now()
+            self.monitor.tick(self.interval, now)
+            started = time.perf_counter()  # 周期耗时始终按真实时间统计
+            self.tick(now)
+            self.tick_times[self.ticks % TICK_WINDOW] = time.perf_counter() - started
+            self.ticks += 1
+        except Exception as e:
+            # 与串口断开相同处理：断开后等待 RETRY_INTERVAL 重连，不让一次异常使设备永久停止
+            self.status = "错误"
+            self.error = str(e)
+            logger.exception(f"[{self.name}] 力反馈循环错误：{e}，{RETRY_INTERVAL:.0f} 秒后重连")
+            self.disconnect()
+            self.reconnects += 1
+            self.next_tick = clock.now() + RETRY_INTERVAL
+            return RETRY_INTERVAL
+
+        self.next_tick += self.interval
+        delay = self.next_tick - clock.now()
+        if delay <= 0:
+            self.next_tick = clock.now()
+            return 0.0
+        return delay
+
+    def tick(self, now):
+        """单次循环：读取力反馈，经增益/死区、摩擦补偿、限幅限速后下发阻力"""
+        self.link.discard_angles()  # 角度已由回调处理，队列中的帧不再需要
+        state = self.state
+        effects = self.effects
+        profile = self.profile
+        if self.force_source is not None:
+            state.force = self.force_source.force(now)
+        elif self.telemetry is not None:
+            if effects is None:
+                state.force = self.telemetry.force(now)
+            else:
+                state.force = effects.compile_telemetry(self.telemetry, profile["ff_gain"], now)
+        elif self.GetVJFFBState is not None and self.GetVJFFBState(self.vjoy_id, self.ff_ref):
+            state.force = self.ff_state.MasterGain / 100.0
+        else:
+            self.safety.release()  # 没有力反馈来源，看门狗不检查循环截止时间
+            if effects is not None:
+                effects.release()
+            return
+        drive_resistance(state, profile["ff_gain"], profile["ff_deadzone"], profile["calibration"],
+                         self.safety, self.link, effects, now)
+
+    def health(self):
+        """健康和延迟指标（可序列化的 dict，由工作进程发给监督进程）"""
+        count = min(self.ticks, TICK_WINDOW)
+        durations = sorted(self.tick_times[:count])
+        link = self.link
+        stats = link.stats() if link is not None else {}
+        safety = self.safety
+        effects = self.effects
+        now = self.clock.now()
+        return {
+            "name": self.name,
+            "port": self.rig["port"],
+            "vjoy_id": self.vjoy_id,
+            "pid": os.getpid(),
+            "time": time.time(),
+            "status": "故障" if safety is not None and safety.limiter.fault else self.status,
+            "error": self.error or (safety.limiter.fault if safety is not None else None),
+            "frames_per_sec": stats.get("frames_per_sec", 0.0),
+            "link_errors": stats.get("parse_errors", 0) + stats.get("dropped_frames", 0),
+            "loop_rate": self.monitor.rate(),
+            "jitter_ms": self.monitor.jitter() * 1000,
+            "missed": self.monitor.missed,
+            "tick_p99_us": durations[int(count * 0.99) - 1] * 1e6 if count else 0.0,
+            "angle_age_ms": (now - self.state.angle_time) * 1000 if self.state.frames else None,
+            "angle": self.state.angle,
+            "resistance": safety.limiter.output if safety is not None else 0.0,
+            "faults": safety.faults if safety is not None else 0,
+            "effects": effects.stats()["active_effects"] if effects is not None else None,
+            "reconnects": self.reconnects,
+        }
+
+
+def rig_worker(rigs, reports, logs, stop):
+    """工作进程入口：为分配到本进程的每台设备启动一个控制线程，定时上报健康数据，日志转发给监督进程"""
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(logging.INFO)
+    root.handlers[:] = [logging.handlers.QueueHandler(logs)]
+
+    runners = [RigRunner(rig) for rig in rigs]
+    for runner in runners:
+        runner.start()
+    try:
+        while not stop.wait(REPORT_INTERVAL):
+            for runner in runners:
+                reports.put(runner.health())
+    except KeyboardInterrupt:
+        pass  # 由监督进程统一停止
+    finally:
+        for runner in runners:
+            runner.stop()
+
+
+class FleetSupervisor:
+    def __init__(self, rigs, workers=None):
+        self.rigs = rigs
+        self.groups = plan_workers(rigs, workers)
+        # Windows 只支持 spawn，其他平台也统一使用，工作进程不继承监督进程的线程和串口句柄
+        self.context = multiprocessing.get_context("spawn")
+        self.reports = self.context.Queue()
+        self.logs = self.context.Queue()
+        self.stop_event = self.context.Event()
+        self.processes = [None] * len(self.groups)
+        self.started = [0.0] * len(self.groups)
+        self.restarts = [0] * len(self.groups)
+        self.health = {rig["name"]: {"name": rig["name"], "port": rig["port"], "status": "启动中"} for rig in rigs}
+        self.log_thread = None
+
+    def start(self):
+        for index in range(len(self.groups)):
+            self.spawn(index)
+        self.log_thread = threading.Thread(target=self.forward_logs, daemon=True)
+        self.log_thread.start()
+        logger.info(f"多设备模式启动：{len(self.rigs)} 台设备，{len(self.groups)} 个工作进程")
+
+    def spawn(self, index):
+        group = self.groups[index]
+        process = self.context.Process(
+            target=rig_worker, args=(group, self.reports, self.logs, self.stop_event),
+            name="rig-" + ",".join(rig["name"] for rig in group), daemon=True,
+        )
+        process.start()
+        self.processes[index] = process
+        self.started[index] = time.monotonic()
+
+    def stop(self):
+        self.stop_event.set()
+        for process in self.processes:
+            if process is not None:
+                process.join(timeout=3.0)
+                if process.is_alive():
+                    process.terminate()
+        self.logs.put(None)
+        if self.log_thread is not None:
+            self.log_thread.join(timeout=1.0)
+
+    def forward_logs(self):
+        """把工作进程的日志记录交给本进程的日志系统（文件和内存缓冲）"""
+        while True:
+            record = self.logs.get()
+            if record is None:
+                break
+            logging.getLogger(record.name).handle(record)
+
+    def poll(self):
+        """收取上报的健康数据，重启已退出的工作进程，返回 {设备名: 健康数据}"""
+        while True:
+            try:
+                report = self.reports.get_nowait()
+            except queue.Empty:
+                break
+            report["restarts"] = self.restarts[self.group_of(report["name"])]
+            self.health[report["name"]] = report
+
+        now = time.monotonic()
+        for index, process in enumerate(self.processes):
+            if process.is_alive() or self.stop_event.is_set() or now - self.started[index] < RESTART_DELAY:
+                continue
+            names = "、".join(rig["name"] for rig in self.groups[index])
+            logger.error(f"工作进程退出（{names}，退出码 {process.exitcode}），重新启动")
+            self.restarts[index] += 1
+            for rig in self.groups[index]:
+                self.health[rig["name"]]["status"] = "重启中"
+            self.spawn(index)
+
+        wall = time.time()
+        for report in self.health.values():
+            if "time" in report and wall - report["time"] > STALE_TIME and report["status"] != "重启中":
+                report["status"] = "无响应"
+        return self.health
+
+    def group_of(self, name):
+        for index, group in enumerate(self.groups):
+            if any(rig["name"] == name for rig in group):
+                return index
+        return 0
+
+
+# 面板列：(字段, 标题, 格式)
+COLUMNS = [
+    ("name", "设备", "{}"),
+    ("status", "状态", "{}"),
+    ("port", "串口", "{}"),
+    ("vjoy_id", "vJoy", "{}"),
+    ("pid", "进程", "{}"),
+    ("frames_per_sec", "角度帧/秒", "{:.0f}"),
+    ("angle_age_ms", "角度延迟ms", "{:.1f}"),
+    ("loop_rate", "循环Hz", "{:.1f}"),
+    ("jitter_ms", "抖动ms", "{:.2f}"),
+    ("tick_p99_us", "周期P99µs", "{:.0f}"),
+    ("missed", "超时", "{}"),
+    ("resistance", "阻力", "{:.1f}"),
+    ("link_errors", "错帧", "{}"),
+    ("effects", "本地效果", "{}"),
+    ("faults", "故障", "{}"),
+    ("restarts", "重启", "{}"),
+]
+NORMAL_STATUS = "运行"
+
+
+def format_row(report):
+    """按面板列格式化一台设备的健康数据，缺失的字段显示为 -"""
+    cells = []
+    for key, _, fmt in COLUMNS:
+        value = report.get(key)
+        cells.append("-" if value is None else fmt.format(value))
+    return cells
+
+
+def format_table(health):
+    """控制台表格"""
+    rows = [[title for _, title, _ in COLUMNS]] + [format_row(report) for report in health.values()]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(COLUMNS))]
+    lines = ["  ".join(cell.ljust(width) for cell, width in zip(row, widths)) for row in rows]
+    for report in health.values():
+        if report.get("status") != NORMAL_STATUS and report.get("error"):
+            lines.append(f"{report['name']}：{report['error']}")
+    return "\n".join(lines)
+
+
+class FleetDashboard:
+    """Tk 汇总面板：每台设备一行，状态异常的行标红"""
+
+    def __init__(self, root, supervisor, interval=500):
+        import tkinter as tk
+        from tkinter import ttk
+
+        self.root = root
+        self.supervisor = supervisor
+        self.interval = interval
+        root.title("多方向盘监控")
+        root.geometry("1100x300")
+
+        self.tree = ttk.Treeview(root, columns=[key for key, _, _ in COLUMNS], show="headings")
+        for key, title, _ in COLUMNS:
+            self.tree.heading(key, text=title)
+            self.tree.column(key, width=70, anchor=tk.CENTER)
+        self.tree.tag_configure("abnormal", foreground="#c62828")
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        self.error_var = tk.StringVar()
+        ttk.Label(root, textvariable=self.error_var, foreground="#c62828").pack(fill=tk.X, padx=10, pady=(0, 10))
+
+        root.protocol("WM_DELETE_WINDOW", self.close)
+        root.after(self.interval, self.refresh)
+
+    def refresh(self):
+        health = self.supervisor.poll()
+        errors = []
+        for name, report in health.items():
+            tags = () if report.get("status") == NORMAL_STATUS else ("abnormal",)
+            if self.tree.exists(name):
+                self.tree.item(name, values=format_row(report), tags=tags)
+            else:
+                self.tree.insert("", "end", iid=name, values=format_row(report), tags=tags)
+            if tags and report.get("error"):
+                errors.append(f"{name}：{report['error']}")
+        self.error_var.set("    ".join(errors))
+        self.root.after(self.interval, self.refresh)
+
+    def close(self):
+        self.supervisor.stop()
+        self.root.destroy()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多方向盘模式：一台电脑驱动多台方向盘")
+    parser.add_argument("config", nargs="?", default=FLEET_FILE, help=f"设备配置文件（默认 {FLEET_FILE}）")
+    parser.add_argument("--gui", action="store_true", help="使用 Tk 面板显示（默认控制台表格）")
+    parser.add_argument("--workers", type=int, help="工作进程数上限（默认 CPU 核数）")
+    parser.add_argument("--interval", type=float, default=1.0, help="控制台刷新间隔（秒）")
+    args = parser.parse_args()
+
+    try:
+        rigs = load_fleet(args.config)
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"读取设备配置失败：{e}")
+    if not rigs:
+        raise SystemExit("设备配置为空")
+
+    event_log = EventLog(FLEET_LOG_FILE)
+    event_log.start()
+    supervisor = FleetSupervisor(rigs, args.workers)
+    supervisor.start()
+    try:
+        if args.gui:
+            import tkinter as tk
+            root = tk.Tk()
+            FleetDashboard(root, supervisor)
+            root.mainloop()
+        else:
+            while True:
+                time.sleep(args.interval)
+                print("\033[2J\033[H" + format_table(supervisor.poll()), flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        supervisor.stop()
+        event_log.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+曲线视图
+功能：整个会话的历史数据保存在多分辨率最小/最大值金字塔中（每层把下一层 FANOUT 个桶合并为一个），
+任意缩放级别只取出不超过画布宽度的桶来绘制，绘制开销与会话长度无关；
+视图带真实时间轴，支持暂停、缩放（滚轮/按钮）和拖动平移，纵轴范围带滞回，不会每帧跳动
+"""
+
+import math
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+FANOUT = 8  # 每层合并的桶数
+MIN_SPAN = 0.05  # 最小可视时间跨度（秒）
+MAX_SPAN = 24 * 3600.0  # 最大可视时间跨度（秒）
+
+
+class MinMaxPyramid:
+    """追加式时间序列：第 0 层为原始样本，第 k 层每个桶汇总 FANOUT^k 个连续样本的最小/最大值"""
+
+    def __init__(self, fanout=FANOUT):
+        self.fanout = fanout
+        self.lock = threading.Lock()
+        self.times = array("d")
+        self.values = array("d")
+        self.levels = []  # 每层 (起始时间, 最小值, 最大值, 每桶样本数)
+        self.pending = []  # 每层未满的桶 [起始时间, 最小值, 最大值, 已有样本数]
+
+    def __len__(self):
+        return len(self.times)
+
+    def append(self, t, value):
+        """追加一个样本（时间需递增），每层只做一次比较和计数"""
+        with self.lock:
+            self.times.append(t)
+            self.values.append(value)
+            for (starts, mins, maxs, size), acc in zip(self.levels, self.pending):
+                if acc[3] == 0:
+                    acc[0] = t
+                    acc[1] = acc[2] = value
+                elif value < acc[1]:
+                    acc[1] = value
+                elif value > acc[2]:
+                    acc[2] = value
+                acc[3] += 1
+                if acc[3] == size:
+                    starts.append(acc[0])
+                    mins.append(acc[1])
+                    maxs.append(acc[2])
+                    acc[3] = 0
+
+            # 样本数刚好够组成更粗一层的第一个桶时新建该层
+            size = self.fanout ** (len(self.levels) + 1)
+            if len(self.times) == size:
+                if self.levels:
+                    _, mins, maxs, _ = self.levels[-1]
+                else:
+                    mins = maxs = self.values
+                self.levels.append((array("d", [self.times[0]]), array("d", [min(mins)]), array("d", [max(maxs)]), size))
+                self.pending.append([0.0, 0.0, 0.0, 0])
+
+    def extend(self, samples):
+        for t, value in samples:
+            self.append(t, value)
+
+    def bounds(self):
+        """返回 (最早时间, 最新时间)，没有数据时返回 None"""
+        with self.lock:
+            if not self.times:
+                return None
+            return self.times[0], self.times[-1]
+
+    def query(self, t0, t1, max_buckets):
+        """
+        返回 [t0, t1] 内的 [(时间, 最小值, 最大值)]，选择桶数不超过 max_buckets 的最细一层，
+        两端各多取一个桶使曲线延伸到边缘
+        """
+        with self.lock:
+            times, values = self.times, self.values
+            lo = max(bisect_left(times, t0) - 1, 0)
+            hi = min(bisect_right(times, t1) + 1, len(times))
+            if hi - lo <= max_buckets or not self.levels:
+                return [(times[i], values[i], values[i]) for i in range(lo, hi)]
+
+            for index, ((starts, mins, maxs, _), acc) in enumerate(zip(self.levels, self.pending)):
+                lo = max(bisect_left(starts, t0) - 1, 0)
+                hi = min(bisect_right(starts, t1) + 1, len(starts))
+                if hi - lo <= max_buckets or index == len(self.levels) - 1:
+                    buckets = list(zip(starts[lo:hi], mins[lo:hi], maxs[lo:hi]))
+                    if hi == len(starts) and acc[3] and acc[0] <= t1:
+                        buckets.append((acc[0], acc[1], acc[2]))  # 最新的未满桶
+                    return buckets
+        return []
+
+
+def nice_step(span, count):
+    """把 span/count 取整到 1、2、5×10^n"""
+    raw = span / max(count, 1)
+    if raw <= 0:
+        return 1.0
+    base = 10 ** math.floor(math.log10(raw))
+    for factor in (1, 2, 5, 10):
+        if raw <= factor * base:
+            return factor * base
+    return 10 * base
+
+
+def nice_range(lo, hi, ticks=4):
+    """把数据范围向外扩展到整齐的刻度"""
+    if hi <= lo:
+        lo, hi = lo - 1.0, hi + 1.0
+    step = nice_step(hi - lo, ticks)
+    return math.floor(lo / step) * step, math.ceil(hi / step) * step
+
+
+class TimeWindow:
+    """可视时间窗口：end 为 None 时跟随最新数据，否则为暂停状态下固定的右边界"""
+
+    def __init__(self, span=10.0):
+        self.span = span
+        self.end = None
+
+    @property
+    def paused(self):
+        return self.end is not None
+
+    def range(self, latest):
+        end = latest if self.end is None else self.end
+        return end - self.span, end
+
+    def pause(self, latest):
+        self.end = latest
+
+    def follow(self):
+        self.end = None
+
+    def zoom(self, factor, latest, anchor=None):
+        """缩放时间跨度，anchor（时间）在画面中的位置保持不变；跟随状态下以右边界为锚点"""
+        t0, t1 = self.range(latest)
+        span = min(MAX_SPAN, max(MIN_SPAN, self.span * factor))
+        if self.end is not None and anchor is not None:
+            ratio = (anchor - t0) / (t1 - t0)
+            self.end = min(latest, anchor - ratio * span + span)
+        self.span = span
+
+    def pan(self, dt, latest):
+        """平移（dt 秒，正数向后），平移后进入暂停状态，右边界不超过最新数据"""
+        end = (latest if self.end is None else self.end) + dt
+        self.end = min(end, latest)
+
+    def show_all(self, start, latest):
+        """显示整个会话"""
+        self.span = min(MAX_SPAN, max(MIN_SPAN, latest - start))
+        self.end = latest
+
+
+class PlotView:
+    """在 Canvas 上绘制一条序列（时间轴、网格、最小/最大包络曲线），并处理滚轮缩放和拖动平移"""
+
+    LEFT = 55
+    RIGHT = 10
+    TOP = 25
+    BOTTOM = 22
+
+    def __init__(self, canvas, series, window, color, title, unit="", fixed_range=None):
+        self.canvas = canvas
+        self.series = series
+        self.window = window
+        self.color = color
+        self.title = title
+        self.unit = unit
+        self.fixed_range = fixed_range
+        self.y_range = fixed_range
+        self.last_range = None  # 最近一次绘制的时间范围，供鼠标事件换算
+        self.drag_x = None
+
+    def bind(self, latest_fn, redraw_fn):
+        """绑定鼠标：滚轮缩放、左键拖动平移、双击恢复跟随"""
+        self.latest_fn = latest_fn
+        self.redraw_fn = redraw_fn
+        self.canvas.bind("<MouseWheel>", lambda e: self.on_wheel(e, e.delta > 0))
+        self.canvas.bind("<Button-4>", lambda e: self.on_wheel(e, True))
+        self.canvas.bind("<Button-5>", lambda e: self.on_wheel(e, False))
+        self.canvas.bind("<ButtonPress-1>", self.on_press)
+        self.canvas.bind("<B1-Motion>", self.on_drag)
+        self.canvas.bind("<Double-Button-1>", self.on_double)
+
+    def x_to_time(self, x):
+        t0, t1 = self.last_range
+        width = self.plot_width()
+        return t0 + (x - self.LEFT) / width * (t1 - t0)
+
+    def plot_width(self):
+        return max(1, (self.canvas.winfo_width() or 850) - self.LEFT - self.RIGHT)
+
+    def on_wheel(self, event, zoom_in):
+        if self.last_range is None:
+            return
+        self.window.zoom(0.8 if zoom_in else 1.25, self.latest_fn(), self.x_to_time(event.x))
+        self.redraw_fn()
+
+    def on_press(self, event):
+        self.drag_x = event.x
+
+    def on_drag(self, event):
+        if self.drag_x is None or self.last_range is None:
+            return
+        t0, t1 = self.last_range
+        dt = -(event.x - self.drag_x) / self.plot_width() * (t1 - t0)
+        self.drag_x = event.x
+        self.window.pan(dt, self.latest_fn())
+        self.redraw_fn()
+
+    def on_double(self, event):
+        self.window.follow()
+        self.redraw_fn()
+
+    def update_y_range(self, lo, hi):
+        """纵轴范围滞回：数据超出范围时扩大，数据只占范围不到 40% 时才收缩"""
+        if self.fixed_range is not None:
+            return
+        if self.y_range is None:
+            self.y_range = nice_range(lo, hi)
+            return
+        y0, y1 = self.y_range
+        if lo < y0 or hi > y1 or (hi - lo) < 0.4 * (y1 - y0):
+            self.y_range = nice_range(lo, hi)
+
+    def draw(self, latest, origin):
+        """绘制 latest 时刻的视图，时间标签以 origin 为零点"""
+        canvas = self.canvas
+        canvas.delete("all")
+        width = canvas.winfo_width() or 850
+        height = canvas.winfo_height() or 180
+        plot_w = max(1, width - self.LEFT - self.RIGHT)
+        plot_h = max(1, height - self.TOP - self.BOTTOM)
+        t0, t1 = self.window.range(latest)
+        self.last_range = (t0, t1)
+
+        buckets = self.series.query(t0, t1, plot_w)
+        if buckets:
+            self.update_y_range(min(b[1] for b in buckets), max(b[2] for b in buckets))
+        y0, y1 = self.y_range or (0.0, 1.0)
+        x_scale = plot_w / (t1 - t0)
+        y_scale = plot_h / (y1 - y0) if y1 > y0 else 1.0
+        bottom = self.TOP + plot_h
+
+        # 纵轴网格和刻度
+        step = nice_step(y1 - y0, 4)
+        value = math.ceil(y0 / step) * step
+        while value <= y1 + step * 1e-6:
+            y = bottom - (value - y0) * y_scale
+            canvas.create_line(self.LEFT, y, width - self.RIGHT, y, fill="#e0e0e0", dash=(2, 2))
+            canvas.create_text(self.LEFT - 5, y, text=f"{value:g}{self.unit}", anchor="e", font=("SimHei", 8))
+            value += step
+
+        # 时间轴刻度（秒，相对会话开始）
+        step = nice_step(t1 - t0, max(2, plot_w // 90))
+        t = math.ceil((t0 - origin) / step) * step + origin
+        while t <= t1:
+            x = self.LEFT + (t - t0) * x_scale
+            canvas.create_line(x, self.TOP, x, bottom, fill="#f0f0f0")
+            canvas.create_text(x, bottom + 3, text=f"{t - origin:.{max(0, -math.floor(math.log10(step)))}f}s",
+                               anchor="n", font=("SimHei", 8))
+            t += step
+
+        # 曲线：每个桶画一段从最小值到最大值的竖线，整体一次提交
+        points = []
+        for t, low, high in buckets:
+            x = self.LEFT + (t - t0) * x_scale
+            points.append(x)
+            points.append(bottom - (low - y0) * y_scale)
+            if high != low:
+                points.append(x)
+                points.append(bottom - (high - y0) * y_scale)
+        if len(points) >= 4:
+            canvas.create_line(points, fill=self.color, width=1.5)
+
+        state = "已暂停" if self.window.paused else "实时"
+        canvas.create_text(width / 2, 12, text=f"{self.title}（{state}，{t1 - t0:.3g} 秒）", font=("SimHei", 10, "bold"))
@@ -0,0 +1,239 @@
+"""
+角度预测（延迟补偿）
+功能：用 alpha-beta(-gamma) 滤波估计方向盘角速度/角加速度，把角度外推到"当前时刻 + 链路延迟"，
+使游戏看到的是方向盘现在的位置而不是过去的位置；外推量有上限，避免急停时过冲
+离线评估：python predictor.py 录制文件.rks [--latency 0.03] [--sweep]
+    录制文件中有 vJoy 输出角度（axis）时，同时评估实际送给游戏的角度
+"""
+
+import argparse
+import bisect
+import math
+
+from session_rec import read_session, KIND_ANGLE, KIND_AXIS
+
+# 默认预测参数，保存在配置档案的 "predictor" 字段中
+DEFAULT_PREDICTOR = {
+    "enabled": False,
+    "latency": None,  # 补偿延迟（秒），None 表示使用校准测得的响应延迟
+    "alpha": 0.5,  # 位置修正系数
+    "beta": 0.05,  # 速度修正系数
+    "gamma": 0.0,  # 加速度修正系数（0 即 alpha-beta 滤波）
+    "max_lead": 15.0,  # 最大外推角度（度）
+}
+DEFAULT_LATENCY = 0.03  # 未校准时的默认补偿延迟（秒）
+
+
+def predictor_settings(settings=None, calibration=None):
+    """合并档案中的预测配置与默认值，并确定补偿延迟"""
+    config = dict(DEFAULT_PREDICTOR)
+    config.update(settings or {})
+    if config["latency"] is None:
+        config["latency"] = calibration["latency"] if calibration and calibration.get("latency") else DEFAULT_LATENCY
+    return config
+
+
+class AnglePredictor:
+    __slots__ = ("latency", "alpha", "beta", "gamma", "max_lead", "t", "angle", "velocity", "acceleration",
+                 "prior", "prior_acceleration")
+
+    def __init__(self, latency=DEFAULT_LATENCY, alpha=0.5, beta=0.05, gamma=0.0, max_lead=15.0, **unused):
+        self.latency = latency
+        self.alpha = alpha
+        self.beta = beta
+        self.gamma = gamma
+        self.max_lead = max_lead
+        self.reset()
+
+    def reset(self):
+        self.t = None
+        self.angle = 0.0
+        self.velocity = 0.0
+        self.acceleration = 0.0
+        self.prior = None  # 最近一次修正前的 (预测角度, 预测速度, dt)
+        self.prior_acceleration = 0.0
+
+    def update(self, t, measured):
+        """输入一个角度采样，返回外推 latency 秒后的角度"""
+        if self.t is None:
+            self.t = t
+            self.angle = measured
+            return measured
+        dt = t - self.t
+        if dt > 0:
+            # 预测
+            self.t = t
+            angle = self.angle + self.velocity * dt + 0.5 * self.acceleration * dt * dt
+            velocity = self.velocity + self.acceleration * dt
+            self.prior = (angle, velocity, dt)
+            self.prior_acceleration = self.acceleration
+        elif self.prior is not None:
+            # 与上一采样同一时刻（旧版链路按批共用时间戳）：用这一时刻最新的测量值重新修正
+            angle, velocity, dt = self.prior
+            self.acceleration = self.prior_acceleration
+        else:
+            self.angle += self.alpha * (measured - self.angle)
+            return self.predict()
+
+        # 修正
+        residual = measured - angle
+        self.angle = angle + self.alpha * residual
+        self.velocity = velocity + self.beta * residual / dt
+        if self.gamma:
+            self.acceleration += 2.0 * self.gamma * residual / (dt * dt)
+        return self.predict()
+
+    def predict(self, horizon=None):
+        """外推 horizon 秒（默认为补偿延迟），外推量限制在 ±max_lead"""
+        h = self.latency if horizon is None else horizon
+        lead = self.velocity * h + 0.5 * self.acceleration * h * h
+        lead = max(-self.max_lead, min(self.max_lead, lead))
+        return self.angle + lead
+
+
+def interpolate(times, values, t, start=0):
+    """线性插值，返回 (插值结果, 下次查找起点)；超出范围返回 None"""
+    i = bisect.bisect_right(times, t, start)
+    if i == 0 or i >= len(times):
+        return None, start
+    t0, t1 = times[i - 1], times[i]
+    v0, v1 = values[i - 1], values[i]
+    return v0 + (v1 - v0) * (t - t0) / (t1 - t0), i - 1
+
+
+def error_stats(errors):
+    """均方根、95 分位和最大误差"""
+    if not errors:
+        return {"rms": 0.0, "p95": 0.0, "max": 0.0}
+    abs_errors = sorted(abs(e) for e in errors)
+    return {
+        "rms": math.sqrt(sum(e * e for e in errors) / len(errors)),
+        "p95": abs_errors[int(len(abs_errors) * 0.95) - 1 if len(abs_errors) > 1 else 0],
+        "max": abs_errors[-1],
+    }
+
+
+def effective_delay(times, angles, outputs, latency, steps=30):
+    """
+    估计输出信号的等效延迟：游戏在 t+latency 时刻看到输出，
+    找出使输出与"真实角度(t + latency - d)"误差最小的 d（不补偿时约等于 latency，理想预测为 0）
+    """
+    best_delay, best_rms = 0.0, None
+    for k in range(-steps // 2, steps + 1):
+        d = latency * k / (steps // 2)
+        errors = []
+        pos = 0
+        for t, y in zip(times, outputs):
+            truth, pos = interpolate(times, angles, t + latency - d, pos)
+            if truth is not None:
+                errors.append(y - truth)
+        if not errors:
+            continue
+        rms = math.sqrt(sum(e * e for e in errors) / len(errors))
+        if best_rms is None or rms < best_rms:
+            best_delay, best_rms = d, rms
+    return best_delay
+
+
+def hold_values(times, sample_times, sample_values, default):
+    """零阶保持：各时刻最近一次记录的值，之前没有记录时取 default 中对应的值"""
+    outputs = []
+    i = 0
+    for t, fallback in zip(times, default):
+        while i < len(sample_times) and sample_times[i] <= t:
+            i += 1
+        outputs.append(sample_values[i - 1] if i else fallback)
+    return outputs
+
+
+def evaluate(times, angles, config, recorded=None):
+    """
+    离线评估：对比不补偿、预测输出以及录制的实际输出（recorded，与 times 对齐，可选）
+    在游戏看到时刻（t+latency）的误差
+    """
+    latency = config["latency"]
+    predictor = AnglePredictor(**config)
+    series = {
+        "baseline": angles,
+        "predicted": [predictor.update(t, angle) for t, angle in zip(times, angles)],
+    }
+    if recorded is not None:
+        series["recorded"] = recorded
+
+    report = {}
+    for key, outputs in series.items():
+        errors = []
+        pos = 0
+        for t, output in zip(times, outputs):
+            truth, pos = interpolate(times, angles, t + latency, pos)
+            if truth is not None:
+                errors.append(output - truth)
+        report[key] = error_stats(errors)
+        report[key + "_delay"] = effective_delay(times, angles, outputs, latency)
+    return report
+
+
+def print_report(report, config):
+    print(f"补偿延迟 {config['latency'] * 1000:.1f} ms  alpha={config['alpha']} beta={config['beta']} "
+          f"gamma={config['gamma']} max_lead={config['max_lead']}")
+    print(f"{'':<8} {'RMS(°)':>10} {'P95(°)':>10} {'最大(°)':>10} {'等效延迟(ms)':>14}")
+    for key, name in (("baseline", "不补偿"), ("predicted", "预测"), ("recorded", "实际输出")):
+        if key not in report:
+            continue
+        stats = report[key]
+        print(f"{name:<8} {stats['rms']:10.3f} {stats['p95']:10.3f} {stats['max']:10.3f} "
+              f"{report[key + '_delay'] * 1000:14.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="角度预测离线评估")
+    parser.add_argument("session", help="录制文件（session_rec 格式）")
+    parser.add_argument("--latency", type=float, help="补偿延迟（秒），默认取当前档案")
+    parser.add_argument("--alpha", type=float)
+    parser.add_argument("--beta", type=float)
+    parser.add_argument("--gamma", type=float)
+    parser.add_argument("--max-lead", dest="max_lead", type=float)
+    parser.add_argument("--sweep", action="store_true", help="网格搜索 alpha/beta，输出误差最小的组合")
+    args = parser.parse_args()
+
+    from profiles import ProfileStore
+    profile = ProfileStore().get()
+    config = predictor_settings(profile.get("predictor"), profile["calibration"])
+    for key in ("latency", "alpha", "beta", "gamma", "max_lead"):
+        if getattr(args, key) is not None:
+            config[key] = getattr(args, key)
+
+    channels = read_session(args.session)
+    if KIND_ANGLE not in channels:
+        print("录制文件中没有角度数据")
+        return
+    times, angles = channels[KIND_ANGLE]
+
+    if args.sweep:
+        best = None
+        for alpha in (0.2, 0.35, 0.5, 0.65, 0.8):
+            for beta in (0.005, 0.01, 0.02, 0.05, 0.1, 0.2):
+                trial = dict(config, alpha=alpha, beta=beta)
+                predictor = AnglePredictor(**trial)
+                errors = []
+                pos = 0
+                for t, angle in zip(times, angles):
+                    output = predictor.update(t, angle)
+                    truth, pos = interpolate(times, angles, t + trial["latency"], pos)
+                    if truth is not None:
+                        errors.append(output - truth)
+                rms = error_stats(errors)["rms"]
+                if best is None or rms < best[0]:
+                    best = (rms, alpha, beta)
+        print(f"最优参数：alpha={best[1]} beta={best[2]}（RMS {best[0]:.3f}°）")
+        config["alpha"], config["beta"] = best[1], best[2]
+
+    recorded = None
+    if KIND_AXIS in channels:
+        axis_times, axis_values = channels[KIND_AXIS]
+        recorded = hold_values(times, axis_times, axis_values, angles)
+    print_report(evaluate(times, angles, config, recorded), config)
+
+
+if __name__ == "__main__":
+    main()
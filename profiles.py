@@ -0,0 +1,76 @@
+"""
+配置档案管理
+功能：按游戏保存/加载配置档案（力反馈参数、校准结果等），统一存储在JSON文件中
+"""
+
+import copy
+import json
+import os
+
+from event_log import get_logger
+
+logger = get_logger("config")
+
+PROFILE_FILE = "motor_profiles.json"
+
+# 档案默认值，新增字段时在这里补充即可，旧文件缺失的字段会自动补齐
+DEFAULT_PROFILE = {
+    "ff_gain": 1.0,  # 力反馈增益
+    "ff_deadzone": 5,  # 死区范围
+    "enable_ff": True,  # 启用力反馈
+    "vjoy_id": 1,  # vJoy 设备 ID（方向盘角度输出和力反馈读取）
+    "force_source": "vjoy",  # 力反馈来源："vjoy"（DirectInput 力反馈）或 "telemetry"（UDP 遥测）
+    "telemetry": {},  # 遥测配置，未填写的项使用 telemetry.DEFAULT_TELEMETRY
+    "calibration": None,  # 自动校准结果，见 calibration.py
+    "link": {},  # 串口链路配置，未填写的项使用 serial_link.DEFAULT_LINK
+    "predictor": {},  # 角度预测配置，未填写的项使用 predictor.DEFAULT_PREDICTOR
+    "safety": {},  # 安全配置（阻力上限等），未填写的项使用 safety.DEFAULT_SAFETY
+    "effects": {},  # 本地效果配置，未填写的项使用 effects.DEFAULT_EFFECTS
+}
+
+
+class ProfileStore:
+    def __init__(self, path=PROFILE_FILE, default_active="赛车游戏"):
+        self.path = path
+        self.active = default_active
+        self.profiles = {}
+        self.load()
+
+    def load(self):
+        """从文件加载全部档案，文件不存在或损坏时使用默认值"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.active = data.get("active", self.active)
+            self.profiles = data.get("profiles", {})
+        except (OSError, ValueError) as e:
+            logger.error(f"读取配置档案失败：{e}")
+
+    def save(self):
+        """写入文件（先写临时文件再替换，避免写到一半损坏）"""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"active": self.active, "profiles": self.profiles}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def get(self, name=None):
+        """获取档案（默认取当前激活档案），缺失字段用默认值补齐"""
+        name = name or self.active
+        profile = copy.deepcopy(DEFAULT_PROFILE)
+        profile.update(self.profiles.get(name, {}))
+        self.profiles[name] = profile
+        return profile
+
+    def set_active(self, name):
+        """切换当前激活档案"""
+        self.active = name
+        return self.get(name)
+
+    def update(self, name=None, **values):
+        """更新档案字段并保存"""
+        profile = self.get(name)
+        profile.update(values)
+        self.save()
+        return profile
@@ -0,0 +1,226 @@
+"""
+安全监督
+功能：阻力上限（按档案配置）、阻力变化速率限制（游戏力反馈和手动阻力都经过），以及看门狗：
+力反馈循环错过截止时间或角度数据流中断时，把阻力平滑降到 0 并停止心跳；
+固件端通过 W:<超时ms> 启用看门狗，超时未收到任何指令（含 H: 心跳）时自行把阻力降到 0；
+时间和心跳循环使用串口链路的时钟
+"""
+
+import threading
+
+from calibration import compensate_friction
+from control import force_to_resistance, resistance_command
+from event_log import get_logger
+from sim_clock import STOP
+
+logger = get_logger("safety")
+
+# 默认安全配置，保存在配置档案的 "safety" 字段中
+DEFAULT_SAFETY = {
+    "max_torque": 100.0,  # 阻力上限（0-100）
+    "slew_rate": 500.0,  # 阻力变化速率上限（每秒）
+    "fade_time": 0.5,  # 故障时从上限降到 0 的时间（秒）
+    "deadline": 0.2,  # 力反馈循环两次执行的最长间隔（秒）
+    "angle_timeout": 0.3,  # 角度数据中断判定时间（秒）
+    "heartbeat": 0.1,  # 心跳间隔（秒）
+    "firmware_timeout": 0.5,  # 固件看门狗超时（秒），0 表示不启用
+}
+
+
+def safety_settings(settings=None):
+    """合并档案中的安全配置与默认值"""
+    config = dict(DEFAULT_SAFETY)
+    config.update(settings or {})
+    return config
+
+
+class TorqueLimiter:
+    """阻力限幅与限速：正常时按 slew_rate 追踪指令，故障时按 fade_time 降到 0"""
+
+    __slots__ = ("max_torque", "slew_rate", "fade_time", "fade_rate", "output", "last", "fault")
+
+    def __init__(self, max_torque=100.0, slew_rate=500.0, fade_time=0.5, **unused):
+        self.slew_rate = slew_rate
+        self.fade_time = fade_time
+        self.set_max_torque(max_torque)
+        self.output = 0.0
+        self.last = None
+        self.fault = None  # 故障原因，None 表示正常
+
+    def set_max_torque(self, max_torque):
+        """修改阻力上限，并重新计算故障降阻速率，使从上限降到 0 的时间保持 fade_time"""
+        self.max_torque = max_torque
+        self.fade_rate = max_torque / self.fade_time if self.fade_time > 0 else float("inf")
+
+    def clamp(self, value):
+        """只做上下限限制"""
+        return min(max(value, 0.0), self.max_torque)
+
+    def limit(self, requested, now):
+        """返回本周期允许输出的阻力"""
+        if self.fault is None:
+            target = min(max(requested, 0.0), self.max_torque)
+            rate = self.slew_rate
+        else:
+            target = 0.0
+            rate = self.fade_rate
+        step = rate * (now - self.last) if self.last is not None else 0.0
+        self.last = now
+
+        output = self.output
+        if target > output + step:
+            output += step
+        elif target < output - step:
+            output -= step
+        else:
+            output = target
+        self.output = output
+        return output
+
+
+def drive_resistance(state, gain, deadzone, calibration, safety, link, effects=None, now=None):
+    """
+    力反馈循环的下发部分（单机界面与多设备工作进程共用）：state.force 经增益/死区得到目标阻力，
+    摩擦补偿、限幅限速后发送到 ESP32（本地效果可用时只发送变化的参数和阻力），返回调整后的力
+    """
+    state.ticks += 1
+    adjusted_force, resistance = force_to_resistance(state.force, gain, deadzone)
+    state.resistance = resistance
+    moving = abs(state.velocity) > 2.0
+    resistance = safety.tick(compensate_friction(resistance, calibration, moving), now)
+    if effects is None:
+        link.write(resistance_command(resistance))  # 预编码指令，不做格式化
+    else:
+        effects.send_resistance(resistance, safety.limiter.fault)
+    return adjusted_force
+
+
+class ManualResistance:
+    """
+    手动阻力（单机界面与 Motorgame 共用）：界面线程用 set 提交目标，控制循环每周期调用 step，
+    目标经安全监督限幅限速后下发，大阶跃按 slew_rate 分多步到达，到达后把阻力控制交还力反馈循环；
+    目标只由界面线程写、进度只由控制循环写，不需要加锁
+    """
+
+    __slots__ = ("target", "requests", "applied")
+
+    def __init__(self):
+        self.target = 0.0
+        self.requests = 0  # 已提交的目标数
+        self.applied = 0  # 已到达（或被力反馈循环接管而放弃）的目标数
+
+    def set(self, value):
+        self.target = value
+        self.requests += 1
+
+    def pending(self):
+        return self.applied != self.requests
+
+    def skip(self):
+        """力反馈循环接管阻力时放弃尚未到达的目标"""
+        self.applied = self.requests
+
+    def step(self, safety, link, now=None):
+        """推进一个周期：输出变化时下发限幅限速后的阻力并返回该值；没有待下发的目标时返回 None"""
+        requests = self.requests
+        if requests == self.applied:
+            return None
+        target = self.target
+        limiter = safety.limiter
+        previous = limiter.output
+        output = safety.tick(target, now)
+        if output != previous:
+            link.write(resistance_command(output))
+        if output == limiter.clamp(target) or limiter.fault is not None:
+            self.applied = requests
+            safety.release()
+        return output
+
+
+class SafetyWatchdog:
+    __slots__ = ("link", "clock", "limiter", "deadline", "angle_timeout", "heartbeat", "firmware_timeout",
+                 "lock", "last_tick", "last_angle", "faults", "running", "thread")
+
+    def __init__(self, link, settings=None):
+        config = safety_settings(settings)
+        self.link = link
+        self.clock = link.clock
+        self.limiter = TorqueLimiter(**config)
+        self.deadline = config["deadline"]
+        self.angle_timeout = config["angle_timeout"]
+        self.heartbeat = config["heartbeat"]
+        self.firmware_timeout = config["firmware_timeout"]
+
+        self.lock = threading.Lock()
+        self.last_tick = None  # 力反馈循环最近一次执行时间，None 表示循环未在驱动阻力
+        self.last_angle = None
+        self.faults = 0
+        self.running = False
+        self.thread = None
+        link.add_listener(self.on_angle)
+
+    def on_angle(self, timestamp, angle):
+        """串口链路回调：记录最近一次收到角度的时间"""
+        self.last_angle = timestamp
+
+    def start(self):
+        """启用固件看门狗并启动心跳循环（真实时钟下为线程）"""
+        if self.firmware_timeout > 0:
+            self.link.write(b"W:%d\n" % int(self.firmware_timeout * 1000))
+        self.last_angle = self.clock.now()
+        self.running = True
+        self.thread = self.clock.spawn(self.step, self.heartbeat, name="safety")
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+        self.link.remove_listener(self.on_angle)
+
+    def tick(self, requested, now=None):
+        """力反馈循环每周期调用：记录执行时间并返回限幅限速后的阻力"""
+        if now is None:
+            now = self.clock.now()
+        with self.lock:
+            self.last_tick = now
+            return self.limiter.limit(requested, now)
+
+    def release(self):
+        """力反馈循环暂停（手动模式、校准等）时调用，不再检查其截止时间"""
+        with self.lock:
+            self.last_tick = None
+            self.limiter.last = None
+
+    def check(self, now):
+        """返回故障原因，正常时返回 None"""
+        if self.last_tick is not None and now - self.last_tick > self.deadline:
+            return "力反馈循环超时"
+        if self.last_angle is None or now - self.last_angle > self.angle_timeout:
+            return "角度数据中断"
+        return None
+
+    def step(self):
+        """看门狗循环单步：正常时发送心跳，故障时由本循环把阻力降到 0（此时不发心跳，固件也会超时降为 0）"""
+        if not (self.running and self.link.running):
+            return STOP
+        now = self.clock.now()
+        reason = self.check(now)
+        command = None
+        with self.lock:
+            if reason != self.limiter.fault:
+                if reason is None:
+                    logger.info(f"安全故障解除：{self.limiter.fault}")
+                else:
+                    self.faults += 1
+                    logger.warning(f"安全故障：{reason}，阻力降为 0")
+                self.limiter.fault = reason
+            if reason is None:
+                command = b"H:\n"
+            elif self.limiter.output > 0:
+                command = resistance_command(self.limiter.limit(0.0, now))
+        if command is not None:
+            try:
+                self.link.write(command)
+            except Exception as e:
+                logger.error(f"看门狗写入失败：{e}")
+        return None
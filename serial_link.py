@@ -0,0 +1,378 @@
+"""
+串口链路层
+功能：后台线程按 in_waiting 批量读取串口数据，用 readinto 直接读入预分配的接收缓冲，原地按行切帧并直接解析 A: 角度，
+不做逐行 decode，也不为每批数据新建 bytes；一次读取的多帧按上一批到本批的时间均匀分配时间戳；读取大小和唤醒间隔根据实测帧率自适应，并统计吞吐量和解析错误；
+支持按配置档案打开串口，并与固件协商最高可靠波特率和采样率；时间戳、休眠和读取循环来自注入的时钟（见 sim_clock.py）
+
+协商协议：
+    主机 -> 固件  L:<波特率>,<采样率>   请求切换
+    固件 -> 主机  L:OK / L:NO           应答后固件切换到新波特率
+    主机 -> 固件  P:<序号>              新波特率下的探测帧，固件原样回传
+    主机 -> 固件  L:ACK                 确认切换；固件超时未收到则自动回退到原波特率
+"""
+
+import threading
+from array import array
+from collections import deque
+
+from event_log import get_logger
+from sim_clock import CLOCK, STOP
+
+logger = get_logger("serial")
+
+# 自适应参数
+MIN_INTERVAL = 0.001  # 最短唤醒间隔（秒）
+MAX_INTERVAL = 0.02  # 最长唤醒间隔（秒），无数据时也不超过该值，保证响应
+TARGET_BATCH = 4  # 每次唤醒期望读取的帧数
+MIN_READ_SIZE = 256  # 单次读取下限（字节）
+MAX_READ_SIZE = 65536  # 单次读取上限（字节）
+RATE_WINDOW = 0.5  # 速率统计窗口（秒）
+MAX_FRAME_LENGTH = 256  # 超过该长度仍无换行则视为乱码丢弃
+
+# 链路协商参数
+HANDSHAKE_TIMEOUT = 0.3  # 等待固件应答的时间（秒）
+SWITCH_DELAY = 0.05  # 固件应答后切换波特率前的等待（秒）
+FALLBACK_TIMEOUT = 1.0  # 固件未收到 L:ACK 时自动回退所需时间（秒）
+PROBE_COUNT = 50  # 每个波特率发送的探测帧数
+FRAME_BITS = 11 * 10  # 一个 A: 帧约 11 字节，每字节 10 位（含起止位）
+LINK_UTILIZATION = 0.5  # 角度数据流最多占用的链路带宽比例
+
+# 默认链路配置，保存在配置档案的 "link" 字段中
+DEFAULT_LINK = {
+    "baudrate": 115200,
+    "rtscts": False,  # RTS/CTS 硬件流控
+    "xonxoff": False,  # XON/XOFF 软件流控
+    "write_timeout": 0.1,  # 写超时（秒）
+    "auto_tune": True,  # 连接后自动协商
+    "max_baudrate": 2000000,
+    "max_sample_rate": 1000,  # 固件角度上报的最高采样率（Hz）
+    "max_error_rate": 0.01,  # 可接受的最高误码率
+    "baud_candidates": [2000000, 921600, 460800, 230400, 115200],
+}
+
+
+def link_settings(settings=None):
+    """合并档案中的链路配置与默认值"""
+    config = dict(DEFAULT_LINK)
+    config.update(settings or {})
+    return config
+
+
+def open_serial(port, settings=None):
+    """按链路配置打开串口（读超时为 0，由 SerialLink 后台线程负责读取）"""
+    # 延迟导入：链路层本身只依赖 read/write 接口，可直接用模拟串口测试
+    import serial
+
+    config = link_settings(settings)
+    return serial.Serial(
+        port,
+        config["baudrate"],
+        timeout=0,
+        write_timeout=config["write_timeout"],
+        rtscts=config["rtscts"],
+        xonxoff=config["xonxoff"],
+    )
+
+
+def sample_rate_for(baudrate, max_sample_rate):
+    """根据波特率计算可持续的角度采样率"""
+    return int(min(max_sample_rate, baudrate * LINK_UTILIZATION / FRAME_BITS))
+
+
+class SerialLink:
+    __slots__ = ("ser", "clock", "running", "thread", "write_lock", "buffer", "view", "used",
+                 "queue_size", "angle_times", "angle_values", "angle_head", "angle_tail", "latest_angle",
+                 "frames", "listeners", "read_size", "interval", "last_feed",
+                 "total_bytes", "total_frames", "parse_errors", "dropped_frames", "bytes_per_sec", "frames_per_sec",
+                 "window_start", "window_bytes", "window_frames")
+
+    def __init__(self, ser, max_queue=4096, clock=None):
+        self.ser = ser
+        self.clock = clock or CLOCK
+        self.running = False
+        self.thread = None
+        self.write_lock = threading.Lock()
+
+        # 接收缓冲：开头是上一批未凑成整帧的残余数据，新数据读入其后原地解析，解析后残余数据移回开头
+        self.buffer = bytearray(MAX_FRAME_LENGTH + MAX_READ_SIZE)
+        self.view = memoryview(self.buffer)
+        self.used = 0  # 残余数据长度
+
+        # 解析结果：定长环形缓冲（时间戳、角度各一个 double 数组），读取线程原地写入，界面线程定时取走
+        self.queue_size = max_queue
+        self.angle_times = array("d", bytes(8 * max_queue))
+        self.angle_values = array("d", bytes(8 * max_queue))
+        self.angle_head = 0  # 已写入的帧数，只由读取线程修改
+        self.angle_tail = 0  # 已取走的帧数，只由界面线程修改
+        self.latest_angle = None
+        self.frames = deque(maxlen=256)  # 其他类型的帧，原样保留
+        self.listeners = []  # 每收到一个角度帧调用 listener(时间戳, 角度)，运行在读取线程
+
+        # 自适应读取参数
+        self.read_size = MIN_READ_SIZE
+        self.interval = MAX_INTERVAL
+
+        # 统计
+        self.total_bytes = 0
+        self.total_frames = 0
+        self.parse_errors = 0
+        self.dropped_frames = 0  # 队列已满、未被及时取走而丢弃的角度帧
+        self.bytes_per_sec = 0.0
+        self.frames_per_sec = 0.0
+        self.window_start = self.clock.now()
+        self.last_feed = self.window_start  # 上一批数据的读取时刻
+        self.window_bytes = 0
+        self.window_frames = 0
+
+    def start(self):
+        """启动后台读取循环（真实时钟下为线程）"""
+        self.running = True
+        self.thread = self.clock.spawn(self.poll, MAX_INTERVAL, name="serial-link")
+
+    def close(self):
+        """停止读取线程并关闭串口"""
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+        if self.ser and self.ser.is_open:
+            self.ser.close()
+
+    def write(self, data):
+        """线程安全地写入串口"""
+        with self.write_lock:
+            self.ser.write(data)
+
+    def add_listener(self, listener):
+        """注册角度帧回调"""
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """注销角度帧回调"""
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def poll(self):
+        """读取循环单步：有数据就一次性读完，返回到下次读取的等待时间（没数据时为自适应间隔）"""
+        if not self.running:
+            return STOP
+        try:
+            waiting = self.ser.in_waiting
+            if waiting:
+                self.fill(min(waiting, self.read_size))
+                if waiting > self.read_size:
+                    return 0.0  # 积压较多，不休眠直接继续读
+        except Exception as e:
+            self.parse_errors += 1
+            logger.error(f"串口读取错误：{e}")
+            self.running = False
+            return STOP
+        self.update_rates()
+        return self.interval
+
+    def fill(self, size):
+        """从串口读取至多 size 字节，直接写入接收缓冲的残余数据之后并解析，返回读取的字节数"""
+        used = self.used
+        count = self.ser.readinto(self.view[used:used + min(size, MAX_READ_SIZE)])
+        if count:
+            self.parse_buffer(count)
+        return count or 0
+
+    def feed(self, data):
+        """追加已读出的原始数据（复制到接收缓冲）并解析"""
+        data = memoryview(data)
+        while data:
+            size = min(len(data), MAX_READ_SIZE)
+            used = self.used
+            self.view[used:used + size] = data[:size]
+            self.parse_buffer(size)
+            data = data[size:]
+
+    def parse_buffer(self, size):
+        """
+        解析接收缓冲中新写入的 size 字节并切出完整帧；本批各帧的时间戳在上一批读取时刻到本次读取时刻之间均匀分布
+        （跨度不超过按实测帧率估计的本批帧数所需时间），最后一帧为本次读取时刻
+        """
+        now = self.clock.now()
+        previous = self.last_feed
+        self.last_feed = now
+        self.total_bytes += size
+        self.window_bytes += size
+
+        buffer = self.buffer
+        used = self.used
+        total = used + size
+        count = buffer.count(b"\n", used, total) or 1  # 残余数据中没有换行
+        span = now - previous
+        rate = self.frames_per_sec
+        limit = count / rate if rate > 0 else MAX_INTERVAL
+        step = (span if span < limit else limit) / count
+        timestamp = now - step * count
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start, total)
+            if end < 0:
+                break
+            timestamp += step
+            self.parse_frame(buffer, start, end, timestamp)
+            start = end + 1
+        remaining = total - start
+        if remaining > MAX_FRAME_LENGTH:
+            remaining = 0
+            self.parse_errors += 1
+        elif start and remaining:
+            self.view[:remaining] = self.view[start:total]
+        self.used = remaining
+
+    def parse_frame(self, buf, start, end, now):
+        """解析一帧（buf[start:end]，不含换行），float 直接接受字节串并忽略首尾空白"""
+        if end - start < 2:
+            return  # 空行
+        if buf.startswith(b"A:", start):
+            try:
+                angle = float(buf[start + 2:end])
+            except ValueError:
+                self.parse_errors += 1
+                return
+            self.total_frames += 1
+            self.window_frames += 1
+            self.latest_angle = angle
+            head = self.angle_head
+            if head - self.angle_tail >= self.queue_size:
+                self.dropped_frames += 1  # 覆盖最旧的一帧
+            index = head % self.queue_size
+            self.angle_times[index] = now
+            self.angle_values[index] = angle
+            self.angle_head = head + 1
+            for listener in self.listeners:
+                listener(now, angle)
+        else:
+            self.total_frames += 1
+            self.window_frames += 1
+            self.frames.append(bytes(buf[start:end]).rstrip(b"\r"))
+
+    def update_rates(self):
+        """按统计窗口更新速率，并据此调整读取大小和唤醒间隔"""
+        now = self.clock.now()
+        elapsed = now - self.window_start
+        if elapsed < RATE_WINDOW:
+            return
+        self.bytes_per_sec = self.window_bytes / elapsed
+        self.frames_per_sec = self.window_frames / elapsed
+        self.window_start = now
+        self.window_bytes = 0
+        self.window_frames = 0
+
+        # 帧率越高唤醒越频繁，每次读取约 TARGET_BATCH 帧
+        if self.frames_per_sec > 0:
+            self.interval = min(MAX_INTERVAL, max(MIN_INTERVAL, TARGET_BATCH / self.frames_per_sec))
+        else:
+            self.interval = MAX_INTERVAL
+        self.read_size = int(min(MAX_READ_SIZE, max(MIN_READ_SIZE, self.bytes_per_sec * self.interval * 2)))
+
+    def wait_frame(self, prefix, timeout):
+        """等待以 prefix 开头的帧，超时返回 None"""
+        clock = self.clock
+        deadline = clock.now() + timeout
+        while clock.now() < deadline:
+            while self.frames:
+                frame = self.frames.popleft()
+                if frame.startswith(prefix):
+                    return frame
+            clock.sleep(0.005)
+        return None
+
+    def probe(self, count=PROBE_COUNT, timeout=HANDSHAKE_TIMEOUT):
+        """发送探测帧并统计回传情况，返回误码率：探测帧丢失率与期间实际收到的帧中解析错误的比例，取较大者"""
+        self.frames.clear()
+        errors_before = self.parse_errors
+        frames_before = self.total_frames
+        for seq in range(count):
+            self.write(b"P:%d\n" % seq)
+
+        echoed = set()
+        clock = self.clock
+        deadline = clock.now() + timeout
+        while len(echoed) < count and clock.now() < deadline:
+            while self.frames:
+                frame = self.frames.popleft()
+                if frame.startswith(b"P:"):
+                    try:
+                        echoed.add(int(frame[2:]))
+                    except ValueError:
+                        self.parse_errors += 1
+            clock.sleep(0.005)
+
+        lost = (count - len(echoed)) / count
+        errors = self.parse_errors - errors_before
+        received = (self.total_frames - frames_before) + errors
+        return max(lost, errors / received if received else 0.0)
+
+    def negotiate(self, settings=None):
+        """
+        与固件协商最高可靠波特率和采样率，从高到低尝试，误码率超标自动回退
+        返回 (波特率, 采样率, 误码率)；固件不支持协商时采样率和误码率为 None
+        """
+        config = link_settings(settings)
+        base_baud = self.ser.baudrate
+
+        for baud in sorted(config["baud_candidates"], reverse=True):
+            if baud > config["max_baudrate"] or baud < base_baud:
+                continue
+            rate = sample_rate_for(baud, config["max_sample_rate"])
+            self.frames.clear()
+            self.write(f"L:{baud},{rate}\n".encode("utf-8"))
+            reply = self.wait_frame(b"L:", HANDSHAKE_TIMEOUT)
+            if reply is None:
+                return base_baud, None, None  # 固件不支持协商，保持原设置
+            if not reply.startswith(b"L:OK"):
+                continue
+
+            if baud != base_baud:
+                self.clock.sleep(SWITCH_DELAY)
+                self.ser.baudrate = baud
+                self.used = 0
+            error_rate = self.probe()
+            if error_rate <= config["max_error_rate"]:
+                self.write(b"L:ACK\n")
+                return baud, rate, error_rate
+
+            # 回退：主机切回原波特率，固件未收到 L:ACK 会在超时后自行回退
+            if baud != base_baud:
+                self.ser.baudrate = base_baud
+                self.used = 0
+                self.clock.sleep(FALLBACK_TIMEOUT)
+
+        return base_baud, None, None
+
+    def drain_angles(self):
+        """
+        取走所有待处理的角度帧，返回 (时间戳数组, 角度数组)；
+        数组不受 GC 跟踪，界面线程阻塞后一次取走大量帧也不会触发垃圾回收
+        """
+        head = self.angle_head
+        tail = max(self.angle_tail, head - self.queue_size)
+        self.angle_tail = head
+        start, end = tail % self.queue_size, head % self.queue_size
+        times, values = self.angle_times, self.angle_values
+        if start < end or head == tail:
+            return times[start:end], values[start:end]
+        return times[start:] + times[:end], values[start:] + values[:end]  # 跨越缓冲区末尾
+
+    def discard_angles(self):
+        """丢弃待处理的角度帧（只关心最新角度时使用）"""
+        self.angle_tail = self.angle_head
+
+    def stats(self):
+        """链路统计信息"""
+        return {
+            "bytes_per_sec": self.bytes_per_sec,
+            "frames_per_sec": self.frames_per_sec,
+            "total_bytes": self.total_bytes,
+            "total_frames": self.total_frames,
+            "parse_errors": self.parse_errors,
+            "dropped_frames": self.dropped_frames,
+            "angle_queue": min(self.angle_head - self.angle_tail, self.queue_size),
+            "frame_queue": len(self.frames),
+            "read_size": self.read_size,
+            "interval": self.interval,
+        }
@@ -0,0 +1,81 @@
+"""
+会话录制
+功能：把角度、阻力指令等数据按定长二进制记录写入文件，便于离线分析（可直接内存映射读取）
+文件格式：8 字节文件头 b"RKTS" + 版本(uint32)，之后每条记录 13 字节：
+    时间戳 float64（秒，perf_counter）| 类型 uint8 | 数值 float32
+"""
+
+import struct
+import threading
+
+MAGIC = b"RKTS"
+VERSION = 1
+HEADER = struct.Struct("<4sI")
+RECORD = struct.Struct("<dBf")
+
+# 记录类型
+KIND_ANGLE = 0  # 方向盘角度（度，相对校准中心）
+KIND_RESISTANCE = 1  # 下发的阻力指令（0-100）
+KIND_FORCE = 2  # 游戏力反馈值
+KIND_AXIS = 3  # 输出到 vJoy 的角度（预测后）
+
+KIND_NAMES = {
+    KIND_ANGLE: "angle",
+    KIND_RESISTANCE: "resistance",
+    KIND_FORCE: "force",
+    KIND_AXIS: "axis",
+}
+
+
+class SessionRecorder:
+    __slots__ = ("path", "file", "buffer", "view", "offset", "count", "lock")
+
+    def __init__(self, path, flush_records=4096):
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION))
+        # 预分配的定长缓冲，记录直接 pack_into 到当前偏移处，写满后整块写盘并从头复用
+        self.buffer = bytearray(flush_records * RECORD.size)
+        self.view = memoryview(self.buffer)
+        self.offset = 0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def write(self, timestamp, kind, value):
+        """追加一条记录（可在任意线程调用），缓冲满后批量写盘"""
+        with self.lock:
+            RECORD.pack_into(self.buffer, self.offset, timestamp, kind, value)
+            self.offset += RECORD.size
+            self.count += 1
+            if self.offset == len(self.buffer):
+                self.file.write(self.buffer)
+                self.offset = 0
+
+    def close(self):
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.write(self.view[:self.offset])
+            self.offset = 0
+            self.file.close()
+            self.file = None
+
+
+def read_session(path):
+    """读取录制文件，返回 {类型: ([时间], [数值])}"""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"不是会话录制文件：{path}")
+    if version != VERSION:
+        raise ValueError(f"不支持的录制文件版本：{version}")
+
+    body = memoryview(data)[HEADER.size:]
+    body = body[:len(body) - len(body) % RECORD.size]  # 忽略未写完的尾部记录
+    channels = {}
+    for timestamp, kind, value in RECORD.iter_unpack(body):
+        times, values = channels.setdefault(kind, ([], []))
+        times.append(timestamp)
+        values.append(value)
+    return channels
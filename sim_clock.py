@@ -0,0 +1,235 @@
+"""
+时钟与调度
+功能：串口链路、安全监督、模拟器、遥测和力反馈循环通过可注入的时钟取时间、休眠和启动后台循环，
+界面泵通过调度器注册定时回调；生产环境使用真实单调时钟（perf_counter、线程、Tk after），
+测试和回放使用虚拟时钟：单线程离散事件调度，各组件的单步函数按虚拟时间顺序执行，不真正等待，
+几小时的模拟或录制驾驶几秒到几十秒跑完，同样的输入每次得到完全相同的结果（输出摘要一致）
+用法：
+    python sim_clock.py [--hours 1] [--session 录制.rks] [--check]
+        --session 回放录制文件中的力反馈值（循环播放），默认使用合成遥测（Forza）驾驶
+        --check   运行两遍并比较结果摘要
+"""
+
+import argparse
+import hashlib
+import heapq
+import math
+import struct
+import threading
+import time
+
+STOP = False  # 循环单步函数返回 STOP 时结束循环
+
+
+class MonotonicClock:
+    """真实时钟：perf_counter 单调时间，spawn 在后台线程中运行循环"""
+
+    virtual = False
+
+    def now(self):
+        return time.perf_counter()
+
+    def sleep(self, delay):
+        if delay > 0:
+            time.sleep(delay)
+
+    def spawn(self, step, interval, name=None):
+        """
+        在后台线程中循环执行 step()：返回值为到下次执行的等待时间（秒），None 使用 interval，STOP 结束循环；
+        返回线程对象
+        """
+        def loop():
+            while True:
+                delay = step()
+                if delay is STOP:
+                    break
+                self.sleep(interval if delay is None else delay)
+
+        thread = threading.Thread(target=loop, name=name, daemon=True)
+        thread.start()
+        return thread
+
+
+class VirtualClock:
+    """
+    虚拟时钟：按时间顺序执行已登记的回调，时间只在执行到下一个事件时跳变；
+    同一时刻的事件按登记顺序执行，sleep 在当前回调中推进时间并执行期间到期的其他事件（用于协商等阻塞调用）
+    """
+
+    virtual = True
+
+    def __init__(self, start=0.0):
+        self.time = start
+        self.queue = []  # (时间, 登记序号, 回调)
+        self.seq = 0
+        self.events = 0  # 已执行的事件数
+
+    def now(self):
+        return self.time
+
+    def call_at(self, when, fn):
+        heapq.heappush(self.queue, (max(when, self.time), self.seq, fn))
+        self.seq += 1
+
+    def call_later(self, delay, fn):
+        self.call_at(self.time + delay, fn)
+
+    def spawn(self, step, interval, name=None):
+        """与 MonotonicClock.spawn 相同的循环约定，由事件队列驱动，不创建线程（返回 None）"""
+        def run():
+            delay = step()
+            if delay is not STOP:
+                self.call_later(interval if delay is None else delay, run)
+
+        self.call_later(0.0, run)
+        return None
+
+    def run_until(self, when):
+        """执行时间不晚于 when 的全部事件，然后把时间推进到 when"""
+        queue = self.queue
+        while queue and queue[0][0] <= when:
+            self.time, _, fn = heapq.heappop(queue)
+            self.events += 1
+            fn()
+        self.time = max(self.time, when)
+
+    def sleep(self, delay):
+        self.run_until(self.time + max(0.0, delay))
+
+
+class TkScheduler:
+    """界面泵调度器：call_later 转为 Tk after，与 VirtualClock.call_later 接口相同"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def call_later(self, delay, fn):
+        return self.root.after(max(1, int(delay * 1000)), fn)
+
+
+CLOCK = MonotonicClock()  # 各组件未注入时钟时使用的默认真实时钟
+
+
+class SessionForce:
+    """录制文件中的力反馈值作为力源，按录制时间循环播放（保持最近一个值）"""
+
+    def __init__(self, path):
+        from bisect import bisect_right
+        from session_rec import read_session, KIND_FORCE
+
+        times, values = read_session(path).get(KIND_FORCE, ([], []))
+        if len(times) < 2:
+            raise ValueError(f"录制文件中没有力反馈记录：{path}")
+        start = times[0]
+        self.times = [t - start for t in times]
+        self.values = values
+        self.span = self.times[-1]
+        self.bisect = bisect_right
+
+    def force(self, now=0.0):
+        index = self.bisect(self.times, now % self.span) - 1
+        return self.values[max(0, index)]
+
+
+class DriverModel:
+    """模拟驾驶者：若干正弦叠加的转向力矩，加上周期性的急打方向，只依赖虚拟时间"""
+
+    def __init__(self, model, amplitude=25.0):
+        self.model = model
+        self.amplitude = amplitude
+
+    def step(self, now):
+        torque = self.amplitude * (math.sin(now * 0.7) + 0.5 * math.sin(now * 2.3 + 1.0))
+        if now % 30.0 < 0.5:
+            torque += 2 * self.amplitude  # 每 30 秒急打一次方向
+        self.model.driver_torque = torque
+
+
+def simulate(hours=1.0, session=None, rate=100, sample_rate=250, sample_interval=0.01):
+    """
+    在虚拟时钟上运行完整管线（模拟下位机 -> 串口链路 -> 力反馈循环 -> 安全监督/本地效果 -> 模拟下位机），
+    返回结果摘要 dict
+    """
+    from esp32_sim import Esp32Simulator, WheelModel
+    from fleet import RigRunner, DEFAULT_RIG
+    from profiles import DEFAULT_PROFILE
+    from telemetry import DECODERS
+
+    clock = VirtualClock()
+    profile = dict(DEFAULT_PROFILE, force_source="vjoy" if session else "telemetry",
+                   link={"max_sample_rate": sample_rate})  # 链路协商不把采样率提高到 sample_rate 以上
+    force_source = SessionForce(session) if session else None
+    simulator = Esp32Simulator(sample_rate=sample_rate, model=WheelModel(spring=0.25), clock=clock, transport="memory")
+    rig = dict(DEFAULT_RIG, name="虚拟", port="sim", rate=rate)
+    runner = RigRunner(rig, clock=clock, profile=profile, simulator=simulator, force_source=force_source)
+    runner.start()
+
+    if runner.telemetry is not None:
+        source = DECODERS[runner.telemetry.decoder.NAME]()
+        clock.spawn(lambda: runner.telemetry.on_packet(source.synthesize(clock.now())), 1 / 60.0)
+    driver = DriverModel(simulator.model)
+    clock.spawn(lambda: driver.step(clock.now()), 0.01)
+
+    # 结果摘要：按固定间隔采样电机角度和力矩，输入相同则摘要相同
+    digest = hashlib.sha256()
+    sample = struct.Struct("<ddd")
+
+    def record():
+        model = simulator.model
+        digest.update(sample.pack(clock.now(), model.angle, model.resistance))
+
+    clock.spawn(record, sample_interval)
+
+    duration = hours * 3600.0
+    started = time.perf_counter()
+    clock.run_until(duration)
+    elapsed = time.perf_counter() - started
+    health = runner.health()
+    runner.stop()
+    clock.run_until(duration + 1.0)
+    return {
+        "duration": duration,
+        "elapsed": elapsed,
+        "events": clock.events,
+        "commands": simulator.received_commands,
+        "frames": runner.state.frames,
+        "ticks": runner.ticks,
+        "faults": health["faults"],
+        "reconnects": health["reconnects"],
+        "effects": health["effects"],
+        "digest": digest.hexdigest(),
+    }
+
+
+def print_summary(result):
+    print(f"虚拟时间 {result['duration'] / 3600:.2f} 小时，实际耗时 {result['elapsed']:.1f} 秒"
+          f"（{result['duration'] / max(result['elapsed'], 1e-9):.0f} 倍速），事件 {result['events']}")
+    print(f"角度帧 {result['frames']}  力反馈周期 {result['ticks']}  下位机收到阻力指令 {result['commands']}  "
+          f"本地效果 {result['effects'] if result['effects'] is not None else '未启用'}")
+    print(f"安全故障 {result['faults']}  重连 {result['reconnects']}")
+    print(f"结果摘要 {result['digest']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在虚拟时钟上运行完整力反馈管线")
+    parser.add_argument("--hours", type=float, default=1.0, help="虚拟驾驶时长（小时）")
+    parser.add_argument("--session", help="回放录制文件（.rks）中的力反馈值")
+    parser.add_argument("--rate", type=int, default=100, help="力反馈循环频率（Hz）")
+    parser.add_argument("--sample-rate", type=int, default=250, help="模拟下位机的角度采样率（Hz）")
+    parser.add_argument("--check", action="store_true", help="运行两遍并比较结果摘要")
+    args = parser.parse_args()
+
+    runs = 2 if args.check else 1
+    digests = []
+    for _ in range(runs):
+        result = simulate(args.hours, args.session, args.rate, args.sample_rate)
+        print_summary(result)
+        digests.append(result["digest"])
+    if args.check:
+        if len(set(digests)) != 1:
+            raise SystemExit("两次运行结果不一致")
+        print("两次运行结果一致")
+
+
+if __name__ == "__main__":
+    main()
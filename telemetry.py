@@ -0,0 +1,364 @@
+"""
+游戏遥测输入
+功能：用 asyncio 监听游戏广播的 UDP 遥测数据包，按游戏用预编译的 struct.Struct 解码到复用的状态对象，
+由回正力矩、路面颠簸和路肩震动合成 0-1 的力反馈值，作为 vJoy 力反馈之外的另一种力源；
+附带抓包、回放和合成数据发送工具，没有游戏时也可以测试
+用法：
+    python telemetry.py listen [--game forza] [--port 5300]          打印解码结果和力反馈值
+    python telemetry.py capture 抓包.udp [--port 5300] [--duration 60]  保存收到的数据包
+    python telemetry.py replay 抓包.udp [--port 5300] [--speed 1.0]    按原时间间隔回放到本机
+    python telemetry.py synth [--game forza] [--rate 360]             发送合成数据包
+"""
+
+import argparse
+import asyncio
+import math
+import socket
+import struct
+import threading
+import time
+
+from devtools import LoopMonitor
+from event_log import get_logger
+from sim_clock import CLOCK
+
+logger = get_logger("ffb")
+
+# 默认遥测配置，保存在配置档案的 "telemetry" 字段中
+DEFAULT_TELEMETRY = {
+    "game": "forza",  # 解码器名称，见 DECODERS
+    "port": None,  # 监听端口，None 使用解码器默认端口
+    "sat_gain": 0.35,  # 回正力矩：每 1g 侧向加速度对应的力
+    "sat_speed": 8.0,  # 低于该车速（m/s）时回正力矩线性减弱
+    "slip_falloff": 0.8,  # 前轮归一化侧偏角超过该值后回正力矩衰减（到达抓地极限时方向盘变轻）
+    "road_gain": 0.15,  # 路面颠簸
+    "kerb_gain": 0.25,  # 路肩震动幅度
+    "kerb_rate": 8.0,  # 路肩震动频率（Hz），应低于力反馈循环频率的一半
+    "timeout": 0.5,  # 超过该时间没有数据包视为游戏暂停，力为 0
+}
+
+GRAVITY = 9.81
+CAPTURE_RECORD = struct.Struct("<dH")  # 抓包文件：时间戳 + 长度 + 数据包
+
+DECODERS = {}
+
+
+def decoder(name):
+    """注册遥测解码器"""
+    def register(cls):
+        cls.NAME = name
+        DECODERS[name] = cls
+        return cls
+    return register
+
+
+def telemetry_settings(settings=None):
+    """合并档案中的遥测配置与默认值"""
+    config = dict(DEFAULT_TELEMETRY)
+    config.update(settings or {})
+    return config
+
+
+class TelemetryState:
+    """解码结果，每个数据包原地更新，不新建对象"""
+
+    __slots__ = ("on_track", "speed", "lat_accel", "front_slip", "kerb", "surface")
+
+    def __init__(self):
+        self.on_track = False
+        self.speed = 0.0  # 车速（m/s）
+        self.lat_accel = 0.0  # 侧向加速度（g）
+        self.front_slip = 0.0  # 前轮归一化侧偏角（1 为抓地极限）
+        self.kerb = False  # 前轮压在路肩上
+        self.surface = 0.0  # 路面颠簸强度（0-1）
+
+
+@decoder("forza")
+class ForzaDecoder:
+    """Forza Motorsport / Horizon "Data Out"：Sled 格式 232 字节，Dash 格式在其后追加字段，只解析共同部分"""
+
+    LABEL = "Forza（Data Out）"
+    PORT = 5300
+    SIZE = 232
+    HEADER = struct.Struct("<i")  # IsRaceOn
+    MOTION = struct.Struct("<3f3f")  # 偏移 20：加速度 XYZ、速度 XYZ（X 向右，Z 向前）
+    WHEELS = struct.Struct("<4i4f4f")  # 偏移 116：路肩、积水深度、路面震动（FL FR RL RR）
+    SLIP = struct.Struct("<4f")  # 偏移 164：归一化侧偏角
+
+    def decode(self, data, state):
+        if len(data) < self.SIZE:
+            return False
+        state.on_track = self.HEADER.unpack_from(data, 0)[0] != 0
+        ax, _, _, vx, vy, vz = self.MOTION.unpack_from(data, 20)
+        state.lat_accel = ax / GRAVITY
+        state.speed = math.sqrt(vx * vx + vy * vy + vz * vz)
+        kerb_fl, kerb_fr, _, _, _, _, _, _, rumble_fl, rumble_fr, rumble_rl, rumble_rr = self.WHEELS.unpack_from(data, 116)
+        state.kerb = bool(kerb_fl or kerb_fr)
+        state.surface = min(1.0, (rumble_fl + rumble_fr + rumble_rl + rumble_rr) / 4)
+        slip_fl, slip_fr, _, _ = self.SLIP.unpack_from(data, 164)
+        state.front_slip = max(abs(slip_fl), abs(slip_fr))
+        return True
+
+    def synthesize(self, t):
+        """生成合成数据包：正弦绕弯，每 5 秒压 1 秒路肩"""
+        packet = bytearray(self.SIZE)
+        self.HEADER.pack_into(packet, 0, 1)
+        self.MOTION.pack_into(packet, 20, 1.2 * GRAVITY * math.sin(t * 0.8), 0.0, 0.0, 0.0, 0.0, 40.0)
+        kerb = 1 if t % 5 < 1 else 0
+        self.WHEELS.pack_into(packet, 116, kerb, kerb, 0, 0, 0, 0, 0, 0, 0.1, 0.1, 0.1, 0.1)
+        slip = abs(math.sin(t * 0.8)) * 1.1
+        self.SLIP.pack_into(packet, 164, slip, slip, slip, slip)
+        return bytes(packet)
+
+
+@decoder("codemasters")
+class CodemastersDecoder:
+    """Codemasters 旧版 UDP（extradata=3，66 个 float，DiRT/F1 旧作等），只解析前 38 个字段"""
+
+    LABEL = "Codemasters（extradata=3）"
+    PORT = 20777
+    SIZE = 264
+    FIELDS = struct.Struct("<38f")
+    SUSPENSION_SCALE = 0.002  # 悬挂速度（mm/s）到颠簸强度的换算
+
+    def decode(self, data, state):
+        if len(data) < self.SIZE:
+            return False
+        values = self.FIELDS.unpack_from(data, 0)
+        state.on_track = True
+        state.speed = values[7]
+        state.lat_accel = values[34]
+        state.front_slip = 0.0
+        state.kerb = False
+        # 悬挂速度（索引 21-24：RL RR FL FR）
+        state.surface = min(1.0, (abs(values[21]) + abs(values[22]) + abs(values[23]) + abs(values[24]))
+                            * self.SUSPENSION_SCALE / 4)
+        return True
+
+    def synthesize(self, t):
+        values = [0.0] * 66
+        values[0] = t
+        values[7] = 40.0
+        values[34] = 1.2 * math.sin(t * 0.8)
+        for i in range(21, 25):
+            values[i] = 60.0 * math.sin(t * 37.0 + i)
+        return struct.pack("<66f", *values)
+
+
+class TelemetryEffects:
+    """由遥测状态合成力反馈值（0-1）"""
+
+    def __init__(self, sat_gain=0.35, sat_speed=8.0, slip_falloff=0.8, road_gain=0.15, kerb_gain=0.25,
+                 kerb_rate=8.0, **unused):
+        self.sat_gain = sat_gain
+        self.sat_speed = sat_speed
+        self.slip_falloff = slip_falloff
+        self.road_gain = road_gain
+        self.kerb_gain = kerb_gain
+        self.kerb_rate = kerb_rate
+
+    def sat_scale(self, state):
+        """回正力矩系数：低速时线性减弱，前轮超过抓地极限后衰减"""
+        scale = min(1.0, state.speed / self.sat_speed)
+        if state.front_slip > self.slip_falloff:
+            scale *= max(0.2, 1.0 - (state.front_slip - self.slip_falloff) * 2.0)
+        return scale
+
+    def base_force(self, state):
+        """回正力矩 + 路面颠簸（每个数据包计算一次）"""
+        if not state.on_track:
+            return 0.0
+        sat = abs(state.lat_accel) * self.sat_gain * self.sat_scale(state)
+        return sat + state.surface * self.road_gain
+
+    def kerb_force(self, now):
+        """路肩震动：方波，在读取时按当前时间计算，与数据包频率无关"""
+        return self.kerb_gain if int(now * self.kerb_rate * 2) & 1 else 0.0
+
+
+class TelemetryProtocol(asyncio.DatagramProtocol):
+    def __init__(self, listener):
+        self.listener = listener
+
+    def datagram_received(self, data, addr):
+        self.listener.on_packet(data)
+
+
+class TelemetryListener:
+    def __init__(self, settings=None, clock=None):
+        config = telemetry_settings(settings)
+        self.clock = clock or CLOCK  # 数据包时间戳和超时判断使用的时钟
+        self.decoder = DECODERS[config["game"]]()
+        self.port = config["port"] or self.decoder.PORT
+        self.timeout = config["timeout"]
+        self.effects = TelemetryEffects(**config)
+        self.state = TelemetryState()
+        self.monitor = LoopMonitor()  # 数据包频率
+
+        self.base = 0.0
+        self.last_packet = None
+        self.packets = 0
+        self.invalid = 0
+        self.loop = None
+        self.thread = None
+
+    def start(self):
+        """在后台线程中运行 asyncio 事件循环"""
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        try:
+            transport, _ = self.loop.run_until_complete(self.loop.create_datagram_endpoint(
+                lambda: TelemetryProtocol(self), local_addr=("0.0.0.0", self.port)
+            ))
+        except OSError as e:
+            logger.error(f"遥测端口 {self.port} 监听失败：{e}")
+            self.loop.close()
+            return
+        logger.info(f"开始接收遥测数据：{self.decoder.LABEL}，UDP 端口 {self.port}")
+        try:
+            self.loop.run_forever()
+        finally:
+            transport.close()
+            self.loop.close()
+
+    def on_packet(self, data):
+        """事件循环回调：解码并更新基础力"""
+        if not self.decoder.decode(data, self.state):
+            self.invalid += 1
+            return
+        self.base = self.effects.base_force(self.state)
+        self.last_packet = self.clock.now()
+        self.packets += 1
+        self.monitor.tick(now=self.last_packet)
+
+    def force(self, now=None):
+        """当前力反馈值（0-1），数据中断时为 0"""
+        if now is None:
+            now = self.clock.now()
+        if self.last_packet is None or now - self.last_packet > self.timeout:
+            return 0.0
+        force = self.base
+        if self.state.kerb and self.state.on_track:
+            force += self.effects.kerb_force(now)
+        return min(1.0, force)
+
+
+def capture(path, port, duration=None):
+    """抓取 UDP 数据包保存到文件"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("0.0.0.0", port))
+    sock.settimeout(0.5)
+    count = 0
+    start = time.perf_counter()
+    with open(path, "wb") as f:
+        try:
+            while duration is None or time.perf_counter() - start < duration:
+                try:
+                    data = sock.recv(65535)
+                except socket.timeout:
+                    continue
+                f.write(CAPTURE_RECORD.pack(time.perf_counter() - start, len(data)))
+                f.write(data)
+                count += 1
+        except KeyboardInterrupt:
+            pass
+    sock.close()
+    print(f"已保存 {count} 个数据包到 {path}")
+
+
+def read_capture(path):
+    """读取抓包文件，返回 [(时间, 数据包)]"""
+    with open(path, "rb") as f:
+        data = f.read()
+    packets = []
+    pos = 0
+    while pos + CAPTURE_RECORD.size <= len(data):
+        timestamp, size = CAPTURE_RECORD.unpack_from(data, pos)
+        pos += CAPTURE_RECORD.size
+        packets.append((timestamp, data[pos:pos + size]))
+        pos += size
+    return packets
+
+
+def send_packets(packets, host, port, speed=1.0):
+    """按时间戳发送数据包，packets 为 (时间, 数据包) 迭代器"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    start = time.perf_counter()
+    count = 0
+    try:
+        for timestamp, data in packets:
+            delay = timestamp / speed - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+            sock.sendto(data, (host, port))
+            count += 1
+    except KeyboardInterrupt:
+        pass
+    sock.close()
+    return count
+
+
+def synth_packets(game, rate, duration=None):
+    """生成合成数据包流"""
+    source = DECODERS[game]()
+    i = 0
+    while duration is None or i / rate < duration:
+        t = i / rate
+        yield t, source.synthesize(t)
+        i += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="游戏遥测输入工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    listen_parser = sub.add_parser("listen", help="接收并打印解码结果")
+    capture_parser = sub.add_parser("capture", help="抓包保存")
+    capture_parser.add_argument("path")
+    capture_parser.add_argument("--duration", type=float)
+    replay_parser = sub.add_parser("replay", help="回放抓包到本机")
+    replay_parser.add_argument("path")
+    replay_parser.add_argument("--speed", type=float, default=1.0, help="回放速度倍数")
+    synth_parser = sub.add_parser("synth", help="发送合成数据包")
+    synth_parser.add_argument("--rate", type=float, default=60.0, help="发包频率（Hz）")
+    synth_parser.add_argument("--duration", type=float)
+    for p in (listen_parser, capture_parser, replay_parser, synth_parser):
+        p.add_argument("--game", default="forza", choices=sorted(DECODERS))
+        p.add_argument("--port", type=int)
+    for p in (replay_parser, synth_parser):
+        p.add_argument("--host", default="127.0.0.1")
+    args = parser.parse_args()
+    port = args.port or DECODERS[args.game].PORT
+
+    if args.command == "listen":
+        listener = TelemetryListener({"game": args.game, "port": port})
+        listener.start()
+        try:
+            while True:
+                time.sleep(0.5)
+                state = listener.state
+                print(f"{listener.monitor.rate():6.1f} 包/秒  车速 {state.speed:5.1f} m/s  侧向 {state.lat_accel:5.2f} g  "
+                      f"侧偏 {state.front_slip:4.2f}  路肩 {'是' if state.kerb else '否'}  力 {listener.force():.2f}")
+        except KeyboardInterrupt:
+            listener.stop()
+    elif args.command == "capture":
+        capture(args.path, port, args.duration)
+    elif args.command == "replay":
+        count = send_packets(read_capture(args.path), args.host, port, args.speed)
+        print(f"已回放 {count} 个数据包")
+    elif args.command == "synth":
+        count = send_packets(synth_packets(args.game, args.rate, args.duration), args.host, port)
+        print(f"已发送 {count} 个数据包")
+
+
+if __name__ == "__main__":
+    main()
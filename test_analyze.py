@@ -0,0 +1,77 @@
+"""离线分析：旧版链路按批共用时间戳的录制文件"""
+
+import math
+
+import numpy as np
+
+from analyze import load_session, analyze, channel, detect_steps, spread_batches
+from safety import TorqueLimiter
+from session_rec import SessionRecorder, KIND_ANGLE, KIND_RESISTANCE
+
+RATE = 1000  # 角度采样率（Hz）
+BATCH = 4  # 每次读取的帧数，同批共用读取时刻
+
+
+def write_batched_session(path, seconds=10.0):
+    """1kHz 角度（5Hz 振荡 + 阻力阶跃后的偏移），每 BATCH 帧共用一个时间戳；100Hz 阻力指令每秒阶跃一次"""
+    recorder = SessionRecorder(path)
+    for i in range(int(seconds * 100)):
+        t = i / 100
+        recorder.write(t, KIND_RESISTANCE, 60.0 if int(t) % 2 else 20.0)
+    for i in range(int(seconds * RATE)):
+        t = i / RATE
+        stamp = (i // BATCH + 1) * BATCH / RATE  # 本批读取时刻
+        offset = 5.0 if int(t) % 2 else 0.0
+        recorder.write(stamp, KIND_ANGLE, offset + 2.0 * math.sin(2 * math.pi * 5.0 * t))
+    recorder.close()
+
+
+def test_spread_batches_keeps_increasing_times():
+    times = np.arange(10) * 0.001
+    spread, values = spread_batches(times, times * 2)
+    assert np.array_equal(spread, times) and np.array_equal(values, times * 2)
+
+
+def test_spread_batches_spreads_shared_timestamps():
+    times = np.repeat([0.004, 0.008, 0.012], 4)
+    spread, values = spread_batches(times, np.arange(12.0))
+    assert np.allclose(spread, np.arange(5, 13) * 0.001)
+    assert np.array_equal(values, np.arange(4.0, 12.0))
+
+
+def test_analyze_batched_recording(tmp_path):
+    path = tmp_path / "batched.rks"
+    write_batched_session(path)
+    report = analyze(load_session(path))
+
+    assert abs(report["angle_jitter"]["rate"] - RATE) < 1.0
+    assert any(abs(peak["frequency"] - 5.0) < 0.5 for peak in report["angle_psd_peaks"])
+    assert report["step_response"]["count"] > 0
+    assert report["latency"]["count"] > 0
+
+
+def write_slewed_session(path, seconds=10.0):
+    """力反馈循环（20Hz）录制的限速输出：请求每秒在 0 和 100 之间切换，角度一阶跟随下发的阻力"""
+    recorder = SessionRecorder(path)
+    limiter = TorqueLimiter(slew_rate=500.0)
+    output = angle = 0.0
+    for i in range(int(seconds * RATE)):
+        t = i / RATE
+        if i % (RATE // 20) == 0:
+            output = limiter.limit(100.0 if int(t) % 2 else 0.0, t)
+            recorder.write(t, KIND_RESISTANCE, output)
+        angle += (output - angle) * 0.02
+        recorder.write(t, KIND_ANGLE, angle)
+    recorder.close()
+
+
+def test_slewed_steps_are_merged(tmp_path):
+    path = tmp_path / "slewed.rks"
+    write_slewed_session(path)
+    records = load_session(path)
+    step_times, steps = detect_steps(*channel(records, KIND_RESISTANCE))
+    assert np.allclose(step_times, np.arange(1, 10))  # 第一次变化的时刻
+    assert np.array_equal(steps, np.where(np.arange(1, 10) % 2, 100.0, -100.0))
+    report = analyze(records)
+    assert report["step_response"]["count"] == 9
+    assert report["latency"]["count"] == 9
@@ -0,0 +1,85 @@
+"""自动校准：行程检查与摩擦拟合"""
+
+import pytest
+
+from calibration import Calibrator, fit_range, fit_friction, RANGE_DURATION, SWEEP_MAX, SWEEP_RATE
+from esp32_sim import WheelModel
+from sim_clock import VirtualClock
+
+RATE = 1000  # 角度采样率（Hz）
+
+
+def sweep(model):
+    """按校准器的摩擦扫描指令驱动电机模型，返回 (时间, 指令, 角度)，角度按固件格式保留两位小数"""
+    calibrator = Calibrator(None)
+    calibrator.angles.append(model.angle)
+    command = calibrator.sweep_command()
+    times, commands, angles = [], [], []
+    for i in range(int(2 * SWEEP_MAX / SWEEP_RATE * RATE)):
+        t = i / RATE
+        model.resistance = command(t)
+        model.step(1.0 / RATE)
+        angle = round(model.angle, 2)
+        times.append(t)
+        commands.append(model.resistance)
+        angles.append(angle)
+        calibrator.angles.append(angle)
+    return times, commands, angles
+
+
+class ModelLink:
+    """按虚拟时钟以 RATE 推进电机模型的串口链路替身：R: 指令写入模型阻力，角度帧回调给监听者"""
+
+    def __init__(self, clock, model):
+        self.clock = clock
+        self.model = model
+        self.listeners = []
+        self.writes = []
+        clock.spawn(self.step, 1.0 / RATE, name="model")
+
+    def step(self):
+        self.model.step(1.0 / RATE)
+        for listener in list(self.listeners):
+            listener(self.clock.now(), round(self.model.angle, 2))
+
+    def write(self, data):
+        self.writes.append(data)
+        self.model.resistance = float(data.decode().strip()[2:])
+
+    def add_listener(self, fn):
+        self.listeners.append(fn)
+
+    def remove_listener(self, fn):
+        self.listeners.remove(fn)
+
+
+def test_fit_range_rejects_unmoved_wheel():
+    with pytest.raises(ValueError):
+        fit_range([0.0] * 100)
+    with pytest.raises(ValueError):
+        fit_range([])
+    assert fit_range([-400.0, 0.0, 500.0]) == (50.0, 900.0)
+
+
+def test_fit_friction_dynamic_below_static():
+    static_friction, dynamic_friction = fit_friction(*sweep(WheelModel(static_friction=12.0, dynamic_friction=8.0, damping=0.0)))
+    assert static_friction == pytest.approx(12.0, abs=1.0)
+    assert dynamic_friction < static_friction
+    assert dynamic_friction == pytest.approx(8.0, abs=1.5)
+
+
+def test_fit_friction_without_motion_keeps_static():
+    times = [i / RATE for i in range(2000)]
+    commands = [min(i, 2000 - i) / 50.0 for i in range(2000)]
+    assert fit_friction(times, commands, [0.0] * 2000) == (20.0, 20.0)
+
+
+def test_calibration_runs_on_injected_clock():
+    clock = VirtualClock()
+    link = ModelLink(clock, WheelModel())
+    calibrator = Calibrator(link, clock=clock)
+    calibrator.start()
+    clock.run_until(RANGE_DURATION + 1.0)
+    assert not calibrator.running
+    assert calibrator.result is None and "行程" in calibrator.error  # 无人转动方向盘
+    assert len(calibrator.times) == pytest.approx(RANGE_DURATION * RATE, abs=2)
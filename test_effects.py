@@ -0,0 +1,120 @@
+"""本地力反馈效果：编译器经内存串口上传到模拟器后的力矩，以及超过容差才重发的增量帧"""
+
+import math
+
+import pytest
+
+from effects import EffectCompiler
+from esp32_sim import Esp32Simulator, MemorySerial
+from serial_link import SerialLink
+from sim_clock import VirtualClock
+
+SAMPLE_RATE = 1000  # 模拟器采样率（Hz）
+AMPLITUDE = 120.0  # 角度轨迹幅度（度）
+FREQUENCY = 0.5  # 角度轨迹频率（Hz）
+BASE = 10.0  # R: 恒定阻力
+SPRING = (0.0, 0.5, 40.0)  # 弹簧：中心、刚度、饱和
+DAMPER = {"damper": 0.05, "damper_saturation": 10.0}
+MAX_TORQUE = 50.0
+
+
+class ScriptedWheel:
+    """按脚本给出角度的方向盘：不受力矩影响，记录模拟器每次步进前给出的力矩"""
+
+    def __init__(self):
+        self.t = 0.0
+        self.angle = 0.0
+        self.velocity = 0.0
+        self.resistance = 0.0
+        self.samples = []  # (角度, 角速度, 模拟器计算的力矩)
+
+    def step(self, dt):
+        self.samples.append((self.angle, self.velocity, self.resistance))
+        self.t += dt
+        phase = 2 * math.pi * FREQUENCY * self.t
+        self.angle = AMPLITUDE * math.sin(phase)
+        self.velocity = AMPLITUDE * 2 * math.pi * FREQUENCY * math.cos(phase)
+
+
+class RecordingSerial(MemorySerial):
+    """记录上位机写出的 E: 帧"""
+
+    def __init__(self, simulator):
+        super().__init__(simulator)
+        self.effect_frames = []
+
+    def write(self, data):
+        if data.startswith(b"E:"):
+            self.effect_frames.append(data)
+        return super().write(data)
+
+
+def clamp(value, limit):
+    return max(-limit, min(limit, value))
+
+
+def expected_torque(angle, velocity, stiffness=SPRING[1]):
+    """固件应输出的力矩：R: 阻力加弹簧和阻尼，按上限限幅"""
+    spring = clamp(-stiffness * (angle - SPRING[0]), SPRING[2])
+    damper = clamp(-DAMPER["damper"] * velocity, DAMPER["damper_saturation"])
+    return clamp(BASE + spring + damper, MAX_TORQUE)
+
+
+def connect():
+    """虚拟时钟下的模拟器、链路和完成协商的效果编译器"""
+    clock = VirtualClock()
+    simulator = Esp32Simulator(sample_rate=SAMPLE_RATE, model=ScriptedWheel(), clock=clock, transport="memory")
+    simulator.serial = RecordingSerial(simulator)
+    link = SerialLink(simulator.serial, clock=clock)
+    simulator.start()
+    link.start()
+    clock.run_until(0.1)
+    compiler = EffectCompiler(link, DAMPER, MAX_TORQUE)
+    assert compiler.negotiate() == len(simulator.effects.slots)
+    return clock, simulator, compiler
+
+
+def test_simulated_force_matches_effect_model():
+    clock, simulator, compiler = connect()
+    compiler.set("spring", b"S", *SPRING)
+    compiler.send_resistance(BASE)
+    clock.run_until(clock.now() + 0.1)  # 等待 R: 指令延迟生效
+    model = simulator.model
+    model.samples.clear()
+    clock.run_until(clock.now() + 2.0 / FREQUENCY)
+    assert len(model.samples) > 3000
+    for angle, velocity, torque in model.samples:
+        assert torque == pytest.approx(expected_torque(angle, velocity), abs=1e-6)
+    torques = [torque for _, _, torque in model.samples]
+    assert max(torques) == MAX_TORQUE  # 轨迹覆盖弹簧、阻尼饱和和总上限
+    assert min(torques) == BASE - SPRING[2] - DAMPER["damper_saturation"]
+
+
+def test_delta_frames_resent_after_tolerance():
+    clock, simulator, compiler = connect()
+    compiler.set("spring", b"S", *SPRING)
+    compiler.send_resistance(BASE)
+    clock.run_until(clock.now() + 0.1)
+    frames = simulator.serial.effect_frames
+    slot = compiler.names["spring"]
+    sent = len(frames)
+
+    # 变化未超过容差：不发送，固件仍使用原刚度
+    center, stiffness, saturation = SPRING
+    compiler.set("spring", b"S", center, stiffness * (1 + compiler.tolerance / 2), saturation)
+    assert not compiler.send_resistance(BASE)
+    assert len(frames) == sent and compiler.skipped == 1
+
+    # 超过容差：只重发该槽位
+    stiffness = stiffness * (1 + compiler.tolerance * 2)
+    compiler.set("spring", b"S", center, stiffness, saturation)
+    assert compiler.send_resistance(BASE)
+    assert frames[sent:] == [b"E:%d,S,0,%.4g,40\n" % (slot, stiffness)]
+    clock.run_until(clock.now() + 0.1)
+    assert simulator.effects.slots[slot] == (b"S", 0.0, stiffness, saturation)
+
+    model = simulator.model
+    model.samples.clear()
+    clock.run_until(clock.now() + 1.0)
+    for angle, velocity, torque in model.samples:
+        assert torque == pytest.approx(expected_torque(angle, velocity, stiffness), abs=1e-6)
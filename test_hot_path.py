@@ -0,0 +1,26 @@
+"""控制热点路径：稳态下每周期不净增内存块"""
+
+from bench import ControlHotPath, alloc_per_tick
+
+
+class LeakyHotPath(ControlHotPath):
+    """每 100 个周期多保留一个对象的热点路径，用于确认检查能发现缓慢泄漏"""
+
+    def __init__(self):
+        super().__init__()
+        self.kept = []
+
+    def tick(self, i, now):
+        super().tick(i, now)
+        if i % 100 == 0:
+            self.kept.append([now])
+
+
+def test_hot_path_allocates_nothing_per_tick():
+    per_tick, stats = alloc_per_tick()
+    assert per_tick <= 0, "\n".join(str(stat) for stat in stats[:5])
+
+
+def test_slow_leak_is_detected():
+    per_tick, _ = alloc_per_tick(LeakyHotPath)
+    assert per_tick > 0
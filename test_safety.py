@@ -0,0 +1,58 @@
+"""安全监督：手动阻力限速与阻力上限修改"""
+
+import pytest
+
+from control import resistance_command
+from safety import SafetyWatchdog, ManualResistance, TorqueLimiter
+from sim_clock import VirtualClock
+
+
+class RecordingLink:
+    """记录写入指令的串口链路替身"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append(data)
+
+    def add_listener(self, fn):
+        pass
+
+
+def test_manual_step_is_slew_limited():
+    clock = VirtualClock()
+    link = RecordingLink(clock)
+    safety = SafetyWatchdog(link, {"slew_rate": 500.0})
+    manual = ManualResistance()
+    manual.set(100.0)
+    outputs = []
+    while manual.pending():
+        outputs.append(manual.step(safety, link))
+        clock.sleep(0.05)
+    assert max(b - a for a, b in zip(outputs, outputs[1:])) <= 25.0 + 1e-9
+    assert outputs[-1] == 100.0
+    assert link.writes[-1] == resistance_command(100.0)
+    assert [resistance_command(v) for v in outputs if v > 0] == link.writes  # 只下发限速后的值
+    assert safety.last_tick is None  # 到达后交还阻力控制
+    assert manual.step(safety, link) is None
+
+
+def test_manual_target_respects_ceiling():
+    clock = VirtualClock()
+    link = RecordingLink(clock)
+    safety = SafetyWatchdog(link, {"max_torque": 40.0})
+    manual = ManualResistance()
+    manual.set(100.0)
+    while manual.pending():
+        manual.step(safety, link)
+        clock.sleep(0.05)
+    assert safety.limiter.output == 40.0
+
+
+@pytest.mark.parametrize("max_torque", [20.0, 100.0])
+def test_set_max_torque_keeps_fade_time(max_torque):
+    limiter = TorqueLimiter(max_torque=50.0, fade_time=0.5)
+    limiter.set_max_torque(max_torque)
+    assert limiter.fade_rate * limiter.fade_time == pytest.approx(max_torque)
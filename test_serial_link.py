@@ -0,0 +1,58 @@
+"""串口链路：读入接收缓冲的切帧与协商探测的误码率"""
+
+from esp32_sim import Esp32Simulator, MemorySerial
+from serial_link import SerialLink, PROBE_COUNT, DEFAULT_LINK, MAX_FRAME_LENGTH, MAX_READ_SIZE
+from sim_clock import VirtualClock
+
+
+class LossySerial(MemorySerial):
+    """丢弃奇数序号探测帧的内存串口，角度数据流照常"""
+
+    def write(self, data):
+        if data.startswith(b"P:") and int(data[2:]) % 2:
+            return len(data)
+        return super().write(data)
+
+
+def connect(serial_class=MemorySerial):
+    """虚拟时钟下以 1kHz 上报角度的模拟器及其链路"""
+    clock = VirtualClock()
+    simulator = Esp32Simulator(sample_rate=1000, clock=clock, transport="memory")
+    simulator.serial = serial_class(simulator)
+    link = SerialLink(simulator.serial, clock=clock)
+    simulator.start()
+    link.start()
+    clock.run_until(0.5)
+    return clock, link
+
+
+def test_probe_clean_link():
+    _, link = connect()
+    assert link.probe() == 0.0
+
+
+def test_probe_rejects_lost_probes_among_angle_frames():
+    _, link = connect(LossySerial)
+    frames_before = link.total_frames
+    error_rate = link.probe()
+    assert link.total_frames - frames_before > PROBE_COUNT  # 期间角度帧远多于探测帧
+    assert error_rate == 0.5 and error_rate > DEFAULT_LINK["max_error_rate"]
+    assert link.negotiate() == (link.ser.baudrate, None, None)  # 所有波特率都不合格，保持原设置
+
+
+def test_frames_split_across_reads():
+    clock = VirtualClock()
+    ser = Esp32Simulator(clock=clock, transport="memory").serial
+    link = SerialLink(ser, clock=clock)
+    stream = b"".join(b"A:%.2f\r\n" % (i / 4) for i in range(100)) + b"E:OK,8\r\n"
+    for offset in range(0, len(stream), 7):
+        ser.rx += stream[offset:offset + 7]  # 帧被拆在多次读取之间
+        assert link.fill(5 + offset % 3) > 0
+        link.fill(MAX_READ_SIZE)
+    assert list(link.angle_values[:100]) == [i / 4 for i in range(100)]
+    assert list(link.frames) == [b"E:OK,8"] and link.used == 0
+
+    ser.rx += b"x" * (MAX_FRAME_LENGTH + 1)  # 超长无换行数据丢弃，之后的帧照常解析
+    link.fill(MAX_READ_SIZE)
+    link.feed(b"A:1.50\r\n")
+    assert link.parse_errors == 1 and link.latest_angle == 1.5 and link.total_frames == 102
@@ -0,0 +1,70 @@
+"""电机测试台：频率响应的 Welch 窗口数、模拟电机的检验结果与虚拟时钟下的发送循环"""
+
+import numpy as np
+
+from esp32_sim import Esp32Simulator, WheelModel
+from serial_link import SerialLink
+from sim_clock import VirtualClock
+from testbench import BenchRunner, build_waveform, characterize, check_limits, frequency_response, DEFAULT_RATE, DEFAULT_SCRIPT, SIM_WHEEL
+
+SAMPLE_RATE = 1000  # 模型步进和角度采样率（Hz）
+DELAY = 0.003  # 指令到电机的传输延迟（秒）
+
+
+def simulate(model, script, rate=DEFAULT_RATE):
+    """按计划时刻把波形送入电机模型（不经串口），返回 testbench 的采集数据格式"""
+    plan_times, commands, segments = build_waveform(script, rate)
+    angle_times, angles = [], []
+    for i in range(int((len(commands) / rate + 0.2) * SAMPLE_RATE)):
+        t = i / SAMPLE_RATE
+        k = int((t - DELAY) * rate)
+        model.resistance = commands[k] if 0 <= k < len(commands) else 0.0
+        model.step(1.0 / SAMPLE_RATE)
+        angle_times.append(t)
+        angles.append(round(model.angle, 2))
+    return {
+        "plan_times": np.asarray(plan_times),
+        "send_times": np.asarray(plan_times),
+        "commands": np.asarray(commands),
+        "angle_times": np.asarray(angle_times),
+        "angles": np.asarray(angles),
+        "segments": segments,
+        "rate": rate,
+    }
+
+
+def test_short_excitation_is_invalid():
+    script = [{"type": "chirp", "offset": 40, "amplitude": 15, "f0": 0.5, "f1": 15, "duration": 0.5}]
+    result = frequency_response(simulate(WheelModel(**SIM_WHEEL), script))
+    assert not result["valid"] and result["bandwidth"] is None and result["points"] == []
+
+
+def test_short_excitation_uses_shorter_windows():
+    script = [{"type": "chirp", "offset": 40, "amplitude": 15, "f0": 0.5, "f1": 15, "duration": 5.0}]
+    result = frequency_response(simulate(WheelModel(**SIM_WHEEL), script))
+    assert result["valid"] and result["segments"] >= 8
+    assert all(point["coherence"] < 1.0 - 1e-9 for point in result["points"])
+    assert all(-360.0 < point["phase"] <= 0.0 for point in result["points"])
+
+
+def test_sim_wheel_passes_default_limits():
+    report = characterize(simulate(WheelModel(**SIM_WHEEL), DEFAULT_SCRIPT))
+    assert check_limits(report) == []
+    assert report["frequency"]["valid"]
+
+
+def test_runner_on_virtual_clock():
+    clock = VirtualClock()
+    simulator = Esp32Simulator(sample_rate=SAMPLE_RATE, model=WheelModel(**SIM_WHEEL), clock=clock, transport="memory")
+    link = SerialLink(simulator.serial, clock=clock)
+    simulator.start()
+    link.start()
+    script = [{"type": "step", "levels": [20, 50, 20], "hold": 1.0}]
+    runner = BenchRunner(link, script)
+    runner.start()
+    clock.run_until(runner.duration + 1.0)
+    assert not runner.running and runner.error is None and runner.progress == 1.0
+    capture = runner.capture()
+    assert np.array_equal(capture["send_times"], capture["plan_times"])  # 虚拟时钟下按计划时刻准确发送
+    assert capture["angle_times"][-1] >= runner.duration
+    assert abs(simulator.model.resistance) < 1e-9  # 结束后阻力归零
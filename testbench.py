@@ -0,0 +1,471 @@
+"""
+电机测试台
+功能：按脚本生成阻力波形（保持、阶跃、斜坡、扫频、伪随机二进制序列），按精确时间经 R: 指令下发，
+同时以全速率记录 A: 角度响应；用 numpy 对采集数据做向量化分析，输出频率响应、调节时间、死区等特性报告，
+用于电机/驱动板装机前的出厂检验
+用法：
+    python testbench.py COM3 [--script 脚本.json] [--rate 200] [--json 报告.json]
+    python testbench.py --sim                       连接 esp32_sim 模拟器（带回位弹簧）运行
+脚本为 JSON 列表，每段一个对象，例如：
+    [{"type": "step", "levels": [20, 50, 20], "hold": 1.0},
+     {"type": "chirp", "offset": 40, "amplitude": 15, "f0": 0.5, "f1": 15, "duration": 20}]
+"""
+
+import argparse
+import json
+import math
+
+import numpy as np
+
+from analyze import step_response, detect_steps, distribution, spread_batches
+from calibration import MOVE_THRESHOLD, STOP_VELOCITY
+from control import resistance_command
+from session_rec import SessionRecorder, KIND_ANGLE, KIND_RESISTANCE
+from sim_clock import STOP
+
+DEFAULT_RATE = 200  # 指令下发频率（Hz）
+SPIN_TIME = 0.001  # 距离发送时刻不足该时间时忙等，保证时间精度
+TAIL_TIME = 0.2  # 最后一条指令后继续采集响应的时间（秒）
+
+# 默认脚本：斜坡（死区）、阶跃（调节时间）、扫频和 PRBS（频率响应）
+DEFAULT_SCRIPT = [
+    {"type": "hold", "value": 0, "duration": 1.0},
+    {"type": "ramp", "start": 0, "end": 60, "duration": 4.0},
+    {"type": "ramp", "start": 60, "end": 0, "duration": 4.0},
+    {"type": "step", "levels": [20, 50, 20, 80, 20], "hold": 1.0},
+    {"type": "chirp", "offset": 40, "amplitude": 15, "f0": 0.5, "f1": 15, "duration": 20.0},
+    {"type": "prbs", "low": 30, "high": 50, "bit_time": 0.02, "order": 9, "duration": 10.0},
+    {"type": "hold", "value": 0, "duration": 1.0},
+]
+
+# 出厂检验限值
+DEFAULT_LIMITS = {
+    "max_deadband": 20.0,  # 最大起转阻力
+    "max_settling": 0.5,  # 最大调节时间（秒）
+    "min_bandwidth": 2.0,  # 最小 -3dB 带宽（Hz）
+    "max_timing_error": 0.002,  # 指令发送时刻最大偏差（P99，秒）
+}
+
+# 频率响应：Welch 平均至少需要的窗口数（只有一两个窗口时相干函数恒为 1，频响和带宽没有意义）及最短窗口长度
+MIN_SEGMENTS = 8
+MIN_NPERSEG = 64
+
+# --sim 使用的电机模型：带回位弹簧，响应满足默认检验限值，可作为合格样机的参照
+SIM_WHEEL = {"spring": 0.25, "inertia": 0.0001, "damping": 0.01}
+
+# PRBS 最大长度线性反馈移位寄存器抽头（阶数 -> 抽头位置）
+PRBS_TAPS = {7: (7, 6), 9: (9, 5), 11: (11, 9), 15: (15, 14)}
+
+
+def prbs_bits(order):
+    """生成一个周期的最大长度伪随机二进制序列"""
+    a, b = PRBS_TAPS[order]
+    state = (1 << order) - 1
+    bits = []
+    for _ in range((1 << order) - 1):
+        bit = ((state >> (a - 1)) ^ (state >> (b - 1))) & 1
+        state = ((state << 1) | bit) & ((1 << order) - 1)
+        bits.append(bit)
+    return bits
+
+
+def segment_values(segment, rate):
+    """生成一段波形的指令值列表"""
+    kind = segment["type"]
+    if kind == "hold":
+        return [segment["value"]] * int(segment["duration"] * rate)
+    if kind == "step":
+        hold = int(segment["hold"] * rate)
+        return [level for level in segment["levels"] for _ in range(hold)]
+    if kind == "ramp":
+        n = int(segment["duration"] * rate)
+        start, end = segment["start"], segment["end"]
+        return [start + (end - start) * i / max(n - 1, 1) for i in range(n)]
+    if kind == "chirp":
+        # 指数扫频：频率从 f0 按指数增长到 f1
+        n = int(segment["duration"] * rate)
+        f0, f1, duration = segment["f0"], segment["f1"], segment["duration"]
+        k = math.log(f1 / f0)
+        return [
+            segment["offset"] + segment["amplitude"]
+            * math.sin(2 * math.pi * f0 * duration / k * (math.exp(k * (i / rate) / duration) - 1))
+            for i in range(n)
+        ]
+    if kind == "prbs":
+        bits = prbs_bits(segment.get("order", 9))
+        per_bit = max(1, int(segment["bit_time"] * rate))
+        n = int(segment["duration"] * rate)
+        return [segment["high"] if bits[(i // per_bit) % len(bits)] else segment["low"] for i in range(n)]
+    raise ValueError(f"未知的波形类型：{kind}")
+
+
+def build_waveform(script, rate=DEFAULT_RATE):
+    """按脚本生成完整波形，返回 (计划时间, 指令值, 分段信息)"""
+    commands = []
+    segments = []
+    for segment in script:
+        values = [min(100.0, max(0.0, float(v))) for v in segment_values(segment, rate)]
+        segments.append(dict(segment, t0=len(commands) / rate, t1=(len(commands) + len(values)) / rate))
+        commands.extend(values)
+    times = [i / rate for i in range(len(commands))]
+    return times, commands, segments
+
+
+class BenchRunner:
+    def __init__(self, link, script=None, rate=DEFAULT_RATE, clock=None):
+        """clock: 取时间和启动发送循环的时钟，默认与串口链路相同"""
+        self.link = link
+        self.clock = clock or link.clock
+        self.rate = rate
+        self.plan_times, self.plan_commands, self.segments = build_waveform(script or DEFAULT_SCRIPT, rate)
+        self.duration = len(self.plan_commands) / rate
+
+        self.send_times = []  # 实际发送时刻（相对开始）
+        self.angle_times = []
+        self.angles = []
+        self.start_time = None
+        self.progress = 0.0
+        self.running = False
+        self.error = None
+        self.thread = None
+        self.commands = None
+        self.index = 0
+        self.tail = False
+
+    def start(self):
+        """启动发送循环（真实时钟下为后台线程）"""
+        self.commands = [resistance_command(value) for value in self.plan_commands]  # 预编码指令表
+        self.index = 0
+        self.tail = False
+        self.start_time = None
+        self.running = True
+        self.link.add_listener(self.on_angle)
+        self.thread = self.clock.spawn(self.step, 0.0, name="testbench")
+
+    def stop(self):
+        self.running = False
+
+    def on_angle(self, timestamp, angle):
+        """串口链路回调：全速率记录角度"""
+        if self.start_time is not None:
+            self.angle_times.append(timestamp - self.start_time)
+            self.angles.append(angle)
+
+    def step(self):
+        """
+        发送循环单步：按计划时间发送下一条指令，返回到下次执行的等待时间；
+        真实时钟下先睡眠，最后 SPIN_TIME 内忙等，虚拟时钟下直接跳到发送时刻；
+        全部发送（或被停止）后归零阻力，再采集 TAIL_TIME 的响应后结束
+        """
+        try:
+            if self.tail:
+                return self.finish()
+            now = self.clock.now()
+            if self.start_time is None:
+                self.start_time = now
+            if not self.running or self.index >= len(self.commands):
+                self.link.write(b"R:0.0\n")
+                self.tail = True
+                return TAIL_TIME
+            remaining = self.start_time + self.plan_times[self.index] - now
+            if remaining > 0:
+                if self.clock.virtual:
+                    return remaining
+                return max(remaining - SPIN_TIME, 0.0)
+            self.send_times.append(now - self.start_time)
+            self.link.write(self.commands[self.index])
+            self.index += 1
+            self.progress = self.index / len(self.commands)
+            return 0.0
+        except Exception as e:
+            self.error = e
+            return self.finish()
+
+    def finish(self):
+        self.link.remove_listener(self.on_angle)
+        self.running = False
+        return STOP
+
+    def save(self, path):
+        """保存为会话录制文件，可用 analyze.py 继续分析"""
+        recorder = SessionRecorder(path)
+        for t, value in zip(self.send_times, self.plan_commands):
+            recorder.write(t, KIND_RESISTANCE, value)
+        for t, angle in zip(self.angle_times, self.angles):
+            recorder.write(t, KIND_ANGLE, angle)
+        recorder.close()
+
+    def capture(self):
+        """采集结果转换为 numpy 数组"""
+        n = len(self.send_times)
+        angle_times, angles = spread_batches(np.asarray(self.angle_times), np.asarray(self.angles))
+        return {
+            "plan_times": np.asarray(self.plan_times[:n]),
+            "send_times": np.asarray(self.send_times),
+            "commands": np.asarray(self.plan_commands[:n]),
+            "angle_times": angle_times,
+            "angles": angles,
+            "segments": self.segments,
+            "rate": self.rate,
+        }
+
+
+def in_segment(times, segment):
+    """落在分段时间范围内的样本掩码"""
+    return (times >= segment["t0"]) & (times < segment["t1"])
+
+
+def hold_commands(capture, times):
+    """各时刻正在生效的指令（零阶保持）"""
+    index = np.searchsorted(capture["send_times"], times, side="right") - 1
+    return capture["commands"][np.clip(index, 0, capture["commands"].size - 1)]
+
+
+def deadband(capture):
+    """
+    斜坡段：上升斜坡中角度偏离起点超过 MOVE_THRESHOLD 时的指令为起转阻力，
+    下降斜坡中最后一个速度超过 STOP_VELOCITY 的样本对应的指令为停转阻力，两者之差为滞回
+    """
+    t, angles = capture["angle_times"], capture["angles"]
+    result = {}
+    for segment in capture["segments"]:
+        if segment["type"] != "ramp":
+            continue
+        mask = in_segment(t, segment)
+        if mask.sum() < 3:
+            continue
+        seg_t, seg_a = t[mask], angles[mask]
+        seg_cmd = hold_commands(capture, seg_t)
+        if segment["end"] > segment["start"]:
+            moved = np.abs(seg_a - seg_a[0]) > MOVE_THRESHOLD
+            if moved.any():
+                result["breakaway"] = float(seg_cmd[moved.argmax()])
+        else:
+            velocity = np.abs(np.gradient(seg_a, seg_t))
+            moving = np.flatnonzero(velocity > STOP_VELOCITY)
+            if moving.size:
+                result["stop"] = float(seg_cmd[moving[-1]])
+    if "breakaway" in result and "stop" in result:
+        result["hysteresis"] = result["breakaway"] - result["stop"]
+    return result
+
+
+def settling(capture):
+    """阶跃段：复用 analyze.py 的阶跃响应统计（延迟、上升时间、超调、调节时间）"""
+    segments = [s for s in capture["segments"] if s["type"] == "step"]
+    if not segments:
+        return {"count": 0, "latency": distribution(np.empty(0))}
+    step_times, steps = detect_steps(capture["send_times"], capture["commands"])
+    inside = np.any([in_segment(step_times, s) for s in segments], axis=0)
+    window = min(s["hold"] for s in segments)  # 观察窗口取最短的保持时间
+    metrics, latencies = step_response(capture["angle_times"], capture["angles"],
+                                       step_times[inside], steps[inside], window=window)
+    metrics["latency"] = distribution(latencies)
+    return metrics
+
+
+def welch_segments(sizes, nperseg):
+    """各段按 nperseg 长度、50% 重叠切分得到的窗口总数"""
+    return sum((size - nperseg) // (nperseg // 2) + 1 for size in sizes if size >= nperseg)
+
+
+def frequency_response(capture, nperseg=1024, min_coherence=0.6, min_segments=MIN_SEGMENTS):
+    """
+    扫频/PRBS 段：Welch 法估计 H1 = Puy / Puu 及相干函数，各段的谱累加后平均；
+    激励太短时缩短窗口凑足 min_segments 个窗口，仍不足时结果标记为无效、不给出带宽；
+    以相干度足够的最低频点增益为基准，增益降到其 1/√2 的频率为 -3dB 带宽
+    """
+    rate = capture["rate"]
+    pieces = []
+    for segment in capture["segments"]:
+        if segment["type"] not in ("chirp", "prbs"):
+            continue
+        grid = np.arange(segment["t0"], segment["t1"], 1.0 / rate)
+        if grid.size < MIN_NPERSEG or capture["angle_times"].size < 2:
+            continue
+        pieces.append((hold_commands(capture, grid), np.interp(grid, capture["angle_times"], capture["angles"])))
+    if not pieces:
+        return {"bandwidth": None, "points": [], "segments": 0, "valid": False}
+
+    sizes = [u.size for u, _ in pieces]
+    nperseg = min(nperseg, 1 << int(np.log2(max(sizes))))
+    while nperseg > MIN_NPERSEG and welch_segments(sizes, nperseg) < min_segments:
+        nperseg //= 2
+    count = welch_segments(sizes, nperseg)
+    if count < min_segments:
+        return {"bandwidth": None, "points": [], "segments": count, "valid": False}
+
+    window = np.hanning(nperseg)
+    windows = np.lib.stride_tricks.sliding_window_view
+    puu = puy = pyy = 0.0
+    for u, y in pieces:
+        if u.size < nperseg:
+            continue
+        us = windows(u - u.mean(), nperseg)[::nperseg // 2] * window
+        ys = windows(y - y.mean(), nperseg)[::nperseg // 2] * window
+        fu = np.fft.rfft(us, axis=1)
+        fy = np.fft.rfft(ys, axis=1)
+        puu = puu + (np.abs(fu) ** 2).sum(axis=0)
+        puy = puy + (np.conj(fu) * fy).sum(axis=0)
+        pyy = pyy + (np.abs(fy) ** 2).sum(axis=0)
+
+    freqs = np.fft.rfftfreq(nperseg, 1.0 / rate)
+    valid = (puu > puu.max() * 1e-6) & (freqs > 0)
+    h = np.where(valid, puy / np.where(valid, puu, 1.0), 0.0)
+    coherence = np.where(valid, np.abs(puy) ** 2 / np.maximum(puu * pyy, 1e-30), 0.0)
+    gain = np.abs(h)
+    good = np.flatnonzero(coherence >= min_coherence)
+    phase = np.zeros_like(gain)
+    if good.size:
+        # 只在相干频点上展开相位，并平移到 (-360°, 0°] 起步（滞后为负）
+        phase[good] = np.degrees(np.unwrap(np.angle(h[good])))
+        phase[good] -= 360.0 * np.ceil(phase[good[0]] / 360.0)
+
+    result = {"bandwidth": None, "points": [], "segments": count, "valid": True}
+    if good.size:
+        reference = gain[good[0]]
+        result["dc_gain"] = float(reference)
+        below = good[gain[good] < reference / np.sqrt(2)]
+        result["bandwidth"] = float(freqs[below[0]]) if below.size else float(freqs[good[-1]])
+        # 对数间隔取若干点作为频响表
+        targets = np.geomspace(freqs[good[0]], freqs[good[-1]], 12)
+        picks = np.unique(good[np.abs(freqs[good][:, None] - targets).argmin(axis=0)])
+        result["points"] = [
+            {"frequency": float(freqs[i]), "gain_db": float(20 * np.log10(gain[i] / reference)),
+             "phase": float(phase[i]), "coherence": float(coherence[i])}
+            for i in picks
+        ]
+    return result
+
+
+def timing(capture):
+    """指令发送时刻相对计划时刻的偏差"""
+    errors = capture["send_times"] - capture["plan_times"]
+    stats = distribution(np.abs(errors))
+    stats["late"] = int(np.count_nonzero(errors > 1.0 / capture["rate"]))  # 晚于一个周期的指令数
+    return stats
+
+
+def characterize(capture):
+    """生成特性报告（dict）"""
+    return {
+        "duration": float(capture["send_times"][-1]) if capture["send_times"].size else 0.0,
+        "commands": int(capture["send_times"].size),
+        "angles": int(capture["angles"].size),
+        "timing": timing(capture),
+        "deadband": deadband(capture),
+        "step": settling(capture),
+        "frequency": frequency_response(capture),
+    }
+
+
+def check_limits(report, limits=None):
+    """对照检验限值，返回 [(项目, 实测值, 限值)] 的不合格列表，测不出的项目也视为不合格"""
+    limits = dict(DEFAULT_LIMITS, **(limits or {}))
+    checks = [
+        ("max_deadband", report["deadband"].get("breakaway"), lambda v, l: v <= l),
+        ("max_settling", report["step"].get("settling_time"), lambda v, l: v <= l),
+        ("min_bandwidth", report["frequency"].get("bandwidth"), lambda v, l: v >= l),
+        ("max_timing_error", report["timing"].get("p99"), lambda v, l: v <= l),
+    ]
+    return [(name, value, limits[name]) for name, value, ok in checks if value is None or not ok(value, limits[name])]
+
+
+def print_report(report, failures):
+    timing_stats = report["timing"]
+    print(f"时长 {report['duration']:.1f} 秒，指令 {report['commands']} 条，角度 {report['angles']} 帧")
+    if timing_stats["count"]:
+        print(f"发送时刻偏差：P50 {timing_stats['p50'] * 1e6:.0f}µs  P99 {timing_stats['p99'] * 1e6:.0f}µs  "
+              f"最大 {timing_stats['max'] * 1e6:.0f}µs  迟到 {timing_stats['late']} 条")
+
+    band = report["deadband"]
+    if band:
+        print("死区：" + "  ".join(f"{label} {band[key]:.1f}" for key, label in
+                                  (("breakaway", "起转阻力"), ("stop", "停转阻力"), ("hysteresis", "滞回"))
+                                  if key in band))
+
+    step = report["step"]
+    if "settling_time" in step:
+        print(f"阶跃响应：延迟 P50 {step['latency'].get('p50', 0) * 1e3:.1f}ms  上升 {step['rise_time'] * 1e3:.0f}ms  "
+              f"超调 {step['overshoot'] * 100:.0f}%  调节 {step['settling_time'] * 1e3:.0f}ms  "
+              f"增益 {step['gain']:.2f} 度/单位")
+
+    frequency = report["frequency"]
+    if not frequency.get("valid", True) and frequency.get("segments"):
+        print(f"频率响应：Welch 平均只有 {frequency['segments']} 个窗口（至少 {MIN_SEGMENTS} 个），结果无效，请加长扫频/PRBS 段")
+    if frequency["bandwidth"] is not None:
+        print(f"频率响应：-3dB 带宽 {frequency['bandwidth']:.2f}Hz")
+        for point in frequency["points"]:
+            print(f"  {point['frequency']:7.2f}Hz  {point['gain_db']:6.1f}dB  {point['phase']:7.1f}°  "
+                  f"相干 {point['coherence']:.2f}")
+
+    if failures:
+        for name, value, limit in failures:
+            shown = "未测出" if value is None else f"{value:.4g}"
+            print(f"不合格：{name} = {shown}（限值 {limit}）")
+    else:
+        print("检验合格")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="电机测试台：运行阻力波形脚本并生成特性报告")
+    parser.add_argument("port", nargs="?", help="串口，如 COM3")
+    parser.add_argument("--sim", action="store_true", help="连接内置 esp32_sim 模拟器")
+    parser.add_argument("--script", help="波形脚本 JSON 文件（默认使用内置脚本）")
+    parser.add_argument("--rate", type=int, default=DEFAULT_RATE, help="指令下发频率（Hz）")
+    parser.add_argument("--out", help="保存原始采集数据（.rks）")
+    parser.add_argument("--json", help="保存报告（JSON）")
+    parser.add_argument("--limit", action="append", default=[], metavar="名称=值", help="覆盖检验限值，可多次指定")
+    args = parser.parse_args()
+    if not args.port and not args.sim:
+        parser.error("需要指定串口或 --sim")
+
+    from serial_link import SerialLink, open_serial
+    script = None
+    if args.script:
+        with open(args.script, "r", encoding="utf-8") as f:
+            script = json.load(f)
+    limits = {name: float(value) for name, value in (item.split("=", 1) for item in args.limit)}
+
+    simulator = None
+    if args.sim:
+        from esp32_sim import Esp32Simulator, WheelModel
+        simulator = Esp32Simulator(sample_rate=1000, model=WheelModel(**SIM_WHEEL))
+        simulator.start()
+        args.port = simulator.port
+
+    link = SerialLink(open_serial(args.port))
+    link.start()
+    runner = BenchRunner(link, script, args.rate)
+    print(f"运行测试脚本，约 {runner.duration:.0f} 秒……")
+    try:
+        runner.start()
+        while runner.running:
+            link.clock.sleep(0.5)
+            print(f"\r进度 {runner.progress * 100:5.1f}%", end="", flush=True)
+        print()
+    except KeyboardInterrupt:
+        runner.stop()
+        runner.thread.join()
+    finally:
+        link.write(b"R:0.0\n")
+        link.close()
+        if simulator is not None:
+            simulator.stop()
+    if runner.error is not None:
+        raise SystemExit(f"测试中断：{runner.error}")
+
+    if args.out:
+        runner.save(args.out)
+    report = characterize(runner.capture())
+    failures = check_limits(report, limits)
+    report["failures"] = [{"name": n, "value": v, "limit": l} for n, v, l in failures]
+    print_report(report, failures)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+vJoy 输出级
+功能：在后台线程中汇总各轴、按键和 POV 的最新值，填入完整的摇杆位置结构体，
+每个控制周期只调用一次驱动 update()；与上次提交完全相同时跳过，不占用界面线程（提交循环由注入的时钟启动）；
+轴值保存在定长整数数组中原地更新，提交时复制到预分配的快照数组，不为每周期新建对象
+"""
+
+import ctypes
+import os
+import threading
+from array import array
+
+from sim_clock import CLOCK, STOP
+
+# 轴名称 -> pyvjoy 位置结构体（_JOYSTICK_POSITION_V2）字段
+AXIS_FIELDS = {
+    "x": "wAxisX",
+    "y": "wAxisY",
+    "z": "wAxisZ",
+    "rx": "wAxisXRot",
+    "ry": "wAxisYRot",
+    "rz": "wAxisZRot",
+    "slider": "wSlider",
+    "dial": "wDial",
+}
+AXIS_INDEX = {name: index for index, name in enumerate(AXIS_FIELDS)}
+FIELDS = tuple(AXIS_FIELDS.values())
+UNSET = -1  # 未设置过的轴，提交时不写入结构体
+POV_NEUTRAL = 0xFFFFFFFF  # 连续型 POV 的中立值
+DEFAULT_RATE = 500  # 最高提交频率（Hz）
+DLL_NAME = "vJoyInterface.dll"
+
+
+class FFState(ctypes.Structure):
+    """vJoy 力反馈状态结构体（简化版本，实际有更多字段）"""
+    _fields_ = [
+        ("Device", ctypes.c_int),
+        ("Enabled", ctypes.c_bool),
+        ("MasterGain", ctypes.c_int),
+        ("ConditionCount", ctypes.c_int),
+        ("Conditions", ctypes.c_int * 8),
+        ("PeriodicCount", ctypes.c_int),
+        ("Periodics", ctypes.c_int * 8),
+        ("ConstantCount", ctypes.c_int),
+        ("Constants", ctypes.c_int * 8),
+        ("RampCount", ctypes.c_int),
+        ("Ramps", ctypes.c_int * 8),
+        ("EffectCount", ctypes.c_int),
+        ("Effects", ctypes.c_int * 8)
+    ]
+
+
+def load_vjoy_ffb(dll_path=None):
+    """加载 vJoyInterface.dll 的力反馈接口，返回 (GetVJFFBState, 状态结构体)，DLL 不存在时返回 (None, None)"""
+    dll_path = dll_path or os.path.join(os.getcwd(), DLL_NAME)
+    if not os.path.exists(dll_path):
+        return None, None
+
+    vjoy_dll = ctypes.windll.LoadLibrary(dll_path)
+
+    # 定义函数原型
+    GetVJFFBState = vjoy_dll.GetVJFFBState
+    GetVJFFBState.argtypes = [ctypes.c_int, ctypes.POINTER(ctypes.c_int)]
+    GetVJFFBState.restype = ctypes.c_bool
+    return GetVJFFBState, FFState()
+
+
+class VJoyOutput:
+    __slots__ = ("device", "clock", "interval", "lock", "wakeup", "running", "thread",
+                 "axes", "buttons", "pov", "snapshot", "sent", "sent_buttons", "sent_pov",
+                 "updates", "skipped", "errors")
+
+    def __init__(self, device, rate=DEFAULT_RATE, clock=None):
+        """device: pyvjoy.VJoyDevice 或具有 data 结构体和 update() 方法的对象"""
+        self.device = device
+        self.clock = clock or CLOCK
+        self.interval = 1.0 / rate
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.running = False
+        self.thread = None
+
+        # 待提交状态（轴值按 AXIS_FIELDS 顺序）
+        self.axes = array("l", [UNSET] * len(FIELDS))
+        self.buttons = 0
+        self.pov = POV_NEUTRAL
+
+        # 本次提交的快照和上次提交的状态（用于去重），两个数组交替使用
+        self.snapshot = array("l", self.axes)
+        self.sent = array("l", self.axes)
+        self.sent_buttons = None
+        self.sent_pov = None
+
+        # 统计
+        self.updates = 0
+        self.skipped = 0
+        self.errors = 0
+
+    def start(self):
+        """启动提交循环（真实时钟下为后台线程）"""
+        self.running = True
+        self.thread = self.clock.spawn(self.step, self.interval, name="vjoy-output")
+
+    def stop(self):
+        """停止后台线程"""
+        self.running = False
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+
+    def notify(self):
+        # Event.set 需要获取条件锁，已唤醒时跳过
+        if not self.wakeup.is_set():
+            self.wakeup.set()
+
+    def set_axis(self, name, value):
+        """设置轴值（0-32768），只更新待提交状态，立即返回"""
+        self.axes[AXIS_INDEX[name]] = value  # 单个数组元素赋值在 GIL 下是原子的
+        self.notify()
+
+    def set_button(self, index, pressed):
+        """设置按键状态（index 从 1 开始）"""
+        bit = 1 << (index - 1)
+        with self.lock:
+            self.buttons = (self.buttons | bit) if pressed else (self.buttons & ~bit)
+        self.notify()
+
+    def set_pov(self, value):
+        """设置 POV（0-35999，单位 0.01 度；POV_NEUTRAL 为中立）"""
+        self.pov = value
+        self.notify()
+
+    def flush(self):
+        """把当前状态写入结构体并提交一次；状态未变化时跳过，返回是否调用了驱动"""
+        snapshot = self.snapshot
+        snapshot[:] = self.axes  # 先复制再比较和写入，避免提交过程中被读取线程修改
+        buttons = self.buttons
+        pov = self.pov
+        if snapshot == self.sent and buttons == self.sent_buttons and pov == self.sent_pov:
+            self.skipped += 1
+            return False
+
+        data = self.device.data
+        for field, value in zip(FIELDS, snapshot):
+            if value != UNSET:
+                setattr(data, field, value)
+        data.lButtons = buttons
+        data.bHats = pov
+        self.device.update()
+        self.snapshot, self.sent = self.sent, snapshot
+        self.sent_buttons = buttons
+        self.sent_pov = pov
+        self.updates += 1
+        return True
+
+    def step(self):
+        """
+        提交循环单步：有新数据时提交一次，之后至少间隔 interval 再提交，间隔期间的多次修改合并为一次提交；
+        真实时钟下无新数据时阻塞等待唤醒，虚拟时钟下不阻塞，按 interval 轮询
+        """
+        if not self.running:
+            return STOP
+        if not self.wakeup.is_set():
+            if self.clock.virtual:
+                return self.interval
+            self.wakeup.wait()
+            if not self.running:
+                return STOP
+        self.wakeup.clear()
+        try:
+            self.flush()
+        except Exception:
+            self.errors += 1
+        return self.interval
+
+    def stats(self):
+        return {"updates": self.updates, "skipped": self.skipped, "errors": self.errors}